@@ -0,0 +1,125 @@
+"""
+Бенчмарк основных операций: insert, select (все строки и по условию),
+update и delete на синтетических таблицах разного размера.
+
+    python benchmarks/bench_crud.py [--sizes 1000,100000,1000000] [--output file]
+
+Каждый размер замеряется в отдельном процессе во временной папке, так что
+пиковая память относится к одной таблице. Результаты пишутся в json
+(см. common.write_results) и сравниваются скриптом compare.py.
+"""
+import argparse
+import builtins
+import multiprocessing
+import os
+import random
+import tempfile
+
+from common import peak_rss_mb, quiet, summarize, timed, write_results
+
+SCHEMA = [("name", "str"), ("age", "int"), ("active", "bool")]
+LOAD_BATCH = 10_000
+INSERT_OPS = 500
+UPDATE_OPS = 200
+DELETE_OPS = 200
+FILTERED_REPEAT = 20
+
+
+def _full_repeat(size):
+    # вывод всей таблицы дорог, на больших таблицах хватает нескольких замеров
+    return 20 if size <= 10_000 else 5 if size <= 100_000 else 3
+
+def _rows(count, rng):
+    for i in range(count):
+        yield [f"user{i % 5000}", rng.randrange(100), rng.random() < 0.5]
+
+def run_size(size, seed=42):
+    "замеры для таблицы из size строк; выполняется в отдельном процессе"
+    # delete спрашивает подтверждение
+    builtins.input = lambda *args: "y"
+    from primitive_db import core
+
+    rng = random.Random(seed)
+    result = {}
+    with quiet():
+        core.create_table("bench", list(SCHEMA))
+
+        loaded = []
+        rows = _rows(size, rng)
+        for start in range(0, size, LOAD_BATCH):
+            batch = [next(rows) for _ in range(min(LOAD_BATCH, size - start))]
+            loaded.append(timed(core.insert_many, "bench", batch))
+        result["bulk_load"] = {
+            "rows": size,
+            "seconds": round(sum(loaded), 6),
+            "rows_per_sec": round(size / sum(loaded), 2),
+        }
+
+        samples = [timed(core.insert, "bench", row)
+                   for row in _rows(INSERT_OPS, rng)]
+        result["insert"] = summarize(samples)
+        total = size + INSERT_OPS
+
+        def select(*args):
+            # каждый замер - без кеша результатов
+            core.select_cacher.invalidate()
+            return timed(core.select, "bench", *args)
+
+        result["select_full"] = summarize(
+            [select() for _ in range(_full_repeat(size))])
+        result["select_filtered"] = summarize(
+            [select({"age": str(rng.randrange(100))})
+             for _ in range(FILTERED_REPEAT)])
+        result["select_id_range"] = summarize(
+            [select(("between", "ID", str(low), str(low + 100)))
+             for low in (rng.randrange(1, total) for _ in range(FILTERED_REPEAT))])
+
+        result["update"] = summarize(
+            [timed(core.update, "bench", {"age": str(rng.randrange(100))},
+                   {"ID": str(rng.randrange(1, total + 1))})
+             for _ in range(UPDATE_OPS)])
+
+        victims = rng.sample(range(1, total + 1), min(DELETE_OPS, total))
+        result["delete"] = summarize(
+            [timed(core.delete, "bench", {"ID": str(row_id)})
+             for row_id in victims])
+
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+def _worker(size, queue):
+    with tempfile.TemporaryDirectory() as workdir:
+        # DATA_DIR задан относительным путём - таблицы создаются во временной папке
+        os.chdir(workdir)
+        queue.put(run_size(size))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="1000,100000,1000000",
+                        help="размеры таблиц через запятую")
+    parser.add_argument("--output", help="файл для результатов json")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for size in (int(value) for value in args.sizes.split(",")):
+        queue = context.Queue()
+        process = context.Process(target=_worker, args=(size, queue))
+        process.start()
+        results[str(size)] = queue.get()
+        process.join()
+
+        print(f"{size} строк:")
+        for operation, stats in results[str(size)].items():
+            if isinstance(stats, dict) and "p50_ms" in stats:
+                print(f"  {operation:16} {stats['ops_per_sec']:>12} оп/с"
+                      f"  p50 {stats['p50_ms']:.3f} мс  p99 {stats['p99_ms']:.3f} мс")
+            elif isinstance(stats, dict):
+                print(f"  {operation:16} {stats['rows_per_sec']:>12} строк/с")
+            else:
+                print(f"  {operation:16} {stats} МБ")
+
+    print(f"Результаты: {write_results('crud', results, args.output)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Сравнение движков полного прохода: обычный цикл по строкам и векторный (NumPy).
+
+    python benchmarks/bench_vector.py [--sizes 100000,1000000] [--repeat 5]
+                                      [--output file]
+
+На таблице со столбцами int и bool без индексов выполняются select по
+условию и агрегаты обоими движками. Результаты движков сравниваются:
+при расхождении скрипт завершается с кодом 1. Печатается медиана времени
+каждого запроса и ускорение; результаты пишутся в json
+(см. common.write_results). Нужен установленный NumPy.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+
+from common import quiet, timed, write_results
+
+from primitive_db import core
+from primitive_db.decorators import set_auto_confirm
+from primitive_db.vector import numpy_module
+
+SCHEMA = [("age", "int"), ("score", "int"), ("active", "bool"), ("name", "str")]
+LOAD_BATCH = 10_000
+# запросы: имя -> (функция core, аргументы после имени таблицы)
+QUERIES = {
+    "select_eq": (core.select, (("cmp", "=", "age", 42),)),
+    "select_range_and": (core.select, (
+        ("and", ("between", "score", 1000, 1500), ("cmp", "=", "active", True)),)),
+    "select_in_or": (core.select, (
+        ("or", ("in", "age", [1, 2, 3]), ("cmp", ">", "score", 9990)),)),
+    "count_where": (core.aggregate, (
+        [("count", "*")], ("cmp", "<", "age", 50))),
+    "sum_avg_where": (core.aggregate, (
+        [("sum", "score"), ("avg", "score")], ("cmp", "=", "active", False))),
+    "group_by_min_max": (core.aggregate, (
+        [(None, "active"), ("count", "*"), ("min", "score"), ("max", "age")],
+        ("cmp", ">=", "score", 5000), ["active"])),
+}
+
+
+def _rows(count, rng):
+    for i in range(count):
+        yield [rng.randrange(100), rng.randrange(10_000), rng.random() < 0.5,
+               f"user{i % 5000}"]
+
+def _run(engine, function, args, repeat):
+    "(медиана в секундах, строки результата) запроса на движке engine"
+    core.set_scan_engine(engine)
+    result = []
+    core.set_page_sink(lambda field_names, page: result.extend(page))
+
+    def once():
+        # каждый замер - без кеша результатов
+        core.select_cacher.invalidate()
+        result.clear()
+        function("bench", *args)
+
+    # первый запуск строит массивы столбцов
+    once()
+    samples = [timed(once) for _ in range(repeat)]
+    core.set_page_sink(None)
+    return statistics.median(samples), result
+
+def run_size(size, repeat, seed=42):
+    "замеры для таблицы из size строк; возвращает (результаты, расхождения)"
+    rng = random.Random(seed)
+    with quiet():
+        core.create_table("bench", list(SCHEMA))
+        rows = _rows(size, rng)
+        for start in range(0, size, LOAD_BATCH):
+            core.insert_many("bench", [next(rows) for _ in
+                                       range(min(LOAD_BATCH, size - start))])
+
+    results = {}
+    mismatches = []
+    with quiet():
+        for name, (function, args) in QUERIES.items():
+            python_time, python_rows = _run("python", function, args, repeat)
+            numpy_time, numpy_rows = _run("numpy", function, args, repeat)
+            if python_rows != numpy_rows:
+                mismatches.append(name)
+            results[name] = {
+                "rows": len(python_rows),
+                "python_ms": round(python_time * 1000, 4),
+                "numpy_ms": round(numpy_time * 1000, 4),
+                "speedup": round(python_time / numpy_time, 2),
+            }
+        core.drop_table("bench")
+    return results, mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="100000,1000000",
+                        help="размеры таблиц через запятую")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="замеров на запрос")
+    parser.add_argument("--output", help="файл для результатов json")
+    args = parser.parse_args()
+
+    if numpy_module() is None:
+        print("NumPy не установлен: сравнивать не с чем (pip install numpy).")
+        sys.exit(1)
+    # сравнивается один процесс с одним: параллельный проход не запускается
+    core.PARALLEL_WORKERS = 1
+    # удаление таблицы между размерами спрашивает подтверждение
+    set_auto_confirm(True)
+
+    results = {}
+    failed = []
+    with tempfile.TemporaryDirectory() as workdir:
+        # DATA_DIR задан относительным путём - таблицы создаются во временной папке
+        os.chdir(workdir)
+        for size in (int(value) for value in args.sizes.split(",")):
+            results[str(size)], mismatches = run_size(size, args.repeat)
+            print(f"{size} строк:")
+            for name, stats in results[str(size)].items():
+                mark = "  <- результаты различаются" if name in mismatches else ""
+                print(f"  {name:18} python {stats['python_ms']:>10.3f} мс"
+                      f"  numpy {stats['numpy_ms']:>9.3f} мс"
+                      f"  x{stats['speedup']}{mark}")
+            failed.extend(f"{size}:{name}" for name in mismatches)
+
+    print(f"Результаты: {write_results('vector', results, args.output)}")
+    if failed:
+        print(f"Движки разошлись: {', '.join(failed)}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
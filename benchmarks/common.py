@@ -0,0 +1,90 @@
+"""Общие помощники бенчмарков: замеры, перцентили и запись результатов."""
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+# пакет берётся из src, а не из установленной копии
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+
+def percentile(samples, fraction):
+    "перцентиль по отсортированной выборке (fraction от 0 до 1)"
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    pos = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[pos]
+
+def summarize(samples):
+    "сводка по длительностям отдельных операций в секундах"
+    total = sum(samples)
+    return {
+        "ops": len(samples),
+        "seconds": round(total, 6),
+        "ops_per_sec": round(len(samples) / total, 2) if total else None,
+        "p50_ms": round(percentile(samples, 0.50) * 1000, 4),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 4),
+    }
+
+def timed(func, *args):
+    "длительность одного вызова в секундах"
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+@contextlib.contextmanager
+def quiet():
+    "подавляет вывод команд: печать таблиц не должна засорять отчёт"
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+def peak_rss_mb():
+    "пиковая память процесса в МБ или None, если её не узнать"
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS - байты
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(peak / divisor, 1)
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def write_results(name, results, output=None):
+    """
+    сохраняет результаты в json вместе с коммитом и окружением.
+    по умолчанию - benchmarks/results/<name>-<коммит>-<время>.json
+    """
+    commit = git_commit()
+    report = {
+        "benchmark": name,
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"{name}-{commit or 'nogit'}-{stamp}.json")
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=4, ensure_ascii=False)
+    return output
@@ -0,0 +1,53 @@
+"""
+Сравнение двух файлов результатов бенчмарка:
+
+    python benchmarks/compare.py old.json new.json [--threshold 1.2]
+
+Показывает p50 каждой операции до и после. Если какая-то операция
+замедлилась больше чем в threshold раз, скрипт завершается с кодом 1.
+"""
+import argparse
+import json
+import sys
+
+
+def _load(path):
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+def compare(old, new, threshold):
+    "печатает сравнение и возвращает число регрессий"
+    regressions = 0
+    for size, operations in new["results"].items():
+        before = old["results"].get(size, {})
+        print(f"{size}:")
+        for operation, stats in operations.items():
+            previous = before.get(operation)
+            if not isinstance(stats, dict) or "p50_ms" not in stats \
+                    or not isinstance(previous, dict):
+                continue
+            ratio = stats["p50_ms"] / previous["p50_ms"] \
+                if previous["p50_ms"] else 1.0
+            mark = ""
+            if ratio > threshold:
+                mark = "  <- регрессия"
+                regressions += 1
+            print(f"  {operation:16} {previous['p50_ms']:10.3f} -> "
+                  f"{stats['p50_ms']:10.3f} мс  x{ratio:.2f}{mark}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="сравнение результатов бенчмарка")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="во сколько раз операция может замедлиться")
+    args = parser.parse_args()
+
+    old, new = _load(args.old), _load(args.new)
+    print(f"{old.get('commit')} -> {new.get('commit')}")
+    regressions = compare(old, new, args.threshold)
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Проверка времени запуска: импорт модулей пакетного режима укладывается в бюджет.
+
+    python benchmarks/import_time.py [--budget 30] [--runs 7] [--output file]
+
+Импорт primitive_db.main и primitive_db.engine замеряется через
+python -X importtime в отдельных процессах (медиана из runs запусков).
+Кроме бюджета проверяется, что при этом не загружаются модули, нужные
+только интерактивному режиму, серверу или выводу таблиц. Если импорт
+дольше бюджета или тяжёлый модуль загрузился, скрипт завершается с кодом 1.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from common import ROOT, write_results
+
+IMPORT_BUDGET_MS = 30
+# модули, которые не должны загружаться при запуске пакетного режима
+LAZY_MODULES = (
+    "prettytable", "prompt", "multiprocessing", "asyncio", "numpy", "cProfile")
+STARTUP_MODULES = ("primitive_db.main", "primitive_db.engine")
+
+
+def _env():
+    env = dict(os.environ, PYTHONPATH=os.path.join(ROOT, "src"))
+    # без кеша байткода замер включал бы компиляцию исходников
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return env
+
+def _python(*args):
+    return subprocess.run([sys.executable, *args], env=_env(), cwd=ROOT,
+                          capture_output=True, text=True, check=True)
+
+def import_ms():
+    "время импорта модулей запуска по -X importtime, мс"
+    stderr = _python("-X", "importtime", "-c",
+                     f"import {', '.join(STARTUP_MODULES)}").stderr
+    total = 0
+    for line in stderr.splitlines():
+        # import time: self | cumulative | имя; модули верхнего уровня без отступа
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].startswith(" primitive_db") \
+                and not parts[2].startswith("  "):
+            total += int(parts[1])
+    return total / 1000
+
+def loaded_lazy_modules():
+    "какие из LAZY_MODULES загрузились при импорте модулей запуска"
+    code = (f"import sys, json, {', '.join(STARTUP_MODULES)}\n"
+            f"print(json.dumps([m for m in {LAZY_MODULES!r} if m in sys.modules]))")
+    return json.loads(_python("-c", code).stdout)
+
+def version_ms():
+    "полное время запуска project --version, мс"
+    start = time.perf_counter()
+    _python("-m", "primitive_db.main", "--version")
+    return (time.perf_counter() - start) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--budget", type=float, default=IMPORT_BUDGET_MS,
+                        help="допустимое время импорта, мс")
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--output", help="файл для результатов json")
+    args = parser.parse_args()
+
+    # первый запуск записывает кеш байткода
+    import_ms()
+    imports = statistics.median(import_ms() for _ in range(args.runs))
+    startup = statistics.median(version_ms() for _ in range(args.runs))
+    lazy = loaded_lazy_modules()
+
+    print(f"импорт {', '.join(STARTUP_MODULES)}: {imports:.1f} мс "
+          f"(бюджет {args.budget:g} мс)")
+    print(f"project --version: {startup:.1f} мс")
+    failed = imports > args.budget
+    if failed:
+        print("  <- превышен бюджет импорта")
+    if lazy:
+        print(f"при запуске загружены тяжёлые модули: {', '.join(lazy)}")
+        failed = True
+
+    results = {"startup": {"import_ms": round(imports, 3),
+                           "version_ms": round(startup, 3),
+                           "budget_ms": args.budget,
+                           "lazy_modules_loaded": lazy}}
+    print(f"Результаты: {write_results('startup', results, args.output)}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Нагрузка на сервер запросов: много одновременных клиентов.
+
+    python benchmarks/load_server.py [--clients 16] [--requests 500] [--rows 2000]
+                                     [--socket path | --port N] [--output file]
+
+Без --socket и --port скрипт сам запускает сервер на unix сокете во временной
+папке. Каждый клиент выполняет requests запросов: чтение строки по ID,
+агрегат по условию и вставку. Печатаются пропускная способность и задержки
+p50/p99 по видам запросов; результаты пишутся в json (см. common.write_results).
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import ROOT, summarize, write_results
+
+from primitive_db.client import DEFAULT_HOST, AsyncClient
+
+# доли запросов каждого вида
+MIX = (("select_by_id", 0.7), ("aggregate", 0.1), ("insert", 0.2))
+SERVER_START_TIMEOUT = 10
+
+
+async def _prepare_table(connect, rows, rng):
+    client = await connect()
+    await client.execute("drop_table bench")
+    result = await client.execute("create_table bench name:str age:int")
+    if not result.ok:
+        raise RuntimeError(result.message)
+    for i in range(rows):
+        await client.execute("insert into bench values ? ?",
+                             f"user{i}", rng.randrange(100))
+    await client.close()
+
+async def _client(connect, requests, rows, seed, samples):
+    rng = random.Random(seed)
+    client = await connect()
+    kinds = [kind for kind, _ in MIX]
+    weights = [weight for _, weight in MIX]
+    for kind in rng.choices(kinds, weights, k=requests):
+        start = time.perf_counter()
+        match kind:
+            case "select_by_id":
+                result = await client.execute(
+                    "select * from bench where ID = ?", rng.randrange(1, rows + 1))
+            case "aggregate":
+                result = await client.execute(
+                    "select count(*), avg(age) from bench where age > ?",
+                    rng.randrange(100))
+            case "insert":
+                result = await client.execute(
+                    "insert into bench values ? ?", "load", rng.randrange(100))
+        samples[kind].append(time.perf_counter() - start)
+        if not result.ok:
+            samples["errors"].append(result.message)
+    await client.close()
+
+async def _run(args, connect):
+    rng = random.Random(42)
+    await _prepare_table(connect, args.rows, rng)
+
+    samples = {kind: [] for kind, _ in MIX}
+    samples["errors"] = []
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(connect, args.requests, args.rows, seed, samples)
+                           for seed in range(args.clients)))
+    elapsed = time.perf_counter() - start
+
+    total = args.clients * args.requests
+    results = {kind: summarize(samples[kind]) for kind, _ in MIX}
+    results["total"] = {
+        "clients": args.clients,
+        "requests": total,
+        "seconds": round(elapsed, 6),
+        "requests_per_sec": round(total / elapsed, 2),
+        "errors": len(samples["errors"]),
+    }
+    return results, samples["errors"]
+
+def _start_server(workdir, path):
+    "сервер в отдельном процессе; таблицы - во временной папке"
+    env = dict(os.environ, PYTHONPATH=os.path.join(ROOT, "src"))
+    process = subprocess.Popen(
+        [sys.executable, "-m", "primitive_db.main", "--serve", "--yes",
+         "--socket", path],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while not os.path.exists(path):
+        if process.poll() is not None or time.monotonic() > deadline:
+            process.kill()
+            raise RuntimeError("сервер не запустился")
+        time.sleep(0.05)
+    return process
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, default=16,
+                        help="число одновременных клиентов")
+    parser.add_argument("--requests", type=int, default=500,
+                        help="запросов на клиента")
+    parser.add_argument("--rows", type=int, default=2000,
+                        help="строк в таблице перед нагрузкой")
+    parser.add_argument("--socket", help="unix сокет запущенного сервера")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, help="порт запущенного сервера")
+    parser.add_argument("--output", help="файл для результатов json")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        process = None
+        path = args.socket
+        if path is None and args.port is None:
+            path = os.path.join(workdir, "db.sock")
+            process = _start_server(workdir, path)
+
+        def connect():
+            return AsyncClient.connect(path, args.host, args.port)
+
+        try:
+            results, errors = asyncio.run(_run(args, connect))
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+    total = results["total"]
+    print(f"{total['clients']} клиентов, {total['requests']} запросов: "
+          f"{total['requests_per_sec']} запр/с, ошибок {total['errors']}")
+    for kind, _ in MIX:
+        stats = results[kind]
+        print(f"  {kind:14} {stats['ops']:>7} запр."
+              f"  p50 {stats['p50_ms']:.3f} мс  p99 {stats['p99_ms']:.3f} мс")
+    if errors:
+        print(f"Первая ошибка: {errors[0]}")
+    print(f"Результаты: {write_results('server', results, args.output)}")
+
+if __name__ == "__main__":
+    main()
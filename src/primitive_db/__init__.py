@@ -0,0 +1,2 @@
+# версия пакета; совпадает с version в pyproject.toml
+__version__ = "0.1.0"
@@ -0,0 +1,71 @@
+from primitive_db import metrics
+from primitive_db.utils import (
+    data_files,
+    load_table_data,
+    recover_transactions,
+    table_lock,
+    table_stamp,
+)
+
+# таблицы, загруженные в этом процессе: table -> {"stamp": ..., "data": ...}
+_tables = {}
+# функции, которые вызываются с именем таблицы, когда каталог перечитывает
+# её после изменения извне: сбрасывают то, что посчитано по старым данным
+_reload_callbacks = []
+
+
+def get_table(table_name):
+    """
+    таблица из каталога процесса. загружается с диска при первом обращении
+    и перечитывается, только если её файлы изменили извне.
+    возвращает {} для несуществующей таблицы
+    """
+    stamp = table_stamp(table_name)
+    if stamp[0] is None:
+        _tables.pop(table_name, None)
+        return {}
+    entry = _tables.get(table_name)
+    if entry is not None and entry["stamp"] == stamp:
+        metrics.count("catalog.hits")
+        return entry["data"]
+    # транзакция, прерванная сбоем, дописывается до чтения таблицы
+    recover_transactions()
+    # читаем под блокировкой, чтобы не застать снимок и журнал посреди записи
+    with table_lock(table_name, shared=True), metrics.phase("load"):
+        stamp = table_stamp(table_name)
+        if stamp[0] is None:
+            _tables.pop(table_name, None)
+            return {}
+        data = load_table_data(table_name)
+    metrics.count("catalog.loads")
+    _tables[table_name] = {"stamp": stamp, "data": data}
+    if entry is not None:
+        for callback in _reload_callbacks:
+            callback(table_name)
+    return data
+
+def on_reload(callback):
+    "регистрирует callback(table_name) на перечитывание таблицы, изменённой извне"
+    _reload_callbacks.append(callback)
+
+def is_loaded(table_name):
+    "загружена ли таблица в каталог (без проверки свежести)"
+    return table_name in _tables
+
+def touch(table_name):
+    """
+    запоминает текущие отметки файлов таблицы после записи этим процессом,
+    чтобы собственное изменение не вызывало перечитывания
+    """
+    entry = _tables.get(table_name)
+    if entry is not None:
+        entry["stamp"] = table_stamp(table_name)
+
+def forget(table_name):
+    "выгружает таблицу из каталога - при удалении или неудачной записи"
+    _tables.pop(table_name, None)
+
+def list_tables():
+    "имена таблиц; папка data перечитывается, только если в ней что-то менялось"
+    # Фильтруем только .json файлы
+    return [f[:-5] for f in data_files() if f.endswith(".json")]
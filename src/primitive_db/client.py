@@ -0,0 +1,131 @@
+import asyncio
+import json
+import socket
+from typing import NamedTuple
+
+# Клиент сервера запросов (см. server.py) и построчный протокол обмена.
+# Запрос - одна строка: текст команды или json {"sql": ..., "params": [...]}
+# для команд с местами '?'. Ответ - строки json: {"columns": [...]} и
+# {"rows": [[...], ...]} для каждой страницы результата select,
+# последняя строка - {"ok": true|false, "message": "..."}.
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 5455
+# самая длинная строка протокола, которую читает asyncio: страница select
+# целиком идёт одной строкой
+LINE_LIMIT = 16 * 1024 * 1024
+
+
+class Result(NamedTuple):
+    "ответ сервера на одну команду"
+    ok: bool
+    message: str
+    columns: list
+    rows: list
+
+
+def encode_message(message):
+    "одна строка протокола из словаря"
+    return (json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+            + "\n").encode("utf-8")
+
+def encode_request(command, params=()):
+    "строка запроса: команда или json с командой и значениями для '?'"
+    if params:
+        return encode_message({"sql": command, "params": list(params)})
+    return (" ".join(command.splitlines()) + "\n").encode("utf-8")
+
+def _collect(line, response):
+    """
+    добавляет строку ответа в response (словарь столбцов и строк).
+    возвращает Result на последней строке ответа, иначе None
+    """
+    if not line:
+        raise ConnectionError("сервер закрыл соединение")
+    message = json.loads(line)
+    if "rows" in message:
+        response["rows"].extend(message["rows"])
+    elif "columns" in message:
+        response["columns"] = message["columns"]
+    else:
+        return Result(message["ok"], message["message"],
+                      response["columns"], response["rows"])
+    return None
+
+
+class Client:
+    """
+    блокирующий клиент сервера:
+
+        with Client(port=5455) as db:
+            db.execute("insert into users values ? ?", "Анна", 25)
+            result = db.execute("select * from users where age > 20")
+
+    path - путь к unix сокету; без него подключение идёт по tcp
+    """
+
+    def __init__(self, path=None, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        if path is not None:
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.connect(path)
+        else:
+            self._socket = socket.create_connection((host, port))
+        self._file = self._socket.makefile("rwb")
+
+    def execute(self, command, *params):
+        "выполняет команду на сервере и возвращает Result"
+        self._file.write(encode_request(command, params))
+        self._file.flush()
+        response = {"columns": None, "rows": []}
+        while True:
+            result = _collect(self._file.readline(), response)
+            if result is not None:
+                return result
+
+    def close(self):
+        self._file.close()
+        self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class AsyncClient:
+    """
+    клиент сервера для asyncio:
+
+        db = await AsyncClient.connect(port=5455)
+        result = await db.execute("select * from users where ID = ?", 1)
+        await db.close()
+    """
+
+    def __init__(self, reader, writer):
+        self._reader = reader
+        self._writer = writer
+
+    @classmethod
+    async def connect(cls, path=None, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(
+                path, limit=LINE_LIMIT)
+        else:
+            reader, writer = await asyncio.open_connection(
+                host, port, limit=LINE_LIMIT)
+        return cls(reader, writer)
+
+    async def execute(self, command, *params):
+        "выполняет команду на сервере и возвращает Result"
+        self._writer.write(encode_request(command, params))
+        await self._writer.drain()
+        response = {"columns": None, "rows": []}
+        while True:
+            result = _collect(await self._reader.readline(), response)
+            if result is not None:
+                return result
+
+    async def close(self):
+        self._writer.close()
+        await self._writer.wait_closed()
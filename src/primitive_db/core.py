@@ -1,20 +1,109 @@
+import heapq
 import json
 import os
+from contextlib import ExitStack
+from itertools import chain, islice
+from operator import itemgetter
 
-from prettytable import PrettyTable
-
+from primitive_db import metrics
+from primitive_db.catalog import (
+    forget,
+    get_table,
+    is_loaded,
+    on_reload,
+    touch,
+)
+from primitive_db.catalog import (
+    list_tables as catalog_tables,
+)
 from primitive_db.decorators import (
     confirm_action,
     create_cacher,
     handle_db_errors,
+    locked_table,
     log_time,
 )
-from primitive_db.utils import load_table_data, save_table_data
+from primitive_db.indexes import (
+    apply_to_indexes,
+    drop_indexes,
+    forget_indexes,
+    key_groups,
+    load_indexes,
+    save_indexes,
+)
+from primitive_db.indexes import (
+    create_index as build_index,
+)
+from primitive_db.parallel import default_workers, parallel_positions
+from primitive_db.query import (
+    as_where,
+    columns_of,
+    compile_where,
+    describe,
+    may_match,
+    plan_where,
+)
+from primitive_db.utils import (
+    STORAGE_BACKENDS,
+    export_table_json,
+    index_path,
+    is_columnar,
+    load_table_meta,
+    log_mutation,
+    log_path,
+    number_records,
+    persist_records,
+    read_import_file,
+    read_segments,
+    remove_table_files,
+    save_table_data,
+    scan_columnar,
+    segments_dir,
+    table_lock,
+    table_path,
+    table_stamp,
+    transaction_intent,
+)
+from primitive_db.vector import (
+    aggregate_vectorizable,
+    apply_to_vectors,
+    forget_vectors,
+    numpy_module,
+    vector_aggregate,
+    vector_positions,
+    vectorizable,
+)
+from primitive_db.views import (
+    apply_to_views,
+    base_table,
+    dependent_views,
+    is_view,
+    view_result,
+)
+from primitive_db.views import (
+    create_view as build_view,
+)
+from primitive_db.views import (
+    drop_view as remove_view,
+)
+from primitive_db.views import (
+    list_views as view_names,
+)
 
 
 @handle_db_errors
-def create_table(table_name, columns):
-    """Создаёт таблицу в db_meta.json. Добавляет столбец ID по умолчанию."""
+@log_time
+@locked_table
+def create_table(table_name, columns, storage="json"):
+    """Создаёт таблицу в db_meta.json. Добавляет столбец ID по умолчанию.
+    storage - формат хранения строк: json, колоночный columnar или
+    сегментами по диапазонам ID segmented."""
+    if _reject_in_transaction("create_table"):
+        return False
+
+    if storage not in STORAGE_BACKENDS:
+        print(f"Ошибка: формат хранения '{storage}' не поддерживается.")
+        return False
 
     for column in columns:
         if not isinstance(column, (list, tuple)) or len(column) != 2:
@@ -33,27 +122,43 @@ def create_table(table_name, columns):
     "columns": full_columns,
     "rows": []
     }
+    if storage != "json":
+        table_data["storage"] = storage
 
-    path = (f"src/primitive_db/data/{table_name}.json")
+    path = table_path(table_name)
     if os.path.exists(path):
         print(f"Ошибка: таблица '{table_name}' уже существует.")
         return False
+    if is_view(table_name):
+        print(f"Ошибка: '{table_name}' уже занято представлением.")
+        return False
     
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(table_data, f, indent=4, ensure_ascii=False)
+    save_table_data(table_name, table_data)
 
     print(f"Таблица '{table_name}' создана.")
     return True
 
 @handle_db_errors
 @confirm_action('удаление таблицы')
+@log_time
+@locked_table
 def drop_table(table_name):
     """
-    Удаляет файл таблицы из data/.
+    Удаляет файл таблицы из data/ вместе с представлениями над ней:
+    без базовой таблицы их нельзя ни прочитать, ни поддерживать.
     """
-    path = f"src/primitive_db/data/{table_name}.json"
+    if _reject_in_transaction("drop_table"):
+        return False
+    path = table_path(table_name)
     if os.path.exists(path):
-        os.remove(path)
+        for view_name in dependent_views(table_name):
+            remove_view(view_name)
+            print(f"Представление '{view_name}' над таблицей удалено.")
+        drop_indexes(table_name)
+        forget_vectors(table_name)
+        remove_table_files(table_name)
+        forget(table_name)
+        select_cacher.invalidate(table_name)
         print(f"Файл таблицы '{path}' успешно удалён.")
         return True
     else:
@@ -62,164 +167,1253 @@ def drop_table(table_name):
 
 
 def list_tables():
-    data_dir = "src/primitive_db/data"
-    if not os.path.exists(data_dir):
-        return []
-    # Фильтруем только .json файлы
-    tables = [f[:-5] for f in os.listdir(data_dir) if f.endswith(".json")]
-    return tables
+    return catalog_tables()
+
+def list_views():
+    return view_names()
 
 @handle_db_errors
 @log_time
-def insert(table_name, values):
-    path = (f"src/primitive_db/data/{table_name}.json")
+def create_view(view_name, operation, args):
+    """
+    Создаёт материализованное представление по select: operation и args -
+    операция и аргументы разобранной команды ("select" с условием или
+    агрегатный "aggregate"). Результат хранится в памяти и обновляется
+    по каждому изменению базовой таблицы, а не пересчитывается, поэтому
+    чтение представления не зависит от размера таблицы. limit, offset
+    и order by указываются при чтении, а не в определении.
+    """
+    if _reject_in_transaction("create_view"):
+        return False
+    if os.path.exists(table_path(view_name)) or is_view(view_name):
+        print(f"Ошибка: имя '{view_name}' уже занято таблицей или представлением.")
+        return False
+
+    match operation:
+        case "select":
+            table_name, where_clause, limit, offset, order_by = args
+            definition = {"table": table_name, "where": as_where(where_clause),
+                          "items": None, "group_by": []}
+        case "aggregate":
+            table_name, items, where_clause, group_by, limit, offset = args
+            order_by = None
+            definition = {"table": table_name, "where": as_where(where_clause),
+                          "items": [list(item) for item in items],
+                          "group_by": list(group_by or [])}
+        case _:
+            print("Ошибка: представление создаётся только по запросу select.")
+            return False
+    if limit is not None or offset or order_by is not None:
+        print("Ошибка: limit, offset и order by указываются при чтении "
+              "представления, а не в его определении.")
+        return False
+    if is_view(table_name):
+        print("Ошибка: представление по другому представлению не поддерживается.")
+        return False
+    if not get_table(table_name):
+        print(f"Таблицы {table_name} не существует.")
+        return False
+
+    with metrics.phase("build"):
+        view = build_view(view_name, definition)
+    print(f"Представление '{view_name}' создано, строк в результате: "
+          f"{len(view.result())}.")
+    return True
+
+@handle_db_errors
+@log_time
+def drop_view(view_name):
+    """Удаляет представление; базовая таблица не меняется."""
+    if not is_view(view_name):
+        print(f"Представления '{view_name}' не существует.")
+        return False
+    remove_view(view_name)
+    print(f"Представление '{view_name}' удалено.")
+    return True
+
+@handle_db_errors
+@log_time
+@locked_table
+def create_index(table_name, column):
+    """
+    Строит индекс по столбцу таблицы. Индекс используется select, update
+    и delete для условий where по этому столбцу.
+    """
+    if _reject_in_transaction("create_index"):
+        return False
+    metadata = get_table(table_name)
+    if not metadata:
+        print(f"Таблицы {table_name} не существует.")
+        return False
+
+    build_index(table_name, metadata, column)
+    touch(table_name)
+    print(f"Индекс по столбцу '{column}' таблицы '{table_name}' создан.")
+    return True
+
+@handle_db_errors
+@log_time
+def export_table(table_name, file_path):
+    """Выгружает таблицу в json файл независимо от формата её хранения."""
+    with table_lock(table_name, shared=True):
+        count = export_table_json(table_name, file_path)
+    print(f"Таблица '{table_name}' выгружена в '{file_path}', записей: {count}.")
+    return True
+
+COLUMN_TYPES = {"int": int, "str": str, "bool": bool}
+
+# столько строк импорта сохраняется одной записью журнала
+IMPORT_BATCH_SIZE = 10_000
+
+def _check_values(columns, values):
+    """
+    проверяет количество и типы значений строки. columns - столбцы без ID.
+    возвращает текст ошибки или None
+    """
+    if len(values) != len(columns):
+        return ("Количество введенных данных должно совпадать с "
+                "количеством столбцов в таблице")
+
+    for value, (_, col_type) in zip(values, columns):
+        if not isinstance(value, COLUMN_TYPES[col_type]):
+            return f"Ошибка: значение '{value}' должно быть типом '{col_type}'."
+    return None
+
+def _next_id(metadata):
+    """
+    следующий свободный ID таблицы. счётчик next_id хранится в таблице,
+    поэтому ID удалённых строк не выдаются повторно
+    """
+    last_id = metadata["rows"][-1][0] if metadata["rows"] else 0
+    return max(metadata.get("next_id", 1), last_id + 1)
+
+def _to_int(value):
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"значение '{value}' должно быть типом 'int'.") from None
+
+def _to_bool(value):
+    lowered = value.lower()
+    if lowered not in ("true", "false"):
+        raise ValueError(f"значение '{value}' должно быть типом 'bool'.")
+    return lowered == "true"
+
+def _iter_import_values(columns, file_path):
+    """
+    отдаёт значения строк файла импорта, приведённые и проверенные по типам
+    столбцов. в csv значения приводятся из строк, в jsonl они уже
+    типизированы и только проверяются
+    """
+    names = [name for name, _ in columns]
+    is_csv = file_path.lower().endswith(".csv")
+    converters = [{"int": _to_int, "str": str, "bool": _to_bool}[col_type]
+                  for _, col_type in columns]
+    header = [name.lower() for name in names]
+
+    for line_no, raw in read_import_file(file_path):
+        try:
+            if is_csv:
+                # строка заголовка
+                if line_no == 1 and [value.lower() for value in raw] == header:
+                    continue
+                if len(raw) != len(columns):
+                    raise ValueError("количество значений не совпадает "
+                                     "с количеством столбцов в таблице.")
+                values = [convert(value)
+                          for convert, value in zip(converters, raw)]
+            else:
+                values = [raw[name] for name in names] \
+                    if isinstance(raw, dict) else raw
+                error = _check_values(columns, values)
+                if error:
+                    raise ValueError(error)
+        except (KeyError, ValueError, TypeError) as e:
+            raise ValueError(f"строка {line_no}: {e}") from None
+        yield values
+
+def _append_rows(table_name, metadata, rows):
+    """назначает ID уже проверенным строкам и сохраняет их одной записью журнала"""
+    next_id = _next_id(metadata)
+    new_rows = [(next_id + i, *values) for i, values in enumerate(rows)]
+    metadata["rows"].extend(new_rows)
+    metadata["next_id"] = next_id + len(new_rows)
+    _commit(table_name, metadata, {"op": "insert_many", "rows": new_rows})
+    return len(new_rows)
+
+# открытая транзакция или None:
+# {"records": {таблица: [записи]}, "data": {таблица: таблица в памяти},
+#  "locks": блокировки затронутых таблиц}
+_transaction = None
+
+def _reject_in_transaction(operation):
+    """печатает ошибку и возвращает True, если открыта транзакция"""
+    if _transaction is None:
+        return False
+    print(f"Ошибка: {operation} нельзя выполнять внутри транзакции.")
+    return True
+
+def _stage(table_name, metadata, record, old_rows=()):
+    """
+    запоминает изменение открытой транзакции. таблица в каталоге уже
+    изменена и служит рабочей копией, диск не трогается до commit
+    """
+    records = _transaction["records"].get(table_name)
+    if records is None:
+        # таблица остаётся заблокированной до commit или rollback
+        _transaction["locks"].enter_context(table_lock(table_name))
+        records = _transaction["records"][table_name] = []
+        _transaction["data"][table_name] = metadata
+    number_records(metadata, [record])
+    records.append(record)
+    apply_to_indexes(table_name, metadata, record)
+    apply_to_vectors(table_name, metadata, record)
+    apply_to_views(table_name, metadata, record, old_rows)
+    select_cacher.invalidate(table_name)
+
+def _changed_rows(record):
+    "сколько строк затрагивает запись журнала"
+    if record["op"] == "insert":
+        return 1
+    return len(record["rows"] if record["op"] == "insert_many" else record["ids"])
+
+def _commit(table_name, metadata, record, old_rows=()):
+    """
+    фиксирует изменение в журнале, индексах, массивах столбцов,
+    представлениях и кеше.
+    metadata - таблица из каталога, к которой изменение уже применено,
+    old_rows - изменённые или удалённые строки в прежнем виде.
+    внутри транзакции изменение только запоминается
+    """
+    metrics.count("rows.changed", _changed_rows(record))
+    if _transaction is not None:
+        _stage(table_name, metadata, record, old_rows)
+        return
+    with metrics.phase("save"):
+        try:
+            compacted = log_mutation(table_name, metadata, record)
+        except Exception:
+            # таблица в памяти разошлась с диском - при следующем обращении перечитаем
+            forget(table_name)
+            raise
+        touch(table_name)
+        apply_to_indexes(table_name, metadata, record, compacted)
+    apply_to_vectors(table_name, metadata, record)
+    apply_to_views(table_name, metadata, record, old_rows)
+    select_cacher.invalidate(table_name)
+
+def begin():
+    """Открывает транзакцию: изменения копятся в памяти до commit."""
+    global _transaction
+    if _transaction is not None:
+        print("Ошибка: транзакция уже открыта.")
+        return False
+    _transaction = {"records": {}, "data": {}, "locks": ExitStack()}
+    print("Транзакция начата.")
+    return True
 
+@handle_db_errors
+@log_time
+def commit():
+    """
+    Сохраняет изменения транзакции во всех затронутых таблицах разом.
+    Записи сначала попадают в файл намерения, поэтому после сбоя
+    транзакция дописывается целиком при следующем чтении таблиц.
+    """
+    global _transaction
+    if _transaction is None:
+        print("Ошибка: нет открытой транзакции.")
+        return False
+    transaction, _transaction = _transaction, None
+    tables = transaction["records"]
+    try:
+        if tables:
+            with metrics.phase("save"), transaction_intent(tables):
+                for table_name, records in tables.items():
+                    metadata = transaction["data"][table_name]
+                    if persist_records(table_name, metadata, records):
+                        save_indexes(table_name)
+                    touch(table_name)
+    except Exception:
+        # журналы могли измениться частично: таблицы перечитаются с диска,
+        # а файл намерения допишет остальное
+        for table_name in tables:
+            forget(table_name)
+            forget_indexes(table_name)
+        raise
+    finally:
+        transaction["locks"].close()
+    count = sum(len(records) for records in tables.values())
+    print(f"Транзакция зафиксирована: изменений {count}, таблиц {len(tables)}.")
+    return True
+
+def rollback():
+    """Отменяет транзакцию: таблицы перечитываются с неизменённого диска."""
+    global _transaction
+    if _transaction is None:
+        print("Ошибка: нет открытой транзакции.")
+        return False
+    transaction, _transaction = _transaction, None
+    for table_name in transaction["records"]:
+        forget(table_name)
+        forget_indexes(table_name)
+        select_cacher.invalidate(table_name)
+    transaction["locks"].close()
+    print("Транзакция отменена, изменения не сохранены.")
+    return True
+
+def in_transaction():
+    return _transaction is not None
+
+@handle_db_errors
+@log_time
+@locked_table
+def insert(table_name, values):
     #проверяем что таблица существует
-    if not os.path.exists(path):
+    metadata = get_table(table_name)
+    if not metadata:
         print(f"Таблицы {table_name} не существует.")
         return False
     
-    #проверяем что количество введенных данных
-    # совпадает с количеством столбцов в таблице
-    metadata = load_table_data(table_name)
-    columns = len((metadata)["columns"])
-    if len(values) != (columns - 1):
-        print("Количество введенных данных должно совпадать с "
-              "количеством столбцов в таблице")
+    #проверяем что количество и типы введенных данных
+    # совпадают со столбцами таблицы
+    load_indexes(table_name, metadata)
+    error = _check_values(metadata["columns"][1:], values)
+    if error:
+        print(error)
         return False
-    
-    #проверяем что типы данных соответствуют типам столбцов
-    for i, value in enumerate(values):
-        if metadata["columns"][i + 1][1] == "int":
-            if not isinstance(value, int):
-                print(f"Ошибка: значение '{value}' должно быть типом 'int'.")
-                return False
-        elif metadata["columns"][i + 1][1] == "str":
-            if not isinstance(value, str):
-                print(f"Ошибка: значение '{value}' должно быть типом 'str'.")
-                return False
-        elif metadata["columns"][i + 1][1] == "bool":
-            if not isinstance(value, bool):
-                print(f"Ошибка: значение '{value}' должно быть типом 'bool'.")
-                return False
 
     #добавляем ID к значениям
-    if metadata["rows"]:
-        last_id = metadata["rows"][-1][0]
-        # преобразуем ID в число для выполнения арифметических операций
-        if isinstance(last_id, str):
-            last_id = int(last_id)
-        new_id = last_id + 1
-        new_id = str(new_id)
-    else:
-        new_id = 1
-        new_id = str(new_id)
-
-    new_row = [new_id] + values
+    new_id = _next_id(metadata)
+    new_row = (new_id, *values)
+    metadata["next_id"] = new_id + 1
 
     metadata["rows"].append(new_row)
     print(f"Запись с ID={new_id} в таблице '{table_name}' успешно добавлена.")
-    save_table_data(table_name, metadata)
-    select_cacher.invalidate()
+    _commit(table_name, metadata, {"op": "insert", "row": new_row})
+    return True
+
+@handle_db_errors
+@log_time
+@locked_table
+def insert_many(table_name, rows):
+    """
+    Добавляет сразу несколько записей. Таблица загружается один раз,
+    ID назначаются за один проход, изменение сохраняется одной записью журнала.
+    При ошибке в любой строке не добавляется ни одна.
+    """
+    metadata = get_table(table_name)
+    if not metadata:
+        print(f"Таблицы {table_name} не существует.")
+        return False
+
+    load_indexes(table_name, metadata)
+    columns = metadata["columns"][1:]
+    for i, values in enumerate(rows, start=1):
+        error = _check_values(columns, values)
+        if error:
+            print(f"Строка {i}: {error}")
+            return False
+
+    if not rows:
+        return False
+    added = _append_rows(table_name, metadata, rows)
+    print(f"В таблицу '{table_name}' добавлено записей: {added}.")
+    return True
+
+@handle_db_errors
+@log_time
+@locked_table
+def import_rows(table_name, file_path):
+    """
+    Загружает записи из .csv или .jsonl файла. Файл читается потоково,
+    записи сохраняются пачками по IMPORT_BATCH_SIZE: при ошибке в файле
+    пачки до неё остаются в таблице.
+    """
+    metadata = get_table(table_name)
+    if not metadata:
+        print(f"Таблицы {table_name} не существует.")
+        return False
+
+    load_indexes(table_name, metadata)
+    columns = metadata["columns"][1:]
+
+    imported = 0
+    batch = []
+    try:
+        for values in _iter_import_values(columns, file_path):
+            batch.append(values)
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                imported += _append_rows(table_name, metadata, batch)
+                batch = []
+        if batch:
+            imported += _append_rows(table_name, metadata, batch)
+    except ValueError as e:
+        print(f"Ошибка импорта из '{file_path}', {e}")
+
+    print(f"Импортировано записей в таблицу '{table_name}': {imported}.")
+    return imported > 0
+
+# select выводит результат страницами по столько строк
+SELECT_PAGE_SIZE = 100
+# печатать ли результаты select таблицами; в пакетном режиме по умолчанию нет
+render_tables = True
+
+def set_rendering(enabled):
+    """включает или выключает вывод результатов select"""
+    global render_tables
+    render_tables = bool(enabled)
+
+# получатель страниц результата вместо печати: функция (столбцы, строки).
+# сервер отправляет через него результаты клиентам
+page_sink = None
+
+def set_page_sink(sink):
+    """задаёт получателя страниц результатов select (None - печать)"""
+    global page_sink
+    page_sink = sink
+
+# полный проход по таблице от стольких строк идёт параллельно в пуле процессов
+PARALLEL_SCAN_THRESHOLD = 500_000
+# число процессов для параллельного прохода; меньше двух - проход всегда обычный
+PARALLEL_WORKERS = default_workers()
+# условие на столбцах int и bool проверяется векторно (NumPy) от стольких строк
+VECTOR_SCAN_THRESHOLD = 10_000
+# движок полного прохода: "auto" - векторный на больших таблицах, если
+# установлен NumPy, "numpy" - векторный всегда, "python" - обычный цикл
+SCAN_ENGINES = ("auto", "numpy", "python")
+scan_engine = "auto"
+
+def set_scan_engine(engine):
+    """
+    выбирает движок полного прохода из SCAN_ENGINES. "numpy" без
+    установленного NumPy - ошибка ValueError
+    """
+    global scan_engine
+    if engine not in SCAN_ENGINES:
+        raise ValueError(f"движок должен быть одним из: {', '.join(SCAN_ENGINES)}.")
+    if engine == "numpy" and numpy_module() is None:
+        raise ValueError("для движка numpy нужен установленный NumPy.")
+    scan_engine = engine
+
+def _use_vector(metadata):
+    "проверять ли условие векторно"
+    if scan_engine == "auto":
+        return len(metadata["rows"]) >= VECTOR_SCAN_THRESHOLD
+    return scan_engine == "numpy"
+
+def _where_plan(table_name, metadata, where_clause):
+    """
+    (условие, предикат, позиции-кандидаты) для where_clause. предикат
+    собирается один раз на запрос; позиции None - кандидатов подобрать
+    по индексу нельзя
+    """
+    node = as_where(where_clause)
+    predicate = compile_where(node, metadata["columns"])
+    return node, predicate, plan_where(table_name, metadata, node)
+
+def _scan_kind(metadata, node):
+    """
+    каким проходом проверяется условие без индекса: "vector", "parallel"
+    или "python" - обычным циклом
+    """
+    if _use_vector(metadata) and numpy_module() is not None \
+            and vectorizable(metadata["columns"], node):
+        return "vector"
+    if PARALLEL_WORKERS >= 2 and len(metadata["rows"]) >= PARALLEL_SCAN_THRESHOLD:
+        return "parallel"
+    return "python"
+
+def _full_scan(table_name, metadata, node):
+    """
+    позиции строк, подходящих под условие, найденные без индекса:
+    векторно или параллельно. None - годится только обычный проход
+    """
+    if _scan_kind(metadata, node) == "vector":
+        positions = vector_positions(table_name, metadata, node)
+        if positions is not None:
+            return positions
+    return _parallel_scan(metadata, node)
+
+def _parallel_scan(metadata, node):
+    """
+    позиции строк, подходящих под условие, найденные полным проходом
+    в пуле процессов. None - таблица меньше PARALLEL_SCAN_THRESHOLD,
+    и процессы запускать невыгодно
+    """
+    rows = metadata["rows"]
+    if PARALLEL_WORKERS < 2 or len(rows) < PARALLEL_SCAN_THRESHOLD:
+        return None
+    return parallel_positions(rows, node, metadata["columns"], PARALLEL_WORKERS,
+                              metadata.get("seq", 0))
+
+def _filter_rows(table_name, metadata, where_clause):
+    """
+    ленивый поиск строк, подходящих под where_clause: через индекс,
+    если он есть, иначе полным проходом (на больших таблицах - векторным
+    или параллельным)
+    """
+    rows = metadata["rows"]
+    if not where_clause:
+        metrics.count("scan.full")
+        metrics.count("rows.examined", len(rows))
+        return iter(rows)
+
+    node, predicate, positions = _where_plan(table_name, metadata, where_clause)
+    if positions is None:
+        metrics.count("rows.examined", len(rows))
+        matched = _full_scan(table_name, metadata, node)
+        if matched is not None:
+            return (rows[pos] for pos in matched)
+        metrics.count("scan.full")
+        return filter(predicate, rows)
+    metrics.count("scan.index")
+    metrics.count("rows.examined", len(positions))
+    return (rows[pos] for pos in positions if predicate(rows[pos]))
+
+def _match_positions(table_name, metadata, where_clause):
+    """позиции всех строк, подходящих под where_clause, по возрастанию"""
+    node, predicate, positions = _where_plan(table_name, metadata, where_clause)
+    rows = metadata["rows"]
+    if positions is None:
+        metrics.count("rows.examined", len(rows))
+        matched = _full_scan(table_name, metadata, node)
+        if matched is not None:
+            return matched
+        metrics.count("scan.full")
+        positions = range(len(rows))
+    else:
+        metrics.count("scan.index")
+        metrics.count("rows.examined", len(positions))
+    return [pos for pos in positions if predicate(rows[pos])]
+
+def _columnar_target(table_name, node):
+    """
+    (описание таблицы, позиция столбца условия), если условие можно
+    проверить по одному столбцу колоночного файла, иначе None: условие
+    затрагивает несколько столбцов, таблица не колоночная, есть
+    несвёрнутый журнал или индексы. вызывается под блокировкой таблицы
+    """
+    if node is None or len(columns_of(node)) != 1 \
+            or not is_columnar(table_name) \
+            or os.path.exists(log_path(table_name)) \
+            or os.path.exists(index_path(table_name)):
+        return None
+    meta = load_table_meta(table_name)
+    (column,) = columns_of(node)
+    column_index = next((i for i, col in enumerate(meta["columns"])
+                         if col[0] == column), None)
+    if column_index is None:
+        raise KeyError(column)
+    return meta, column_index
+
+def _scan_columnar(table_name, where_clause):
+    """
+    поиск в колоночной таблице, читающий с диска только столбец условия.
+    возвращает (имена столбцов, строки) или None, если путь не подходит
+    (см. _columnar_target)
+    """
+    node = as_where(where_clause)
+    with table_lock(table_name, shared=True), metrics.phase("load"):
+        target = _columnar_target(table_name, node)
+        if target is None:
+            return None
+        meta, column_index = target
+        metrics.count("scan.columnar")
+        # условие собирается над одним столбцом: значение - кортеж из одного
+        predicate = compile_where(node, [meta["columns"][column_index]])
+        rows = scan_columnar(table_name, meta, column_index,
+                             lambda value: predicate((value,)))
+    return [col[0] for col in meta["columns"]], rows
+
+def _pruned_segments(table_name, node):
+    """
+    (описание таблицы, сегменты, которые нужно прочитать), если границы
+    значений сегментов отсеивают хотя бы один из них, иначе None: таблица
+    не сегментирована, есть несвёрнутый журнал или отсеивать нечего -
+    тогда выгоднее загрузить таблицу в каталог. вызывается под блокировкой
+    таблицы
+    """
+    if node is None or not os.path.isdir(segments_dir(table_name)) \
+            or os.path.exists(log_path(table_name)):
+        return None
+    meta = load_table_meta(table_name)
+    segments = [segment for segment in meta["segments"]
+                if may_match(node, meta["columns"], segment["stats"])]
+    if len(segments) == len(meta["segments"]):
+        return None
+    return meta, segments
+
+def _scan_segments(table_name, where_clause):
+    """
+    поиск в сегментированной таблице, читающий с диска только сегменты,
+    границы значений которых не исключают условие. возвращает (имена
+    столбцов, строки) или None, если путь не подходит (см. _pruned_segments)
+    """
+    node = as_where(where_clause)
+    with table_lock(table_name, shared=True), metrics.phase("load"):
+        pruned = _pruned_segments(table_name, node)
+        if pruned is None:
+            return None
+        meta, segments = pruned
+        columns = meta["columns"]
+        metrics.count("scan.segments")
+        metrics.count("segments.skipped", len(meta["segments"]) - len(segments))
+        metrics.count("rows.examined",
+                      sum(segment["rows"] for segment in segments))
+        rows = read_segments(table_name, segments)
+    predicate = compile_where(node, columns)
+    return [col[0] for col in columns], [row for row in rows if predicate(row)]
+
+def iter_rows(table_name, where_clause=None, limit=None, offset=0):
+    """
+    Генератор записей таблицы, подходящих под where_clause.
+    offset записей пропускается, выдаётся не больше limit (None - все).
+    """
+    metadata = get_table(table_name)
+    if not metadata:
+        raise KeyError(table_name)
+    rows = _filter_rows(table_name, metadata, where_clause)
+    stop = None if limit is None else offset + limit
+    yield from islice(rows, offset, stop)
+
+def _print_pages(field_names, rows, keep=0):
+    """
+    печатает строки страницами по SELECT_PAGE_SIZE по мере их получения.
+    возвращает все напечатанные строки, если их не больше keep, иначе None
+    """
+    rows = iter(rows)
+    kept = []
+    printed = 0
+    while True:
+        # строки выбираются лениво: поиск идёт по мере заполнения страниц
+        with metrics.phase("filter"):
+            page = list(islice(rows, SELECT_PAGE_SIZE))
+        if printed and not page:
+            break
+        if page_sink is not None:
+            with metrics.phase("render"):
+                page_sink(field_names, page)
+        elif render_tables:
+            # prettytable загружается при первом выводе таблицы
+            from prettytable import PrettyTable
+
+            with metrics.phase("render"):
+                table = PrettyTable()
+                table.field_names = field_names
+                table.add_rows(page)
+                print(table)
+        printed += len(page)
+        if kept is not None:
+            kept.extend(page)
+            if printed > keep:
+                kept = None
+        if len(page) < SELECT_PAGE_SIZE:
+            break
+    metrics.count("rows.returned", printed)
+    return kept
+
+# результаты select больше этого числа строк не кешируются
+SELECT_CACHE_MAX_ROWS = 10_000
 
 select_cacher = create_cacher()
+# таблица, перечитанная каталогом, изменилась: её результаты устарели
+on_reload(select_cacher.invalidate)
+# отметки файлов таблиц на момент, когда их результаты попали в кеш
+_cached_stamps = {}
+
+def _fresh_cache(table_name):
+    """
+    сбрасывает результаты таблицы в кеше, если её файлы изменились после
+    того, как результаты были сохранены: например, в таблицу записал
+    другой процесс. вызывается перед каждым обращением к кешу
+    """
+    stamp = table_stamp(table_name)
+    if _cached_stamps.get(table_name) != stamp:
+        select_cacher.invalidate(table_name)
+        _cached_stamps[table_name] = stamp
+
+def collect_stats():
+    """метрики процесса вместе с состоянием кеша select"""
+    return dict(metrics.snapshot(), cache=select_cacher.stats())
+
+def dump_stats(path):
+    """сохраняет метрики в json файл для внешних систем сбора"""
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(collect_stats(), file, indent=4, ensure_ascii=False)
+
+# сколько строк сортируется в памяти: результат order by без limit
+# больше этого сортируется кусками через временные файлы
+SORT_MEMORY_ROWS = 100_000
+
+def _spill(rows):
+    "сбрасывает отсортированный кусок строк во временный файл"
+    # tempfile нужен только большим сортировкам и не замедляет запуск
+    import tempfile
+
+    file = tempfile.TemporaryFile("w+", encoding="utf-8")
+    for row in rows:
+        file.write(json.dumps(row, ensure_ascii=False))
+        file.write("\n")
+    file.seek(0)
+    metrics.count("sort.spills")
+    return file
+
+def _read_spill(file):
+    for line in file:
+        yield tuple(json.loads(line))
+
+def _external_sort(rows, key, reverse):
+    """
+    сортирует поток строк, держа в памяти не больше SORT_MEMORY_ROWS строк:
+    отсортированные куски сбрасываются во временные файлы и сливаются.
+    порядок равных строк сохраняется
+    """
+    rows = iter(rows)
+    with metrics.phase("sort"):
+        chunk = sorted(islice(rows, SORT_MEMORY_ROWS), key=key, reverse=reverse)
+    if len(chunk) < SORT_MEMORY_ROWS:
+        yield from chunk
+        return
+    # временные файлы закрываются (и удаляются), когда слияние дочитано
+    with ExitStack() as stack:
+        files = []
+        with metrics.phase("sort"):
+            while chunk:
+                files.append(stack.enter_context(_spill(chunk)))
+                chunk = sorted(islice(rows, SORT_MEMORY_ROWS), key=key,
+                               reverse=reverse)
+        yield from heapq.merge(*(_read_spill(file) for file in files),
+                               key=key, reverse=reverse)
+
+def _sort_rows(rows, key, reverse, top=None):
+    """
+    строки в порядке key. top - нужно только столько первых строк:
+    они выбираются кучей за один проход, в памяти - не больше top строк
+    """
+    if top is None:
+        return _external_sort(rows, key, reverse)
+    with metrics.phase("sort"):
+        pick = heapq.nlargest if reverse else heapq.nsmallest
+        return pick(top, rows, key=key)
+
+def _order_strategy(table_name, metadata, node, column):
+    """
+    как получить строки в порядке столбца: "id" - строки уже упорядочены,
+    "index" - по индексу столбца потоком, если условие не сужает
+    выбор своим индексом, "sort" - сортировкой (см. _sort_rows)
+    """
+    if column == "ID":
+        return "id"
+    # неизвестный столбец - ошибка KeyError, как и при сортировке
+    _column_getter(metadata["columns"], column)
+    if column in load_indexes(table_name, metadata) and (
+            node is None or plan_where(table_name, metadata, node) is None):
+        return "index"
+    return "sort"
+
+def _ordered_rows(table_name, metadata, where_clause, order_by, top=None):
+    """
+    строки под where_clause в порядке order_by = (столбец, по убыванию ли):
+    по ID, по индексу или сортировкой (см. _order_strategy)
+    """
+    column, descending = order_by
+    key, _ = _column_getter(metadata["columns"], column)
+    rows = metadata["rows"]
+    node = as_where(where_clause)
+    strategy = _order_strategy(table_name, metadata, node, column)
+    if strategy == "id":
+        metrics.count("sort.index")
+        if not descending:
+            return _filter_rows(table_name, metadata, where_clause)
+        if not where_clause:
+            metrics.count("rows.examined", len(rows))
+            return reversed(rows)
+        positions = _match_positions(table_name, metadata, where_clause)
+        return (rows[pos] for pos in reversed(positions))
+
+    if strategy == "index":
+        index = load_indexes(table_name, metadata)[column]
+        metrics.count("sort.index")
+        metrics.count("rows.examined", len(rows))
+        ordered = chain.from_iterable(
+            group for _, group in key_groups(rows, index, reverse=descending))
+        if node is None:
+            return ordered
+        return filter(compile_where(node, metadata["columns"]), ordered)
+
+    return _sort_rows(_filter_rows(table_name, metadata, where_clause),
+                      key, descending, top)
+
+def _select_key(table_name, where_clause, limit, offset, order_by):
+    "ключ результата select в кеше"
+    return f"select:{table_name}:{where_clause}:{limit}:{offset}:{order_by}"
+
+def _select_view(view, where_clause, limit, offset, order_by):
+    """
+    выводит результат материализованного представления. условие и порядок
+    применяются к готовому результату, таблица не читается
+    """
+    columns, rows = view
+    metrics.count("rows.examined", len(rows))
+    node = as_where(where_clause)
+    if node is not None:
+        rows = filter(compile_where(node, columns), rows)
+    stop = None if limit is None else offset + limit
+    if order_by is not None:
+        key, _ = _column_getter(columns, order_by[0])
+        rows = _sort_rows(rows, key, order_by[1], stop)
+    _print_pages([name for name, _ in columns], islice(rows, offset, stop))
+    return True
+
 @handle_db_errors
 @log_time
-def select(table_name, where_clause=None):
+def select(table_name, where_clause=None, limit=None, offset=0, order_by=None):
     """where_clause = {'variable': 'value'} - выводит только
-    записи где значения variable равны value"""
-    cache_key = f"select:{table_name}:{where_clause}"
+    записи где значения variable равны value. order_by = (столбец,
+    по убыванию ли) задаёт порядок, limit и offset ограничивают выдачу.
+    Записи выводятся страницами, в кеш попадают строки результатов
+    не длиннее SELECT_CACHE_MAX_ROWS"""
+    view = view_result(table_name)
+    if view is not None:
+        return _select_view(view, where_clause, limit, offset, order_by)
 
-    def load_data():
-        path = (f"src/primitive_db/data/{table_name}.json")
+    cache_key = _select_key(table_name, where_clause, limit, offset, order_by)
+    _fresh_cache(table_name)
+    cached = select_cacher.get(table_name, cache_key)
+    if cached is not None:
+        field_names, rows = cached
+        _print_pages(field_names, rows)
+        return True
 
+    # не загруженную колоночную таблицу ищем прямо в файле
+    rows = None
+    if not is_loaded(table_name):
+        rows = _scan_columnar(table_name, where_clause) \
+            or _scan_segments(table_name, where_clause)
+    stop = None if limit is None else offset + limit
+    if rows is not None:
+        field_names, rows = rows
+        if order_by is not None:
+            key, _ = _column_getter([(name, None) for name in field_names],
+                                    order_by[0])
+            rows = _sort_rows(rows, key, order_by[1], stop)
+    else:
         #проверяем что таблица существует
-        if not os.path.exists(path):
+        metadata = get_table(table_name)
+        if not metadata:
             print(f"Таблицы {table_name} не существует.")
-            return False, None
-        
-        metadata = load_table_data(table_name)
-        table = PrettyTable()
-        table.field_names = [col[0] for col in metadata["columns"]]
+            return False
+        field_names = [col[0] for col in metadata["columns"]]
+        if order_by is not None:
+            rows = _ordered_rows(table_name, metadata, where_clause, order_by,
+                                 stop)
+        else:
+            rows = _filter_rows(table_name, metadata, where_clause)
 
-        #выводим данные при пустом where_clause
-        if not where_clause:
-            table.add_rows(metadata["rows"])
-            return True, table
+    kept = _print_pages(field_names, islice(rows, offset, stop),
+                        keep=SELECT_CACHE_MAX_ROWS)
+    if kept is not None:
+        select_cacher.put(table_name, cache_key, (field_names, kept),
+                          size=max(len(kept), 1))
+    return True
 
-        #проверяем корректность where_clause
-        if not isinstance(where_clause, dict) or len(where_clause) != 1:
-            print("Ошибка: where_clause должен быть словарем с ровно одним ключом.")
-            return False, None
-        
-        #выводим данные при where_clause
-        column_index = None
-        for i, column in enumerate(metadata["columns"]):
-            if column[0] == list(where_clause.keys())[0]:
-                column_index = i
-                break
-
-        if column_index is None:
-            print(f"Ошибка: столбец '{list(where_clause.keys())[0]}' не найден.")
-            return False, None
-    
-        # преобразуем значения для корректного сравнения
-        where_value = list(where_clause.values())[0]
-        
-        rows_to_add = []
-        for row in metadata["rows"]:
-            row_value = row[column_index]
-            
-            # если оба значения могут быть преобразованы в числа, сравниваем как числа
-            if (isinstance(row_value, str) and row_value.isdigit() and
-                isinstance(where_value, int)):
-                row_value = int(row_value)
-            elif (isinstance(row_value, int) and
-                  isinstance(where_value, str) and where_value.isdigit()):
-                where_value = int(where_value)
-                
-            if row_value == where_value:
-                rows_to_add.append(row)
-        
-        if rows_to_add:
-            table.add_rows(rows_to_add)
-        return True, table
-
-    def print_table(result):
-        success, table = result
-        if success and table is not None:
-            print(table)
-        return success
-    
-    # Вызываем кэшер с функцией пост-обработки для печати таблицы
-    result = select_cacher(cache_key, load_data, print_table)
-    
-    # Возвращаем результат (True или False)
+# агрегатные функции select: count(*), count, sum, avg, min, max
+AGGREGATE_FUNCTIONS = ("count", "sum", "avg", "min", "max")
+
+def _column_getter(columns, column):
+    """(функция row -> значение, тип) для столбца"""
+    for i, (name, col_type) in enumerate(columns):
+        if name == column:
+            return itemgetter(i), col_type
+    raise KeyError(column)
+
+def _accumulator(func, getter, col_type):
+    """
+    (начальное значение, шаг, итог) для агрегатной функции. для int и bool
+    суммы копятся целыми числами: True считается за 1
+    """
+    match func:
+        case "count":
+            return 0, lambda acc, row: acc + 1, None
+        case "sum" | "avg" if col_type not in ("int", "bool"):
+            raise ValueError(f"функция {func} применима только к столбцам "
+                             "int и bool.")
+        case "sum":
+            if col_type == "bool":
+                return 0, lambda acc, row: acc + (1 if getter(row) else 0), None
+            return 0, lambda acc, row: acc + getter(row), None
+        case "avg":
+            # сумма и количество; итог - их частное
+            return ((0, 0), lambda acc, row: (acc[0] + getter(row), acc[1] + 1),
+                    lambda acc: acc[0] / acc[1] if acc[1] else None)
+        case "min":
+            def step(acc, row):
+                value = getter(row)
+                return value if acc is None or value < acc else acc
+            return None, step, None
+        case "max":
+            def step(acc, row):
+                value = getter(row)
+                return value if acc is None or value > acc else acc
+            return None, step, None
+    raise ValueError(f"неизвестная агрегатная функция {func}.")
+
+def _aggregate_rows(table_name, metadata, where_clause, group_getters,
+                    outputs, accumulators, group_by):
+    "строки агрегатного select, посчитанные одним проходом по строкам"
+    initial = [start for start, _, _ in accumulators]
+    steps = list(enumerate(step for _, step, _ in accumulators))
+
+    # группа -> список состояний накопителей
+    groups = {}
+    if not group_by:
+        groups[()] = list(initial)
+    with metrics.phase("aggregate"):
+        for row in _filter_rows(table_name, metadata, where_clause):
+            key = tuple(get(row) for get in group_getters)
+            state = groups.get(key)
+            if state is None:
+                state = groups[key] = list(initial)
+            for i, step in steps:
+                state[i] = step(state[i], row)
+
+    result = []
+    for key in sorted(groups):
+        state = groups[key]
+        finals = iter(final(acc) if final else acc
+                      for (_, _, final), acc in zip(accumulators, state))
+        result.append([key[spec] if kind == "group" else next(finals)
+                       for kind, spec in outputs])
     return result
 
+def _vector_aggregates(table_name, metadata, node, items, group_by):
+    """
+    считать ли агрегаты над массивами столбцов: включён векторный движок,
+    все столбцы int/bool и для условия нет индекса
+    """
+    return _use_vector(metadata) and numpy_module() is not None \
+        and aggregate_vectorizable(metadata["columns"], node, items, group_by) \
+        and (node is None or plan_where(table_name, metadata, node) is None)
+
+def _aggregate_key(table_name, items, where_clause, group_by, limit, offset):
+    "ключ результата агрегатного select в кеше"
+    return f"aggregate:{table_name}:{items}:{where_clause}:{group_by}:" \
+           f"{limit}:{offset}"
+
 @handle_db_errors
-def update(table_name, set_clause, where_clause):
-    path = (f"src/primitive_db/data/{table_name}.json")
+@log_time
+def aggregate(table_name, items, where_clause=None, group_by=None,
+              limit=None, offset=0):
+    """
+    Агрегатный select: items - список пар (функция, столбец), для простого
+    столбца функция None, для count(*) столбец '*'. Простые столбцы должны
+    входить в group_by. Строки проходятся один раз, в памяти держится
+    только состояние групп, а не сами строки.
+    """
+    group_by = list(group_by or [])
+    cache_key = _aggregate_key(table_name, items, where_clause, group_by,
+                               limit, offset)
+    _fresh_cache(table_name)
+    cached = select_cacher.get(table_name, cache_key)
+    if cached is not None:
+        _print_pages(*cached)
+        return True
+
+    metadata = get_table(table_name)
+    if not metadata:
+        print(f"Таблицы {table_name} не существует.")
+        return False
+    columns = metadata["columns"]
+
+    group_getters = [_column_getter(columns, column)[0] for column in group_by]
+    # для каждого столбца результата: позиция в ключе группы или накопитель
+    outputs = []
+    for func, column in items:
+        if func is None:
+            if column not in group_by:
+                print(f"Ошибка: столбец '{column}' должен быть в group by.")
+                return False
+            outputs.append(("group", group_by.index(column)))
+        elif column == "*":
+            if func != "count":
+                print(f"Ошибка: {func}(*) не поддерживается, только count(*).")
+                return False
+            outputs.append(("acc", _accumulator(func, None, None)))
+        else:
+            getter, col_type = _column_getter(columns, column)
+            outputs.append(("acc", _accumulator(func, getter, col_type)))
+    accumulators = [spec for kind, spec in outputs if kind == "acc"]
+
+    result = None
+    node = as_where(where_clause)
+    if _vector_aggregates(table_name, metadata, node, items, group_by):
+        result = vector_aggregate(table_name, metadata, node, items, group_by)
+        if result is not None:
+            metrics.count("rows.examined", len(metadata["rows"]))
+    if result is None:
+        result = _aggregate_rows(table_name, metadata, where_clause,
+                                 group_getters, outputs, accumulators, group_by)
+    stop = None if limit is None else offset + limit
+    result = result[offset:stop]
+
+    field_names = [column if func is None else f"{func}({column})"
+                   for func, column in items]
+    _print_pages(field_names, result)
+    if len(result) <= SELECT_CACHE_MAX_ROWS:
+        select_cacher.put(table_name, cache_key, (field_names, result),
+                          size=max(len(result), 1))
+    return True
+
+def _join_column(name, tables):
+    """
+    (таблица, столбец) для имени из запроса с соединением: "таблица.столбец"
+    или просто столбец, если он есть только в одной из таблиц.
+    tables - пары (имя таблицы, её столбцы)
+    """
+    if "." in name:
+        table_name, column = name.split(".", 1)
+        for candidate, columns in tables:
+            if candidate == table_name:
+                if not any(col[0] == column for col in columns):
+                    raise KeyError(name)
+                return table_name, column
+        raise KeyError(table_name)
+    owners = [table_name for table_name, columns in tables
+              if any(col[0] == name for col in columns)]
+    if not owners:
+        raise KeyError(name)
+    if len(owners) > 1:
+        raise ValueError(f"столбец '{name}' есть в обеих таблицах, укажите "
+                         f"таблицу: {owners[0]}.{name}")
+    return owners[0], name
+
+def _rename_where(node, rename):
+    "копия условия, где каждый столбец заменён на rename(столбец)"
+    match node[0]:
+        case "and" | "or":
+            return (node[0], _rename_where(node[1], rename),
+                    _rename_where(node[2], rename))
+        case "cmp":
+            return ("cmp", node[1], rename(node[2]), node[3])
+        case "in":
+            return ("in", rename(node[1]), node[2])
+        case "between":
+            return ("between", rename(node[1]), node[2], node[3])
+    raise ValueError(f"неизвестное условие: {node[0]}")
+
+def _conjuncts(node):
+    "части условия, связанные через and верхнего уровня"
+    if node[0] == "and":
+        return _conjuncts(node[1]) + _conjuncts(node[2])
+    return [node]
+
+def _all_of(nodes):
+    "условие из частей, связанных через and; None - частей нет"
+    node = None
+    for part in nodes:
+        node = part if node is None else ("and", node, part)
+    return node
+
+def _split_join_where(node, tables):
+    """
+    раскладывает условие запроса с соединением на части, которые
+    проверяются до соединения в каждой таблице (со своими именами
+    столбцов), и остаток над соединёнными строками ("таблица.столбец").
+    возвращает ([условие левой, условие правой], остаток)
+    """
+    pushed = ([], [])
+    rest = []
+    for part in _conjuncts(node):
+        owners = {_join_column(column, tables)[0] for column in columns_of(part)}
+        side = next((i for i, (table_name, _) in enumerate(tables)
+                     if owners == {table_name}), None)
+        if side is None:
+            rest.append(_rename_where(
+                part, lambda column: ".".join(_join_column(column, tables))))
+        else:
+            pushed[side].append(_rename_where(
+                part, lambda column: _join_column(column, tables)[1]))
+    return [_all_of(parts) for parts in pushed], _all_of(rest)
+
+def _merge_join(left, right, keys, wheres):
+    """
+    соединение слиянием двух потоков групп строк, упорядоченных по ключу
+    (см. indexes.key_groups). в памяти держится только текущая группа
+    правой таблицы. строки выдаются по возрастанию ключа
+    """
+    groups = []
+    predicates = []
+    for (table_name, metadata), key, node in zip((left, right), keys, wheres):
+        index = None
+        if key != 0:
+            column = metadata["columns"][key][0]
+            index = load_indexes(table_name, metadata)[column]
+        groups.append(key_groups(metadata["rows"], index))
+        metrics.count("rows.examined", len(metadata["rows"]))
+        predicates.append(compile_where(node, metadata["columns"]) if node else None)
+    left_groups, right_groups = groups
+    left_pred, right_pred = predicates
+
+    left_group = next(left_groups, None)
+    right_group = next(right_groups, None)
+    while left_group is not None and right_group is not None:
+        if left_group[0] < right_group[0]:
+            left_group = next(left_groups, None)
+        elif left_group[0] > right_group[0]:
+            right_group = next(right_groups, None)
+        else:
+            right_rows = [row for row in right_group[1]
+                          if right_pred is None or right_pred(row)]
+            for left_row in left_group[1]:
+                if left_pred is not None and not left_pred(left_row):
+                    continue
+                for right_row in right_rows:
+                    yield left_row + right_row
+            left_group = next(left_groups, None)
+            right_group = next(right_groups, None)
+
+def _hash_join(left, right, keys, wheres):
+    """
+    соединение хешированием: строки меньшей таблицы (после её части
+    условия) раскладываются по ключу в словарь, строки большей проходятся
+    потоком. в памяти - только меньшая сторона. порядок - порядок большей
+    """
+    sides = [(table_name, metadata, key, node) for (table_name, metadata), key, node
+             in zip((left, right), keys, wheres)]
+    build_left = len(left[1]["rows"]) <= len(right[1]["rows"])
+    build, probe = sides if build_left else sides[::-1]
+
+    with metrics.phase("build"):
+        table = {}
+        build_key = build[2]
+        for row in _filter_rows(build[0], build[1], build[3]):
+            table.setdefault(row[build_key], []).append(row)
+
+    probe_key = probe[2]
+    for row in _filter_rows(probe[0], probe[1], probe[3]):
+        for match in table.get(row[probe_key], ()):
+            yield match + row if build_left else row + match
+
+def _sorted_key(table_name, metadata, column_index):
+    "упорядочены ли строки по ключу: ключ - ID или по столбцу есть индекс"
+    if column_index == 0:
+        return True
+    column = metadata["columns"][column_index][0]
+    return column in load_indexes(table_name, metadata)
+
+def _merge_joinable(sides, keys):
+    "соединяются ли таблицы слиянием: ключи обеих упорядочены"
+    return all(_sorted_key(table_name, metadata, key)
+               for (table_name, metadata), key in zip(sides, keys))
+
+def _join_sides(left_table, right_table, on):
+    """
+    (пары (таблица, данные), пары (таблица, столбцы), позиции ключей)
+    для соединения по on. печатает ошибку и возвращает None, если таблицы
+    нет, таблица соединяется сама с собой или ключи не подходят
+    """
+    if left_table == right_table:
+        print("Ошибка: соединение таблицы с самой собой не поддерживается.")
+        return None
+    sides = []
+    for table_name in (left_table, right_table):
+        metadata = get_table(table_name)
+        if not metadata:
+            print(f"Таблицы {table_name} не существует.")
+            return None
+        sides.append((table_name, metadata))
+    tables = [(table_name, metadata["columns"]) for table_name, metadata in sides]
+
+    # ключи соединения: по одному столбцу из каждой таблицы, в любом порядке
+    left_on, right_on = (_join_column(name, tables) for name in on)
+    if left_on[0] == right_table and right_on[0] == left_table:
+        left_on, right_on = right_on, left_on
+    if left_on[0] != left_table or right_on[0] != right_table:
+        print("Ошибка: в on должны быть столбцы обеих таблиц.")
+        return None
+    keys = [next(i for i, col in enumerate(columns) if col[0] == column)
+            for (_, columns), (_, column) in zip(tables, (left_on, right_on))]
+    types = [tables[side][1][key][1] for side, key in enumerate(keys)]
+    if types[0] != types[1]:
+        print(f"Ошибка: столбцы {'.'.join(left_on)} и {'.'.join(right_on)} "
+              f"разных типов ({types[0]} и {types[1]}).")
+        return None
+    return sides, tables, keys
+
+@handle_db_errors
+@log_time
+def join(left_table, right_table, on, columns=None, where_clause=None,
+         limit=None, offset=0, order_by=None):
+    """
+    select с соединением двух таблиц по равенству столбцов on = (столбец
+    левой, столбец правой). columns - столбцы результата (None - все столбцы
+    обеих таблиц с именами "таблица.столбец"). Если ключи обеих таблиц
+    упорядочены (ID или столбец с индексом), таблицы сливаются по индексам,
+    иначе меньшая таблица хешируется по ключу, а большая проходится потоком.
+    Части where, относящиеся к одной таблице, проверяются до соединения.
+    order_by = (столбец, по убыванию ли) сортирует результат. Результат
+    выводится страницами по мере соединения.
+    """
+    joined = _join_sides(left_table, right_table, on)
+    if joined is None:
+        return False
+    sides, tables, keys = joined
+    combined = [(f"{table_name}.{name}", col_type)
+                for table_name, columns in tables for name, col_type in columns]
+
+    node = as_where(where_clause)
+    wheres, rest = _split_join_where(node, tables) if node else ([None, None], None)
 
+    if _merge_joinable(sides, keys):
+        metrics.count("join.merge")
+        rows = _merge_join(*sides, keys, wheres)
+    else:
+        metrics.count("join.hash")
+        rows = _hash_join(*sides, keys, wheres)
+    if rest is not None:
+        rows = filter(compile_where(rest, combined), rows)
+
+    stop = None if limit is None else offset + limit
+    if order_by is not None:
+        key, _ = _column_getter(combined, ".".join(_join_column(order_by[0],
+                                                                tables)))
+        rows = _sort_rows(rows, key, order_by[1], stop)
+
+    if columns is None:
+        field_names = [name for name, _ in combined]
+    else:
+        field_names = list(columns)
+        names = [name for name, _ in combined]
+        positions = [names.index(".".join(_join_column(column, tables)))
+                     for column in columns]
+        rows = (tuple(row[i] for i in positions) for row in rows)
+
+    _print_pages(field_names, islice(rows, offset, stop))
+    return True
+
+@handle_db_errors
+@log_time
+@locked_table
+def update(table_name, set_clause, where_clause):
     #проверяем что таблица существует
-    if not os.path.exists(path):
+    metadata = get_table(table_name)
+    if not metadata:
         print(f"Таблицы {table_name} не существует.")
         return False
 
-    metadata = load_table_data(table_name)
+    load_indexes(table_name, metadata)
 
     #проверяем что where_clause и set_clause корректны
-    if not isinstance(where_clause, dict) or len(where_clause) != 1:
-        print("Ошибка: where_clause должен быть словарем с ровно одним ключом.")
+    if not where_clause:
+        print("Ошибка: для update нужно условие where.")
         return False
     
     if not isinstance(set_clause, dict) or len(set_clause) != 1:
         print("Ошибка: set_clause должен быть словарем с ровно одним ключом.")
         return False
     
-    #ключи и значения where_clause и set_clause
-    where_col_name = list(where_clause.keys())[0]
-    where_col_value = list(where_clause.values())[0]
+    #ключи и значения set_clause
     set_col_name = list(set_clause.keys())[0]
     new_value = list(set_clause.values())[0]
 
@@ -227,14 +1421,6 @@ def update(table_name, set_clause, where_clause):
         print("Ошибка: изменение значения ID запрещено.")
         return False
 
-    #индекс столбца для условия (WHERE)
-    try:
-        where_col_index = next(i for i, col in enumerate(metadata["columns"])
-                               if col[0] == where_col_name)
-    except StopIteration:
-        print(f"Ошибка: столбец '{where_col_name}' не найден.")
-        return False
-
     #индекс столбца для обновления (SET)
     try:
         set_col_index = next(i for i, col in enumerate(metadata["columns"])
@@ -243,89 +1429,298 @@ def update(table_name, set_clause, where_clause):
         print(f"Ошибка: столбец '{set_col_name}' не найден.")
         return False
 
+    #приводим новое значение к типу столбца
+    set_col_type = metadata["columns"][set_col_index][1]
+    if isinstance(new_value, str) and set_col_type != "str":
+        new_value = {"int": _to_int, "bool": _to_bool}[set_col_type](new_value)
+    error = _check_values([(set_col_name, set_col_type)], [new_value])
+    if error:
+        print(error)
+        return False
+
     #обновляем строки
-    updated = False
-    for row in metadata["rows"]:
-        # преобразуем значения для корректного сравнения
-        row_value = row[where_col_index]
-        where_value = where_col_value
-        
-        # если оба значения могут быть преобразованы в числа, сравниваем как числа
-        if (isinstance(row_value, str) and row_value.isdigit() and
-            isinstance(where_value, int)):
-            row_value = int(row_value)
-        elif (isinstance(row_value, int) and
-              isinstance(where_value, str) and where_value.isdigit()):
-            where_value = int(where_value)
-            
-        if row_value == where_value:
-            row[set_col_index] = new_value
-            updated = True
-
-    if not updated:
-        print(f"Условие '{where_col_name} = {where_col_value}' не найдено.")
+    updated_ids = []
+    old_rows = []
+    rows = metadata["rows"]
+    with metrics.phase("filter"):
+        positions = _match_positions(table_name, metadata, where_clause)
+    for pos in positions:
+        # строки - кортежи: изменённая строка заменяет старую
+        row = rows[pos]
+        rows[pos] = (*row[:set_col_index], new_value, *row[set_col_index + 1:])
+        updated_ids.append(row[0])
+        old_rows.append(row)
+
+    if not updated_ids:
+        print(f"Условие '{describe(as_where(where_clause))}' не найдено.")
         return False
 
     print(f"Таблица '{table_name}' успешно обновлена.")
-    save_table_data(table_name, metadata)
-    select_cacher.invalidate()
+    _commit(table_name, metadata, {"op": "update", "ids": updated_ids,
+                                   "col": set_col_index, "value": new_value},
+            old_rows)
     return True
     
 @handle_db_errors
 @confirm_action('удаление строки')
+@log_time
+@locked_table
 def delete(table_name, where_clause):
-    path = f"src/primitive_db/data/{table_name}.json"
-
-    if not os.path.exists(path):
+    metadata = get_table(table_name)
+    if not metadata:
         print(f"Таблицы '{table_name}' не существует.")
         return False
     
-    metadata = load_table_data(table_name)
+    load_indexes(table_name, metadata)
 
-    if not isinstance(where_clause, dict) or len(where_clause) != 1:
-        print("Ошибка: where_clause должен быть словарём с одним ключом.")
+    if not where_clause:
+        print("Ошибка: для delete нужно условие where.")
         return False
 
-    column_name = list(where_clause.keys())[0]
-    column_value = list(where_clause.values())[0]
-
-    try:
-        col_index = next(i for i, col in enumerate(metadata["columns"])
-                        if col[0] == column_name)
-    except StopIteration:
-        print(f"Ошибка: столбец '{column_name}' не найден.")
-        return False
-
-    initial_count = len(metadata["rows"])
-    # преобразуем значения для корректного сравнения в фильтре
-    def compare_values(row_value, compare_value):
-        # если оба значения могут быть преобразованы в числа, сравниваем как числа
-        row_val = row_value
-        comp_val = compare_value
-        
-        if (isinstance(row_val, str) and row_val.isdigit() and
-            isinstance(comp_val, int)):
-            row_val = int(row_val)
-        elif (isinstance(row_val, int) and
-              isinstance(comp_val, str) and comp_val.isdigit()):
-            comp_val = int(comp_val)
-            
-        return row_val != comp_val
-    
-    metadata["rows"] = [row for row in metadata["rows"]
-                        if compare_values(row[col_index], column_value)]
+    condition = describe(as_where(where_clause))
+    rows = metadata["rows"]
+    with metrics.phase("filter"):
+        positions = _match_positions(table_name, metadata, where_clause)
+    deleted_rows = [rows[pos] for pos in positions]
+    deleted_ids = [row[0] for row in deleted_rows]
+    if len(positions) * 8 < len(rows):
+        # немного строк - удаляем на месте
+        for pos in reversed(positions):
+            del rows[pos]
+    else:
+        dropped = set(positions)
+        metadata["rows"] = [row for pos, row in enumerate(rows)
+                            if pos not in dropped]
 
-    deleted_count = initial_count - len(metadata["rows"])
+    deleted_count = len(deleted_ids)
 
     if deleted_count == 0:
-        print(f"Условие '{column_name} = {column_value}' не найдено. "
+        print(f"Условие '{condition}' не найдено. "
               "Ничего не удалено.")
         return False
 
-    save_table_data(table_name, metadata)
-    select_cacher.invalidate()
+    _commit(table_name, metadata, {"op": "delete", "ids": deleted_ids},
+            deleted_rows)
     print(f"Успешно удалено {deleted_count} строк с условием "
-          f"'{column_name} = {column_value}'.")
+          f"'{condition}'.")
     return True
 
+def _access_plan(table_name, metadata, node):
+    "как найдутся строки таблицы под условием node (см. _filter_rows)"
+    total = len(metadata["rows"])
+    if node is None:
+        return f"все строки {table_name} ({total})"
+    positions = plan_where(table_name, metadata, node)
+    if positions is not None:
+        return (f"индекс или диапазон ID в {table_name}: кандидатов "
+                f"{len(positions)} из {total}")
+    match _scan_kind(metadata, node):
+        case "vector":
+            scan = "векторный проход (NumPy)"
+        case "parallel":
+            scan = f"параллельный проход в {PARALLEL_WORKERS} процессах"
+        case _:
+            scan = "полный проход"
+    return f"{scan} по {table_name}: {total} строк"
+
+def _direct_plan(table_name, node):
+    "чтение не загруженной таблицы прямо из файлов или None (см. select)"
+    with table_lock(table_name, shared=True):
+        target = _columnar_target(table_name, node)
+        if target is not None:
+            meta, column_index = target
+            return (f"колоночный файл {table_name}: читается только столбец "
+                    f"{meta['columns'][column_index][0]}")
+        pruned = _pruned_segments(table_name, node)
+        if pruned is not None:
+            meta, segments = pruned
+            rows = sum(segment["rows"] for segment in segments)
+            return (f"сегменты {table_name}: читается {len(segments)} из "
+                    f"{len(meta['segments'])} ({rows} строк), остальные "
+                    "отсеяны по границам значений")
+    return None
+
+def _sort_plan(order_by, stop):
+    column, descending = order_by
+    direction = "по убыванию" if descending else "по возрастанию"
+    if stop is not None:
+        return f"сортировка {column} {direction}: куча на первые {stop} строк"
+    return (f"сортировка {column} {direction} в памяти, больше "
+            f"{SORT_MEMORY_ROWS} строк - кусками через временные файлы")
+
+def _paging_plan(limit, offset):
+    if limit is None and not offset:
+        return []
+    shown = "все" if limit is None else f"не больше {limit}"
+    return [("выдача", f"{shown} строк, пропустив первые {offset}")]
+
+def _change_plan(table_name, metadata):
+    "что обновляется вместе с изменением таблицы"
+    steps = [("журнал", "изменения в памяти до commit" if in_transaction()
+              else f"запись в {table_name}.log")]
+    indexes = list(load_indexes(table_name, metadata))
+    if indexes:
+        steps.append(("индексы", ", ".join(indexes)))
+    views = [name for name in view_names() if base_table(name) == table_name]
+    if views:
+        steps.append(("представления", ", ".join(views)))
+    return steps
+
+def _explain_select(table_name, where_clause=None, limit=None, offset=0,
+                    order_by=None):
+    node = as_where(where_clause)
+    stop = None if limit is None else offset + limit
+    steps = [("условие", describe(node))] if node is not None else []
+    if is_view(table_name):
+        steps.append(("доступ", "готовый результат представления над "
+                      f"{base_table(table_name)}, таблица не читается"))
+        if order_by is not None:
+            steps.append(("порядок", _sort_plan(order_by, stop)))
+        return steps + _paging_plan(limit, offset)
+    _fresh_cache(table_name)
+    if select_cacher.contains(table_name, _select_key(table_name, where_clause,
+                                                      limit, offset, order_by)):
+        return steps + [("кеш", "результат уже в кеше, таблица не читается")]
+    steps.append(("кеш", "результата в кеше нет"))
+
+    direct = None if is_loaded(table_name) else _direct_plan(table_name, node)
+    if direct is not None:
+        steps.append(("доступ", direct))
+        if order_by is not None:
+            steps.append(("порядок", _sort_plan(order_by, stop)))
+        return steps + _paging_plan(limit, offset)
 
+    metadata = get_table(table_name)
+    if not metadata:
+        print(f"Таблицы {table_name} не существует.")
+        return None
+    strategy = None if order_by is None \
+        else _order_strategy(table_name, metadata, node, order_by[0])
+    if strategy == "index":
+        steps.append(("доступ", f"индекс {order_by[0]}: строки {table_name} "
+                      f"потоком в порядке ключа ({len(metadata['rows'])})"))
+        steps.append(("порядок", "по индексу, без сортировки"))
+    else:
+        steps.append(("доступ", _access_plan(table_name, metadata, node)))
+        if strategy == "id":
+            steps.append(("порядок", "по ID, без сортировки"))
+        elif strategy == "sort":
+            steps.append(("порядок", _sort_plan(order_by, stop)))
+    return steps + _paging_plan(limit, offset)
+
+def _explain_aggregate(table_name, items, where_clause=None, group_by=None,
+                       limit=None, offset=0):
+    group_by = list(group_by or [])
+    node = as_where(where_clause)
+    steps = [("условие", describe(node))] if node is not None else []
+    _fresh_cache(table_name)
+    if select_cacher.contains(table_name, _aggregate_key(
+            table_name, items, where_clause, group_by, limit, offset)):
+        return steps + [("кеш", "результат уже в кеше, таблица не читается")]
+    steps.append(("кеш", "результата в кеше нет"))
+
+    metadata = get_table(table_name)
+    if not metadata:
+        print(f"Таблицы {table_name} не существует.")
+        return None
+    functions = ", ".join(f"{func}({column})" for func, column in items
+                          if func is not None)
+    if group_by:
+        functions += f" по группам {', '.join(group_by)}"
+    if _vector_aggregates(table_name, metadata, node, items, group_by):
+        steps.append(("доступ", f"массивы столбцов {table_name} (NumPy): "
+                      f"{len(metadata['rows'])} строк"))
+        steps.append(("агрегаты", f"{functions} - векторно"))
+    else:
+        steps.append(("доступ", _access_plan(table_name, metadata, node)))
+        steps.append(("агрегаты", f"{functions} - один проход, в памяти "
+                      "только состояние групп"))
+    return steps + _paging_plan(limit, offset)
+
+def _explain_join(left_table, right_table, on, columns=None, where_clause=None,
+                  limit=None, offset=0, order_by=None):
+    joined = _join_sides(left_table, right_table, on)
+    if joined is None:
+        return None
+    sides, tables, keys = joined
+    node = as_where(where_clause)
+    wheres, rest = _split_join_where(node, tables) if node else ([None, None], None)
+
+    steps = [(f"условие {table_name}", describe(where))
+             for (table_name, _), where in zip(sides, wheres) if where is not None]
+    if _merge_joinable(sides, keys):
+        steps.append(("соединение", "слияние по упорядоченным ключам (ID или "
+                      "индекс), строки обеих таблиц идут потоком"))
+    else:
+        build, probe = sorted(zip(sides, wheres),
+                              key=lambda side: len(side[0][1]["rows"]))
+        steps.append(("соединение", f"хеширование: по {build[0][0]} строится "
+                      f"таблица в памяти, {probe[0][0]} проходится потоком"))
+        for (table_name, metadata), where in (build, probe):
+            steps.append(("доступ", _access_plan(table_name, metadata, where)))
+    if rest is not None:
+        steps.append(("после соединения", describe(rest)))
+    if order_by is not None:
+        steps.append(("порядок", _sort_plan(
+            order_by, None if limit is None else offset + limit)))
+    return steps + _paging_plan(limit, offset)
+
+def _explain_change(table_name, where_clause, change):
+    metadata = get_table(table_name)
+    if not metadata:
+        print(f"Таблицы {table_name} не существует.")
+        return None
+    node = as_where(where_clause)
+    steps = [("условие", describe(node))] if node is not None else []
+    steps.append(("доступ", _access_plan(table_name, metadata, node)))
+    steps.append(("изменение", change))
+    return steps + _change_plan(table_name, metadata)
+
+def _explain_insert(table_name, values):
+    metadata = get_table(table_name)
+    if not metadata:
+        print(f"Таблицы {table_name} не существует.")
+        return None
+    steps = [("вставка", f"строка в конец {table_name} "
+              f"({len(metadata['rows'])} строк)")]
+    return steps + _change_plan(table_name, metadata)
+
+def _explain_view(view_name, operation, args):
+    table_name = args[0]
+    metadata = get_table(table_name)
+    if not metadata:
+        print(f"Таблицы {table_name} не существует.")
+        return None
+    node = as_where(args[1] if operation == "select" else args[2])
+    return [("представление", f"{view_name}: результат строится один раз и "
+             f"дальше обновляется по изменениям {table_name}"),
+            ("построение", _access_plan(table_name, metadata, node))]
+
+# планы операций parser.Statement для explain
+_PLANNERS = {
+    "select": _explain_select,
+    "aggregate": _explain_aggregate,
+    "join": _explain_join,
+    "insert": _explain_insert,
+    "update": lambda table_name, set_clause, where_clause: _explain_change(
+        table_name, where_clause, f"столбец {', '.join(set_clause)}"),
+    "delete": lambda table_name, where_clause: _explain_change(
+        table_name, where_clause, "удаление строк"),
+    "create_view": _explain_view,
+}
+
+@handle_db_errors
+def explain(operation, args):
+    """
+    Печатает план разобранной команды, не выполняя её: есть ли результат
+    в кеше, как найдутся строки (индекс, векторный, параллельный или полный
+    проход, колоночный файл, отсеянные сегменты), порядок, способ
+    соединения и что обновится вместе с изменением.
+    """
+    steps = _PLANNERS[operation](*args)
+    if steps is None:
+        return False
+    print(f"План {operation}:")
+    for step, detail in steps:
+        print(f"  {step}: {detail}")
+    return True
@@ -1,6 +1,10 @@
 import time
+from collections import OrderedDict
 from functools import wraps
 
+from primitive_db import metrics
+from primitive_db.utils import table_lock
+
 
 def handle_db_errors(func):
     @wraps(func)
@@ -18,44 +22,122 @@ def handle_db_errors(func):
             print(f"Произошла непредвиденная ошибка: {e}")
     return wrapper
 
+# ответ на подтверждения без вопроса: None - спрашивать, True - да, False - нет
+_auto_confirm = None
+
+def set_auto_confirm(answer):
+    """задаёт ответ на подтверждения для пакетного режима (None - спрашивать)"""
+    global _auto_confirm
+    _auto_confirm = answer
+
 def confirm_action(action_name):
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            confirm = input(f"Вы уверены, что хотите выполнить '{action_name}'? [y/n]:")
-            if not confirm.lower() == 'y':
+            if _auto_confirm is False:
+                print(f"Операция '{action_name}' пропущена: нужно подтверждение "
+                      "(запустите с флагом --yes).")
                 return False
+            if _auto_confirm is None:
+                confirm = input(f"Вы уверены, что хотите выполнить "
+                                f"'{action_name}'? [y/n]:")
+                if not confirm.lower() == 'y':
+                    return False
             return func(*args, **kwargs)
         return wrapper
     return decorator
 
+def locked_table(func):
+    """
+    выполняет изменение таблицы под исключительной блокировкой: таблица
+    (первый аргумент) перечитывается и записывается без вмешательства
+    других процессов
+    """
+    @wraps(func)
+    def wrapper(table_name, *args, **kwargs):
+        with table_lock(table_name):
+            return func(table_name, *args, **kwargs)
+    return wrapper
+
 def log_time(func):
+    """
+    записывает число вызовов и гистограмму времени операции в metrics.
+    время печатается, только если включён вывод в консоль
+    """
     @wraps(func)
     def wrapper(*args, **kwargs):
         start_time = time.monotonic()
-        result = func(*args, **kwargs)
-        if result:
+        with metrics.operation(func.__name__):
+            result = func(*args, **kwargs)
+        if result and metrics.console:
             end_time = time.monotonic()
             elapsed = end_time - start_time
             print(f"Функция {func.__name__} выполнилась за {elapsed:.3f} секунд")
-            return result
+        return result
     return wrapper
 
-def create_cacher():
-    cache = {}
-    def cache_result(key, value_func, post_process=None):
-        if key in cache:
-            print(f"Результат для {key} получен из кеша.")
-            result = cache[key]
-            if post_process:
-                post_process(result)
-            return result
-        result = value_func()
-        cache[key] = result
-        print(f"Результат для {key} добавлен в кеш.")
+def create_cacher(max_entries=256, max_rows=100_000):
+    """
+    LRU-кеш результатов запросов, разбитый по таблицам.
+    max_entries ограничивает число результатов, max_rows - суммарное число
+    строк в них (память). Давно не использованные результаты вытесняются.
+    """
+    cache = OrderedDict()  # (таблица, ключ) -> (число строк, результат)
+    stats = {"hits": 0, "misses": 0, "evictions": 0, "rows": 0}
+
+    def get(table, key):
+        entry = cache.get((table, key))
+        if entry is None:
+            stats["misses"] += 1
+            metrics.count("cache.misses")
+            return None
+        cache.move_to_end((table, key))
+        stats["hits"] += 1
+        metrics.count("cache.hits")
+        metrics.echo(f"Результат для {key} получен из кеша.")
+        return entry[1]
+
+    def contains(table, key):
+        "есть ли результат в кеше - без учёта в попаданиях и порядке вытеснения"
+        return (table, key) in cache
+
+    def put(table, key, value, size=1):
+        # результат, который больше всего кеша, не сохраняем
+        if size > max_rows:
+            return
+        old = cache.pop((table, key), None)
+        if old is not None:
+            stats["rows"] -= old[0]
+        cache[(table, key)] = (size, value)
+        stats["rows"] += size
+        while len(cache) > max_entries or stats["rows"] > max_rows:
+            _, (evicted_size, _) = cache.popitem(last=False)
+            stats["rows"] -= evicted_size
+            stats["evictions"] += 1
+            metrics.count("cache.evictions")
+        metrics.echo(f"Результат для {key} добавлен в кеш.")
+
+    def invalidate(table=None):
+        "сбрасывает результаты одной таблицы или весь кеш"
+        if table is None:
+            cache.clear()
+            stats["rows"] = 0
+            return
+        for cache_key in [k for k in cache if k[0] == table]:
+            stats["rows"] -= cache.pop(cache_key)[0]
+
+    def cache_result(table, key, value_func, post_process=None):
+        result = get(table, key)
+        if result is None:
+            result = value_func()
+            put(table, key, result)
         if post_process:
             post_process(result)
         return result
-    cache_result.invalidate = lambda key=None: cache.clear() if key is None \
-        else cache.pop(key, None)
-    return cache_result
\ No newline at end of file
+
+    cache_result.get = get
+    cache_result.contains = contains
+    cache_result.put = put
+    cache_result.invalidate = invalidate
+    cache_result.stats = lambda: dict(stats, entries=len(cache))
+    return cache_result
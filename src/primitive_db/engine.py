@@ -1,11 +1,55 @@
 # src/primitive_db/engine.py
-import os
 import shlex
+import time
 
-import prompt
+from primitive_db import metrics
+from primitive_db.core import (
+    begin,
+    collect_stats,
+    commit,
+    create_index,
+    create_table,
+    drop_table,
+    drop_view,
+    dump_stats,
+    export_table,
+    import_rows,
+    in_transaction,
+    list_tables,
+    list_views,
+    rollback,
+)
+from primitive_db.parser import explain_crud, parse_crud
+from primitive_db.utils import deferred_sync, ensure_data_dir
 
-from primitive_db.core import create_table, drop_table, list_tables
-from primitive_db.parser import parse_crud
+# команды, которые разбирает parser
+CRUD_COMMANDS = ("select", "update", "delete", "insert", "create")
+# счётчики metrics, по которым profile показывает выбранный командой путь
+PLAN_COUNTERS = {
+    "cache.hits": "результат из кеша",
+    "catalog.loads": "таблица загружена с диска",
+    "views.reads": "готовый результат представления",
+    "scan.index": "индекс или диапазон ID",
+    "scan.vector": "векторный проход (NumPy)",
+    "aggregate.vector": "агрегаты векторно (NumPy)",
+    "scan.parallel": "параллельный проход",
+    "scan.full": "полный проход",
+    "scan.columnar": "колоночный файл",
+    "scan.segments": "сегменты по границам значений",
+    "sort.index": "порядок по ID или индексу",
+    "join.merge": "соединение слиянием",
+    "join.hash": "соединение хешированием",
+}
+# счётчики строк и данных в сводке profile
+SUMMARY_COUNTERS = {
+    "rows.examined": "просмотрено строк",
+    "rows.returned": "выдано строк",
+    "rows.changed": "изменено строк",
+    "segments.skipped": "отсеяно сегментов",
+    "sort.spills": "кусков сортировки на диске",
+    "bytes.read": "прочитано байт",
+    "bytes.written": "записано байт",
+}
 
 
 def print_help():
@@ -13,92 +57,362 @@ def print_help():
    
     print("\n***Процесс работы с таблицей***")
     print("Хранение таблиц:")
-    print("<command> create_table <имя_таблицы> <столбец1:тип> .. - создать таблицу")
+    print("<command> create_table <имя_таблицы> <столбец1:тип> .."
+    " [using columnar|segmented] - создать таблицу")
     print("<command> list_tables - показать список всех таблиц")
     print("<command> drop_table <имя_таблицы> - удалить таблицу")
+    print("<command> create_index <имя_таблицы> <столбец> - создать индекс")
+    print("<command> import <имя_таблицы> <файл.csv|файл.jsonl> - загрузить записи")
+    print("<command> export <имя_таблицы> <файл.json> - выгрузить таблицу в json")
     
     print("\nКоманды модификации таблицы:")
     print("<command> insert into <имя_таблицы>" \
     " values (<значение1>, <значение2>, ...) - создать запись")
     print("<command> select * from <имя_таблицы> - прочитать все записи")
     print("<command> select * from <имя_таблицы>" \
-    " where <столбец>=<значение> - прочитать записи по условию")
+    " where <условие> - прочитать записи по условию")
+    print("    условие: =, !=, <, <=, >, >=, in (...), between .. and .., and, or, ()")
+    print("<command> select * from <имя_таблицы> [where ...]" \
+    " limit <N> offset <M> - прочитать N записей, пропустив первые M")
+    print("<command> select * from <имя_таблицы> [where ...]" \
+    " order by <столбец> [asc|desc] [limit <N>] - записи по порядку столбца")
+    print("<command> select count(*)|sum|avg|min|max(<столбец>), .. from <имя_таблицы>"
+    " [where ...] [group by <столбец>] - агрегаты по записям")
+    print("<command> select *|<столбцы> from <таблица> join <таблица>"
+    " on <a.столбец> = <b.столбец> [where ...] - соединение двух таблиц")
+    print("<command> create view <имя> as select ... - материализованное"
+    " представление, читается как select * from <имя>")
+    print("<command> drop_view <имя> - удалить представление")
     print("<command> update <имя_таблицы> set <столбец>=<значение>" \
-    " where <столбец>=<значение> - обновить запись")
+    " where <условие> - обновить запись")
     print("<command> delete from <имя_таблицы>" \
-    " where <столбец>=<значение> - удалить запись")
+    " where <условие> - удалить запись")
     #print("<command> info <имя_таблицы> - вывести информацию о таблице")
     
 
+    print("\nТранзакции:")
+    print("<command> begin - начать транзакцию")
+    print("<command> commit - сохранить изменения транзакции во всех таблицах разом")
+    print("<command> rollback - отменить изменения транзакции")
+
+    print("\nМетрики:")
+    print("<command> stats - счётчики и время операций по фазам")
+    print("<command> stats json <файл.json> - сохранить метрики в файл")
+    print("<command> stats reset - обнулить метрики")
+    print("<command> timing on|off - печатать время операций и события кеша")
+    print("<command> explain <команда> - план команды без её выполнения")
+    print("<command> profile [dump <файл.prof>] <команда> - выполнить команду"
+    " и показать план, строки, байты и время фаз")
+
     print("\nОбщие команды:")
     print("<command> exit - выход из программы")
     print("<command> help - справочная информация\n")
 
+def print_stats():
+    """Печатает метрики процесса: время операций и фаз, счётчики, кеш."""
+    from prettytable import PrettyTable
+
+    stats = collect_stats()
+    if not stats["timings"] and not stats["counters"]:
+        print("Метрик пока нет.")
+        return
+
+    timings = PrettyTable()
+    timings.field_names = ["операция", "вызовов", "всего мс", "сред мс",
+                           "p50 мс", "p99 мс", "макс мс"]
+    for name, timing in stats["timings"].items():
+        timings.add_row([name, timing["count"], timing["total_ms"],
+                         timing["avg_ms"], timing["p50_ms"], timing["p99_ms"],
+                         timing["max_ms"]])
+    print(timings)
+
+    counters = PrettyTable()
+    counters.field_names = ["счётчик", "значение"]
+    counters.add_rows(list(stats["counters"].items()))
+    print(counters)
+
+    cache = stats["cache"]
+    print(f"Кеш select: {cache['entries']} результатов, {cache['rows']} строк, "
+          f"попаданий {cache['hits']}, промахов {cache['misses']}, "
+          f"вытеснено {cache['evictions']}.")
+
+def print_profile(before, after, elapsed, ok):
+    """
+    Печатает, что сделала команда между двумя снимками collect_stats:
+    выбранный путь, строки и байты, время операций и их фаз.
+    """
+    from prettytable import PrettyTable
+
+    old = before["counters"]
+    counters = {name: value - old.get(name, 0)
+                for name, value in after["counters"].items()
+                if value != old.get(name, 0)}
+    state = "успешно" if ok else "с ошибкой"
+    print(f"Профиль: {elapsed * 1000:.3f} мс, {state}.")
+    plan = [label if counters[name] == 1 else f"{label} x{counters[name]}"
+            for name, label in PLAN_COUNTERS.items() if name in counters]
+    if plan:
+        print(f"План: {', '.join(plan)}.")
+    summary = [f"{label} {counters.get(name, 0)}"
+               for name, label in SUMMARY_COUNTERS.items()
+               if name in counters or name in ("rows.examined", "rows.returned")]
+    print(f"{', '.join(summary).capitalize()}.")
+
+    stages = PrettyTable()
+    stages.field_names = ["фаза", "вызовов", "мс"]
+    old = before["timings"]
+    for name, timing in after["timings"].items():
+        previous = old.get(name, {"count": 0, "total_ms": 0})
+        calls = timing["count"] - previous["count"]
+        if calls:
+            stages.add_row([name, calls,
+                            round(timing["total_ms"] - previous["total_ms"], 3)])
+    if stages.rows:
+        print(stages)
+    other = [f"{name} {value}" for name, value in counters.items()
+             if name not in PLAN_COUNTERS and name not in SUMMARY_COUNTERS]
+    if other:
+        print(f"Прочие счётчики: {', '.join(other)}.")
+
+def wrapped_command(command):
+    """
+    (файл для dump или None, команда внутри) для explain <команда>
+    и profile [dump <файл.prof>] <команда>
+    """
+    words = command.split(None, 3)
+    if words[0].lower() == "profile" and len(words) > 2 \
+            and words[1].lower() == "dump":
+        return words[2], words[3] if len(words) > 3 else ""
+    return None, command.split(None, 1)[1] if len(words) > 1 else ""
+
+def _profile_command(command):
+    """
+    profile [dump <файл.prof>] <команда>: выполняет команду и печатает её
+    профиль; с dump ещё сохраняет профиль cProfile для python -m pstats
+    """
+    dump, inner = wrapped_command(command)
+    if not inner.strip():
+        print("Использование: profile [dump <файл.prof>] <команда>")
+        return False
+
+    profiler = None
+    if dump is not None:
+        # cProfile нужен только для dump
+        import cProfile
+
+        profiler = cProfile.Profile()
+    before = collect_stats()
+    start = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        ok = execute(inner)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+    elapsed = time.perf_counter() - start
+    print_profile(before, collect_stats(), elapsed, ok)
+    if profiler is not None:
+        profiler.dump_stats(dump)
+        print(f"Профиль cProfile сохранён в '{dump}' (python -m pstats {dump}).")
+    return ok
+
+def _explain_command(command):
+    "explain <команда>: план crud команды без её выполнения"
+    _, inner = wrapped_command(command)
+    if not inner.strip() or inner.split(None, 1)[0].lower() not in CRUD_COMMANDS:
+        print("Использование: explain select|insert|update|delete|create ...")
+        return False
+    return bool(explain_crud(inner))
+
+def _create_table_command(args):
+    if len(args) < 3:
+        print("В таблицу необходимо добавить хотя бы один столбец.")
+        return False
+    # необязательный формат хранения в конце: using <формат>
+    storage = "json"
+    col_args = args[2:]
+    if len(col_args) >= 2 and col_args[-2] == "using":
+        storage = col_args[-1]
+        col_args = col_args[:-2]
+    columns = []
+    for col in col_args:
+        if ":" in col:
+            name, type = col.split(":", 1)
+        elif "=" in col:
+            name, type = col.split("=", 1)
+        else:
+            print(f"Неверный формат столбца: '{col}'. "
+            "Столбец не был обработан.")
+            return False
+        columns.append((name.strip(), type.strip()))
+    return create_table(args[1], columns, storage)
+
+def execute(command):
+    """
+    Выполняет одну команду (кроме exit). Возвращает True, если команда
+    выполнена успешно.
+    """
+    words = command.split(None, 1)
+    if not words:
+        return True
+    # crud команды разбирает parser - без лишнего прохода shlex
+    name = words[0].lower()
+    if name in CRUD_COMMANDS:
+        return bool(parse_crud(command))
+    if name == "explain":
+        return _explain_command(command)
+    if name == "profile":
+        return bool(_profile_command(command))
+    args = shlex.split(command.lower())
+
+    match args[0]:
+        case 'help':
+            print_help()
+            return True
+
+        case 'create_table':
+            return bool(_create_table_command(args))
+
+        case 'list_tables':
+            tables = list_tables()
+            if tables:
+                print("Список таблиц:")
+                for table in tables:
+                    print(f"  - {table}")
+            else:
+                print("Таблицы отсутствуют.")
+            views = list_views()
+            if views:
+                print("Представления:")
+                for view in views:
+                    print(f"  - {view}")
+            return True
+
+        case 'drop_view':
+            if len(args) != 2:
+                print("Неверное количество аргументов. "
+                "Использование: drop_view <имя_представления>")
+                return False
+            return bool(drop_view(args[1]))
+
+        case 'drop_table':
+            if len(args) != 2:
+                print("Неверное количество аргументов. "
+                "Использование: drop_table <имя_таблицы>")
+                return False
+            return bool(drop_table(args[1]))
+
+        case 'create_index':
+            if len(args) != 3:
+                print("Неверное количество аргументов. "
+                "Использование: create_index <имя_таблицы> <столбец>")
+                return False
+            return bool(create_index(args[1], args[2]))
+
+        case 'import':
+            if len(args) != 3:
+                print("Неверное количество аргументов. "
+                "Использование: import <имя_таблицы> <файл.csv|файл.jsonl>")
+                return False
+            # путь к файлу берём без перевода в нижний регистр
+            return bool(import_rows(args[1], shlex.split(command)[2]))
+
+        case 'export':
+            if len(args) != 3:
+                print("Неверное количество аргументов. "
+                "Использование: export <имя_таблицы> <файл.json>")
+                return False
+            return bool(export_table(args[1], shlex.split(command)[2]))
+
+        case 'begin':
+            return begin()
+
+        case 'commit':
+            return bool(commit())
+
+        case 'rollback':
+            return rollback()
+
+        case 'stats':
+            if len(args) == 1:
+                print_stats()
+            elif args[1] == "reset":
+                metrics.reset()
+                print("Метрики обнулены.")
+            elif args[1] == "json" and len(args) == 3:
+                path = shlex.split(command)[2]
+                dump_stats(path)
+                print(f"Метрики сохранены в '{path}'.")
+            else:
+                print("Использование: stats [reset | json <файл.json>]")
+                return False
+            return True
+
+        case 'timing':
+            if len(args) != 2 or args[1] not in ("on", "off"):
+                print("Использование: timing on|off")
+                return False
+            metrics.set_console(args[1] == "on")
+            state = "включён" if metrics.console else "выключен"
+            print(f"Вывод времени операций {state}.")
+            return True
+
+        case _:
+            print(f"Неизвестная команда: '{args[0]}'. Введите 'help'.")
+            return False
+
+def _is_exit(command):
+    return command.strip().lower() == "exit"
+
 def run():
-    data_dir = "src/primitive_db/data"
-    if not os.path.exists(data_dir):
-        os.makedirs(data_dir)
+    # prompt нужен только в интерактивном режиме
+    import prompt
+
+    ensure_data_dir()
 
     while True:
         command = prompt.string('Введите команду: ')
         if not command:
             continue
-        args = shlex.split(command.lower())
-        if not args:
-            continue
+        if _is_exit(command):
+            if in_transaction():
+                rollback()
+            print('Программа завершена.')
+            break
+        try:
+            execute(command)
+        except ValueError as e:
+            # незакрытые кавычки и т.п.
+            print(f"Ошибка при разборе команды: {e}")
 
-        match args[0]:
-            case 'exit':
-                print('Программа завершена.')
+def run_batch(lines, stop_on_error=False):
+    """
+    Выполняет команды из файла или stdin по одной на строку. Пустые строки
+    и комментарии (# или --) пропускаются. Таблицы остаются в памяти
+    на весь пакет, журналы сбрасываются на диск один раз в конце.
+    Возвращает код выхода: 0 - все команды успешны, 1 - были ошибки.
+    """
+    ensure_data_dir()
+    failed = 0
+    with deferred_sync():
+        for line_no, line in enumerate(lines, start=1):
+            command = line.strip()
+            if not command or command.startswith(("#", "--")):
+                continue
+            if _is_exit(command):
                 break
-
-            case 'help':
-                print_help()
-
-            case 'create_table':
-                if len(args) < 3:
-                    print("В таблицу необходимо добавить хотя бы один столбец.")
-                    continue
-                columns = []
-                for col in args[2:]:
-                    try:
-                        if ":" in col:
-                            name, type = col.split(":", 1)
-                            name = name.strip()
-                            type = type.strip()
-                            columns.append((name, type))
-                        elif "=" in col:
-                            name, type = col.split("=", 1)
-                            name = name.strip()
-                            type = type.strip()
-                            columns.append((name, type))
-
-                    except ValueError:
-                        print(f"Неверный формат столбца: '{col}'. "
-                        "Столбец не был обработан.")
-                        break
-                else:
-                    create_table(args[1], columns)
-
-            case 'list_tables':
-                tables = list_tables()
-                if tables:
-                    print("Список таблиц:")
-                    for table in tables:
-                        print(f"  - {table}")
-                else:
-                    print("Таблицы отсутствуют.")
-
-            case 'drop_table':
-                if len(args) != 2:
-                    print("Неверное количество аргументов. "
-                    "Использование: drop_table <имя_таблицы>")
-                else:
-                    drop_table(args[1])
-
-            case crud if crud in ("select", "update", "delete", "insert"):
-                parse_crud(command)
-
-            case _:
-                print(f"Неизвестная команда: '{args[0]}'. Введите 'help'.")
-
+            try:
+                ok = execute(command)
+            except ValueError as e:
+                print(f"Ошибка при разборе команды: {e}")
+                ok = False
+            if not ok:
+                failed += 1
+                if stop_on_error:
+                    print(f"Выполнение остановлено на строке {line_no}: {command}")
+                    break
+        if in_transaction():
+            print("Транзакция не была завершена командой commit.")
+            rollback()
+    return 1 if failed else 0
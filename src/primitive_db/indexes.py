@@ -0,0 +1,249 @@
+import bisect
+import json
+import os
+from itertools import groupby
+from operator import itemgetter
+
+from primitive_db import metrics
+from primitive_db.utils import (
+    index_path,
+    read_log,
+    table_lock,
+    write_atomic,
+)
+
+# ID строки таблицы - её первое значение
+id_of = itemgetter(0)
+
+
+# версия формата файла индексов. индексы старого формата хранили строки
+# из цифр числами - такие файлы не читаются, а строятся заново
+INDEX_FORMAT = 2
+
+def _sort_key(key):
+    # числа и строки не сравниваются между собой, поэтому строки идут после чисел
+    return (isinstance(key, str), key)
+
+
+class Index:
+    """
+    индекс по одному столбцу: хеш-таблица ключ -> ID для поиска по равенству
+    и отсортированный список (ключ, ID) для упорядоченного доступа
+    """
+
+    def __init__(self, entries=()):
+        # entries - пары (ключ, ID), уже отсортированные по ключу
+        self.hash = {}
+        self.sorted = []
+        self.keys = {}
+        for key, row_id in entries:
+            self.hash.setdefault(key, []).append(row_id)
+            self.sorted.append((_sort_key(key), row_id))
+            self.keys[row_id] = key
+
+    @classmethod
+    def build(cls, rows, column_index):
+        "строит индекс по строкам таблицы"
+        entries = [(row[column_index], row[0]) for row in rows]
+        entries.sort(key=lambda entry: (_sort_key(entry[0]), entry[1]))
+        return cls(entries)
+
+    def add(self, row_id, key):
+        bisect.insort(self.hash.setdefault(key, []), row_id)
+        bisect.insort(self.sorted, (_sort_key(key), row_id))
+        self.keys[row_id] = key
+
+    def add_many(self, pairs):
+        "добавляет пары (ID, значение) разом - дешевле, чем по одной"
+        new_entries = []
+        for row_id, key in pairs:
+            bisect.insort(self.hash.setdefault(key, []), row_id)
+            new_entries.append((_sort_key(key), row_id))
+            self.keys[row_id] = key
+        # timsort сливает два отсортированных куска за линейное время
+        new_entries.sort()
+        self.sorted.extend(new_entries)
+        self.sorted.sort()
+
+    def remove(self, row_id):
+        if row_id not in self.keys:
+            return
+        key = self.keys.pop(row_id)
+        ids = self.hash[key]
+        ids.pop(bisect.bisect_left(ids, row_id))
+        if not ids:
+            del self.hash[key]
+        entry = (_sort_key(key), row_id)
+        self.sorted.pop(bisect.bisect_left(self.sorted, entry))
+
+    def find(self, value):
+        "ID строк, где столбец равен value, по возрастанию"
+        return list(self.hash.get(value, ()))
+
+    def range(self, low=None, high=None):
+        "ID строк с low <= значение <= high в порядке значений (None - без границы)"
+        start = 0
+        end = len(self.sorted)
+        if low is not None:
+            start = bisect.bisect_left(self.sorted, (_sort_key(low),))
+        if high is not None:
+            high_key = _sort_key(high)
+            end = bisect.bisect_left(self.sorted, (high_key, float("inf")))
+        return [row_id for _, row_id in self.sorted[start:end]]
+
+    def entries(self):
+        return [[sort_key[1], row_id] for sort_key, row_id in self.sorted]
+
+    def apply(self, record, column_index):
+        "переносит в индекс одну запись журнала изменений"
+        match record["op"]:
+            case "insert":
+                row = record["row"]
+                self.add(row[0], row[column_index])
+            case "insert_many":
+                self.add_many((row[0], row[column_index])
+                              for row in record["rows"])
+            case "update":
+                if record["col"] == column_index:
+                    for row_id in record["ids"]:
+                        self.remove(row_id)
+                        self.add(row_id, record["value"])
+            case "delete":
+                for row_id in record["ids"]:
+                    self.remove(row_id)
+
+
+# индексы, загруженные в этом процессе:
+# table -> {"data": таблица, "seq": ..., "columns": ...}
+_loaded = {}
+
+def _column_index(metadata, column):
+    for i, col in enumerate(metadata["columns"]):
+        if col[0] == column:
+            return i
+    return None
+
+def _catch_up(table_name, stored, seq):
+    """
+    записи журнала между версией файла индексов и версией таблицы в памяти.
+    None - части записей в журнале уже нет (его свернули), индекс надо строить
+    """
+    if "seq" not in stored or stored["seq"] > seq:
+        return None
+    if stored["seq"] == seq:
+        return []
+    records = [record for record in read_log(table_name, after=stored["seq"])
+               if record.get("seq", seq + 1) <= seq]
+    return records if len(records) == seq - stored["seq"] else None
+
+def load_indexes(table_name, metadata):
+    """
+    возвращает индексы таблицы {столбец: Index}. metadata - уже загруженная
+    таблица: индексы соответствуют именно ей, даже если файлы таблицы
+    успели изменить другие процессы. если файл индексов отстал от неё
+    и журнал не позволяет его догнать, индекс перестраивается по строкам
+    """
+    seq = metadata.get("seq", 0)
+    loaded = _loaded.get(table_name)
+    if loaded is not None and loaded["data"] is metadata \
+            and loaded["seq"] == seq:
+        return loaded["columns"]
+
+    with table_lock(table_name, shared=True):
+        try:
+            with open(index_path(table_name), "rb") as file:
+                blob = file.read()
+            metrics.count("bytes.read", len(blob))
+            stored = json.loads(blob)
+        except FileNotFoundError:
+            stored = {"seq": 0, "columns": {}, "format": INDEX_FORMAT}
+        records = _catch_up(table_name, stored, seq) \
+            if stored.get("format") == INDEX_FORMAT else None
+
+    columns = {}
+    if records is not None:
+        for column, entries in stored["columns"].items():
+            columns[column] = Index(entries)
+        for record in records:
+            for column, index in columns.items():
+                index.apply(record, _column_index(metadata, column))
+    else:
+        for column in stored["columns"]:
+            columns[column] = Index.build(metadata["rows"],
+                                          _column_index(metadata, column))
+    _loaded[table_name] = {"data": metadata, "seq": seq, "columns": columns}
+    return columns
+
+def save_indexes(table_name):
+    "сохраняет индексы таблицы вместе с номером версии таблицы, которой они отвечают"
+    loaded = _loaded.get(table_name)
+    if loaded is None:
+        return
+    stored = {
+        "format": INDEX_FORMAT,
+        "seq": loaded["seq"],
+        "columns": {column: index.entries()
+                    for column, index in loaded["columns"].items()},
+    }
+    write_atomic(index_path(table_name),
+                 json.dumps(stored, ensure_ascii=False).encode("utf-8"))
+
+def apply_to_indexes(table_name, metadata, record, compacted=False):
+    """
+    поддерживает индексы таблицы после изменения. compacted - журнал
+    только что свернулся в снимок, и индексы надо сохранить заново
+    """
+    loaded = _loaded.get(table_name)
+    if loaded is None or loaded["data"] is not metadata:
+        return
+    for column, index in loaded["columns"].items():
+        index.apply(record, _column_index(metadata, column))
+    loaded["seq"] = metadata.get("seq", 0)
+    if compacted and loaded["columns"]:
+        save_indexes(table_name)
+
+def create_index(table_name, metadata, column):
+    "строит индекс по столбцу и сохраняет его на диск"
+    column_index = _column_index(metadata, column)
+    if column_index is None:
+        raise KeyError(column)
+    columns = load_indexes(table_name, metadata)
+    columns[column] = Index.build(metadata["rows"], column_index)
+    save_indexes(table_name)
+
+def forget_indexes(table_name):
+    "выгружает индексы таблицы из памяти, например после отката транзакции"
+    _loaded.pop(table_name, None)
+
+def drop_indexes(table_name):
+    "забывает индексы удалённой таблицы"
+    _loaded.pop(table_name, None)
+    if os.path.exists(index_path(table_name)):
+        os.remove(index_path(table_name))
+
+def row_positions(rows, ids):
+    "позиции строк с данными ID - строки хранятся по возрастанию ID"
+    positions = []
+    for row_id in ids:
+        pos = bisect.bisect_left(rows, row_id, key=id_of)
+        if pos < len(rows) and rows[pos][0] == row_id:
+            positions.append(pos)
+    return positions
+
+def key_groups(rows, index=None, reverse=False):
+    """
+    строки таблицы группами с равным ключом по возрастанию ключа (reverse -
+    по убыванию): пары (ключ сортировки, [строки]). внутри группы строки
+    идут по возрастанию ID. без индекса ключ - ID, и строки идут по одной
+    в порядке хранения. ключи разных таблиц сравнимы между собой
+    """
+    if index is None:
+        for row in reversed(rows) if reverse else rows:
+            yield _sort_key(row[0]), [row]
+        return
+    entries = reversed(index.sorted) if reverse else index.sorted
+    for key, group in groupby(entries, key=itemgetter(0)):
+        ids = [row_id for _, row_id in group]
+        if reverse:
+            ids.reverse()
+        yield key, [rows[pos] for pos in row_positions(rows, ids)]
@@ -1,11 +1,83 @@
 #!/usr/bin/env python3
-from primitive_db.engine import run
+import argparse
+import sys
 
+# модули базы импортируются внутри main по выбранному режиму: запуск
+# с --version или одной командой не загружает интерактивный ввод, сервер
+# и вывод таблиц
 
-def main():
-    print("DB project is running!")
-    print("type 'help' to see available commands")
-    run()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="project",
+        description="Примитивная база данных. Без аргументов запускается "
+                    "интерактивный режим; с -c, -f или при перенаправленном "
+                    "stdin команды выполняются пакетом, с --serve "
+                    "запускается сервер запросов.")
+    parser.add_argument("--version", action="store_true",
+                        help="показать версию и выйти")
+    parser.add_argument("-c", "--command", action="append",
+                        help="выполнить команду и выйти (можно несколько раз)")
+    parser.add_argument("-f", "--file",
+                        help="файл с командами, по одной на строку")
+    parser.add_argument("-y", "--yes", action="store_true",
+                        help="подтверждать удаления без вопроса")
+    parser.add_argument("-p", "--print", dest="render", action="store_true",
+                        help="печатать результаты select в пакетном режиме")
+    parser.add_argument("--stop-on-error", action="store_true",
+                        help="остановиться на первой неудачной команде")
+    parser.add_argument("--serve", action="store_true",
+                        help="запустить сервер запросов для многих клиентов")
+    parser.add_argument("--socket",
+                        help="unix сокет сервера (по умолчанию - tcp)")
+    parser.add_argument("--host", help="адрес tcp сервера (127.0.0.1)")
+    parser.add_argument("--port", type=int, help="порт tcp сервера (5455)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.version:
+        from primitive_db import __version__
+
+        print(f"project {__version__}")
+        return
+
+    if args.serve:
+        from primitive_db.client import DEFAULT_HOST, DEFAULT_PORT
+        from primitive_db.server import run_server
+
+        run_server(args.socket, args.host or DEFAULT_HOST,
+                   args.port or DEFAULT_PORT, auto_confirm=args.yes)
+        return
+
+    if args.command is None and args.file is None and sys.stdin.isatty():
+        from primitive_db.engine import run
+
+        print("DB project is running!")
+        print("type 'help' to see available commands")
+        run()
+        return
+
+    from primitive_db.core import set_rendering
+    from primitive_db.decorators import set_auto_confirm
+    from primitive_db.engine import run_batch
+
+    # пакетный режим: без --yes подтверждения отклоняются, иначе вопрос
+    # прочитал бы следующую команду из stdin
+    set_auto_confirm(True if args.yes else False)
+    if args.command is not None:
+        # результат отдельной команды нужен на экране
+        set_rendering(True)
+        status = run_batch(args.command, args.stop_on_error)
+    elif args.file is None:
+        set_rendering(args.render)
+        status = run_batch(sys.stdin, args.stop_on_error)
+    else:
+        set_rendering(args.render)
+        with open(args.file, "r", encoding="utf-8") as file:
+            status = run_batch(file, args.stop_on_error)
+    sys.exit(status)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,102 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Метрики процесса: счётчики и гистограммы длительностей.
+# Операции core записываются под своим именем (select, insert, ...),
+# их фазы - как "<операция>.<фаза>": load, filter, render, save.
+# Разбор команды записывается как "parse".
+
+# верхние границы корзин гистограммы, мс
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500,
+              1000, 2500, 5000, 10000, float("inf"))
+
+# печатать ли время операций и события кеша в консоль
+console = False
+
+_counters = {}
+_timings = {}
+# стек выполняемых операций - к верхней относятся фазы
+_operations = []
+
+
+def set_console(enabled):
+    "включает или выключает печать времени операций в консоль"
+    global console
+    console = bool(enabled)
+
+def echo(message):
+    "печатает служебное сообщение, только если включён вывод в консоль"
+    if console:
+        print(message)
+
+def count(name, value=1):
+    "увеличивает счётчик"
+    _counters[name] = _counters.get(name, 0) + value
+
+def observe(name, seconds):
+    "добавляет длительность в гистограмму name"
+    timing = _timings.get(name)
+    if timing is None:
+        timing = _timings[name] = {"count": 0, "total": 0.0, "max": 0.0,
+                                   "buckets": [0] * len(BUCKETS_MS)}
+    timing["count"] += 1
+    timing["total"] += seconds
+    timing["max"] = max(timing["max"], seconds)
+    timing["buckets"][bisect_left(BUCKETS_MS, seconds * 1000)] += 1
+
+@contextmanager
+def operation(name):
+    "замеряет операцию целиком; фазы внутри неё получают её имя"
+    _operations.append(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _operations.pop()
+        observe(name, time.perf_counter() - start)
+        count(f"{name}.calls")
+
+def phase_name(name):
+    "полное имя фазы внутри текущей операции"
+    return f"{_operations[-1]}.{name}" if _operations else name
+
+@contextmanager
+def phase(name):
+    "замеряет фазу текущей операции"
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(phase_name(name), time.perf_counter() - start)
+
+def _quantile(timing, fraction):
+    # оценка по гистограмме: верхняя граница корзины, где лежит квантиль
+    rank = fraction * timing["count"]
+    seen = 0
+    for bound, hits in zip(BUCKETS_MS, timing["buckets"]):
+        seen += hits
+        if seen >= rank and hits:
+            return min(bound, timing["max"] * 1000)
+    return timing["max"] * 1000
+
+def snapshot():
+    "все метрики словарём, пригодным для json"
+    timings = {}
+    for name, timing in sorted(_timings.items()):
+        timings[name] = {
+            "count": timing["count"],
+            "total_ms": round(timing["total"] * 1000, 3),
+            "avg_ms": round(timing["total"] * 1000 / timing["count"], 3),
+            "p50_ms": round(_quantile(timing, 0.5), 3),
+            "p99_ms": round(_quantile(timing, 0.99), 3),
+            "max_ms": round(timing["max"] * 1000, 3),
+            "buckets": dict(zip((str(bound) for bound in BUCKETS_MS),
+                                timing["buckets"])),
+        }
+    return {"counters": dict(sorted(_counters.items())), "timings": timings}
+
+def reset():
+    "обнуляет все метрики"
+    _counters.clear()
+    _timings.clear()
@@ -0,0 +1,101 @@
+import os
+
+from primitive_db import metrics
+from primitive_db.query import compile_where
+
+# Параллельный полный проход по строкам таблицы: строки делятся на куски,
+# условие where проверяется в пуле процессов, позиции собираются по порядку.
+# Предикат из лямбд не сериализуется, поэтому в процессы передаётся дерево
+# условия, и каждый процесс собирает предикат сам.
+
+# кусков на процесс: мелкие куски выравнивают нагрузку между процессами
+CHUNKS_PER_WORKER = 4
+
+# строки таблицы для процессов, запущенных через fork: они наследуют их
+# без сериализации
+_shared_rows = None
+# пул процессов переиспользуется между проходами: запуск процессов стоит
+# дороже прохода по таблице средних размеров. _pool_key - для чего пул
+# запущен: (число процессов, версия таблицы); процессы, запущенные через
+# fork, видят _shared_rows такими, какими они были при запуске пула
+_pool = None
+_pool_key = None
+# close_pool уже назначен на выход из программы
+_close_at_exit = False
+
+
+def _scan_chunk(task):
+    "позиции подходящих строк одного куска"
+    start, end, node, columns, rows = task
+    if rows is None:
+        rows = _shared_rows[start:end]
+    predicate = compile_where(node, columns)
+    return [pos for pos, row in enumerate(rows, start) if predicate(row)]
+
+def default_workers():
+    "число процессов по умолчанию - по числу ядер"
+    return os.cpu_count() or 1
+
+def close_pool():
+    "останавливает пул процессов; вызывается и при выходе из программы"
+    global _pool, _pool_key, _shared_rows
+    if _pool is not None:
+        _pool.terminate()
+        _pool.join()
+    _pool = _pool_key = _shared_rows = None
+
+def _get_pool(multiprocessing, fork, workers, rows, version):
+    """
+    пул из workers процессов. при fork процессы наследуют rows, поэтому
+    пул запускается заново, когда проходят другие строки или таблица
+    изменилась (version); без fork строки передаются с кусками, и пул
+    зависит только от числа процессов
+    """
+    global _pool, _pool_key, _shared_rows, _close_at_exit
+    key = (workers, version) if fork else (workers, None)
+    shared = rows if fork else None
+    if _pool is not None and _pool_key == key and _shared_rows is shared:
+        return _pool
+    if not _close_at_exit:
+        import atexit
+        atexit.register(close_pool)
+        _close_at_exit = True
+    close_pool()
+    metrics.count("parallel.pool_starts")
+    context = multiprocessing.get_context("fork" if fork else "spawn")
+    # строки задаются до запуска: процессы получают их при fork
+    _shared_rows = shared
+    _pool = context.Pool(workers)
+    _pool_key = key
+    return _pool
+
+def parallel_positions(rows, node, columns, workers, version=None):
+    """
+    позиции строк rows, подходящих под условие node, по возрастанию.
+    условие проверяется в workers процессах. там, где есть fork, процессы
+    получают строки по наследству, иначе куски передаются им целиком.
+    version - версия таблицы (seq): пока она та же, пул процессов прошлого
+    прохода используется снова
+    """
+    if not rows:
+        return []
+    # multiprocessing нужен только большим таблицам - не замедляет запуск
+    import multiprocessing
+
+    chunk_size = -(-len(rows) // (workers * CHUNKS_PER_WORKER))
+    bounds = [(start, min(start + chunk_size, len(rows)))
+              for start in range(0, len(rows), chunk_size)]
+
+    fork = "fork" in multiprocessing.get_all_start_methods()
+    tasks = [(start, end, node, columns, None if fork else rows[start:end])
+             for start, end in bounds]
+
+    metrics.count("scan.parallel")
+    pool = _get_pool(multiprocessing, fork, workers, rows, (version, len(rows)))
+    try:
+        chunks = pool.map(_scan_chunk, tasks)
+    except BaseException:
+        # пул мог остаться в неизвестном состоянии - следующий проход запустит новый
+        close_pool()
+        raise
+    return [pos for chunk in chunks for pos in chunk]
@@ -1,8 +1,15 @@
-import shlex
+import re
+from collections import OrderedDict, namedtuple
 
+from primitive_db import metrics
 from primitive_db.core import (
+    AGGREGATE_FUNCTIONS,
+    aggregate,
+    create_view,
     delete,
+    explain,
     insert,
+    join,
     select,
     update,
 )
@@ -24,122 +31,521 @@ def parse_value(value: str):
         return False
     return value
 
-def parse_clause(clause: str):
+# лексемы команды: строка в кавычках, оператор сравнения, скобка/запятая,
+# место для значения '?', слово
+_TOKEN_RE = re.compile(r"""\s*(?:
+    (?P<str>'[^']*'|"[^"]*")
+  | (?P<op><=|>=|!=|<>|=|<|>|:)
+  | (?P<punct>[(),*])
+  | (?P<param>\?)
+  | (?P<word>[^\s'"()<>=!:,*?]+)
+)""", re.VERBOSE)
+
+_NUMBER_RE = re.compile(r"-?\d+")
+
+# синонимы операторов
+_OPERATORS = {"<>": "!=", ":": "="}
+
+# сколько разобранных шаблонов команд хранить
+STATEMENT_CACHE_SIZE = 512
+
+
+class ParseError(ValueError):
+    "неверный формат команды; текст ошибки печатается как есть"
+
+
+class Param(namedtuple("Param", "index typed")):
     """
-    превращает строку типа key = val в словарь {key:val}
+    место для значения в шаблоне команды. typed - значение для insert:
+    слово без кавычек превращается в число или bool, как в parse_value
     """
-    if '=' not in clause and ':' not in clause:
-        return None
-    
-    if ":" in clause:
-        key, val = clause.split(":", 1)
-        key = key.strip()
-        val = val.strip()
-    elif "=" in clause:
-        key, val = clause.split("=", 1)
-        key = key.strip()
-        val = val.strip()
+    __slots__ = ()
 
-    return {key: val}
 
+class Statement(namedtuple("Statement", "operation args")):
+    "разобранная команда: имя операции core и её аргументы"
+    __slots__ = ()
 
-def parse_crud(command: str):
+
+# операции core, которые выполняет Statement
+OPERATIONS = {
+    "select": select,
+    "aggregate": aggregate,
+    "join": join,
+    "insert": insert,
+    "update": update,
+    "delete": delete,
+    "create_view": create_view,
+}
+
+# шаблоны команд по их форме, от давно использованных к недавним
+_templates = OrderedDict()
+
+
+def tokenize(text: str):
+    """
+    разбивает команду на лексемы (вид, текст). кавычки у строк снимаются,
+    так что 'a b' - одна лексема вида str
+    """
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    # один проход регулярным выражением; пропуск между совпадениями -
+    # непонятный символ
+    for match in _TOKEN_RE.finditer(text):
+        if match.start() != pos:
+            break
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "str":
+            value = value[1:-1]
+        elif kind == "op":
+            value = _OPERATORS.get(value, value)
+        tokens.append((kind, value))
+        pos = match.end()
+    if pos < len(text):
+        raise ValueError(f"непонятный символ в позиции {pos + 1}: "
+                         f"'{text[pos:].strip()[:10]}'")
+    return tokens
+
+def _is_word(tokens, pos, word):
+    return pos < len(tokens) and tokens[pos][0] == "word" \
+        and tokens[pos][1].lower() == word
+
+def _expect(tokens, pos, text):
+    if pos >= len(tokens) or tokens[pos][1] != text:
+        raise ValueError(f"ожидалось '{text}'")
+    return pos + 1
+
+def _parse_literal(tokens, pos, typed=False):
+    if pos >= len(tokens) or tokens[pos][0] not in ("str", "word", "param"):
+        raise ValueError("ожидалось значение")
+    kind, value = tokens[pos]
+    if kind == "param":
+        return Param(value, typed), pos + 1
+    if typed and kind == "word":
+        return parse_value(value), pos + 1
+    return value, pos + 1
+
+def _parse_atom(tokens, pos):
+    if pos < len(tokens) and tokens[pos] == ("punct", "("):
+        node, pos = _parse_or(tokens, pos + 1)
+        return node, _expect(tokens, pos, ")")
+
+    if pos >= len(tokens) or tokens[pos][0] != "word":
+        raise ValueError("ожидалось имя столбца")
+    column = tokens[pos][1]
+    pos += 1
+
+    if pos < len(tokens) and tokens[pos][0] == "op":
+        op = tokens[pos][1]
+        value, pos = _parse_literal(tokens, pos + 1)
+        return ("cmp", op, column, value), pos
+
+    if _is_word(tokens, pos, "in"):
+        pos = _expect(tokens, pos + 1, "(")
+        values = []
+        while True:
+            value, pos = _parse_literal(tokens, pos)
+            values.append(value)
+            if pos < len(tokens) and tokens[pos] == ("punct", ","):
+                pos += 1
+                continue
+            return ("in", column, values), _expect(tokens, pos, ")")
+
+    if _is_word(tokens, pos, "between"):
+        low, pos = _parse_literal(tokens, pos + 1)
+        if not _is_word(tokens, pos, "and"):
+            raise ValueError("ожидалось 'and' в between")
+        high, pos = _parse_literal(tokens, pos + 1)
+        return ("between", column, low, high), pos
+
+    raise ValueError(f"ожидался оператор после '{column}'")
+
+def _parse_and(tokens, pos):
+    node, pos = _parse_atom(tokens, pos)
+    while _is_word(tokens, pos, "and"):
+        right, pos = _parse_atom(tokens, pos + 1)
+        node = ("and", node, right)
+    return node, pos
+
+def _parse_or(tokens, pos):
+    node, pos = _parse_and(tokens, pos)
+    while _is_word(tokens, pos, "or"):
+        right, pos = _parse_and(tokens, pos + 1)
+        node = ("or", node, right)
+    return node, pos
+
+def parse_where(tokens):
+    """
+    разбирает условие where из лексем: сравнения = != < <= > >=,
+    in (...), between ... and ..., and, or и скобки.
+    возвращает (дерево условия, оставшиеся лексемы)
+    """
+    node, pos = _parse_or(tokens, 0)
+    return node, tokens[pos:]
+
+def parse_paging(tokens):
+    """
+    разбирает необязательные limit N и offset M в конце select.
+    возвращает (limit, offset)
+    """
+    paging = {"limit": None, "offset": 0}
+    pos = 0
+    while pos < len(tokens):
+        kind, text = tokens[pos]
+        keyword = text.lower() if kind == "word" else None
+        if keyword not in paging:
+            rest = " ".join(str(text) for _, text in tokens[pos:])
+            raise ParseError(f"Ошибка: лишние слова в конце команды: {rest}")
+        if pos + 1 < len(tokens) and tokens[pos + 1][0] == "param":
+            paging[keyword] = Param(tokens[pos + 1][1], True)
+        elif pos + 1 < len(tokens) and tokens[pos + 1][1].isdigit():
+            paging[keyword] = int(tokens[pos + 1][1])
+        else:
+            raise ParseError(
+                f"Ошибка: после '{keyword}' должно идти неотрицательное число.")
+        pos += 2
+    return paging["limit"], paging["offset"]
+
+def _split_where(tokens, start):
+    """
+    разбирает условие, если с позиции start идёт where.
+    возвращает (условие или None, оставшиеся лексемы)
+    """
+    if not _is_word(tokens, start, "where"):
+        return None, tokens[start:]
+    if start + 1 >= len(tokens):
+        raise ValueError("указано 'where', но нет условия.")
+    return parse_where(tokens[start + 1:])
+
+def _parse_order_by(tokens):
     """
-    парсинг crud команд
+    необязательное order by <столбец> [asc|desc] в начале tokens.
+    возвращает ((столбец, по убыванию ли) или None, оставшиеся лексемы)
+    """
+    if not _is_word(tokens, 0, "order"):
+        return None, tokens
+    if not _is_word(tokens, 1, "by") or len(tokens) < 3 \
+            or tokens[2][0] != "word":
+        raise ParseError("Ошибка: используйте order by <столбец> [asc|desc].")
+    descending = _is_word(tokens, 3, "desc")
+    skip = 4 if descending or _is_word(tokens, 3, "asc") else 3
+    return (tokens[2][1], descending), tokens[skip:]
+
+def _parse_select_list(tokens, pos):
+    """
+    список выражений select: столбцы и агрегатные функции через запятую.
+    возвращает ([(функция или None, столбец)], позиция после списка)
+    """
+    items = []
+    while True:
+        if pos >= len(tokens) or tokens[pos][0] != "word":
+            raise ValueError("ожидался столбец или агрегатная функция")
+        name = tokens[pos][1]
+        pos += 1
+        if pos < len(tokens) and tokens[pos] == ("punct", "("):
+            func = name.lower()
+            if func not in AGGREGATE_FUNCTIONS:
+                raise ValueError(f"неизвестная функция '{name}'")
+            if pos + 1 < len(tokens) and tokens[pos + 1] == ("punct", "*"):
+                column = "*"
+            elif pos + 1 < len(tokens) and tokens[pos + 1][0] == "word":
+                column = tokens[pos + 1][1]
+            else:
+                raise ValueError(f"ожидался столбец в {func}(...)")
+            pos = _expect(tokens, pos + 2, ")")
+            items.append((func, column))
+        else:
+            items.append((None, name))
+        if pos < len(tokens) and tokens[pos] == ("punct", ","):
+            pos += 1
+            continue
+        return items, pos
+
+def _parse_group_by(tokens):
+    """
+    необязательное group by <столбец>, ... в начале tokens.
+    возвращает (столбцы, оставшиеся лексемы)
+    """
+    if not _is_word(tokens, 0, "group"):
+        return [], tokens
+    if not _is_word(tokens, 1, "by"):
+        raise ValueError("ожидалось 'by' после 'group'")
+    columns = []
+    pos = 2
+    while True:
+        if pos >= len(tokens) or tokens[pos][0] != "word":
+            raise ValueError("ожидался столбец в group by")
+        columns.append(tokens[pos][1])
+        pos += 1
+        if pos < len(tokens) and tokens[pos] == ("punct", ","):
+            pos += 1
+            continue
+        return columns, tokens[pos:]
+
+def _parse_aggregate(tokens):
+    """
+    select <столбцы и функции> from <таблица> [where ...] [group by ...]
+    [limit N] [offset M]
+    """
+    items, pos = _parse_select_list(tokens, 1)
+    if not _is_word(tokens, pos, "from") or pos + 1 >= len(tokens):
+        raise ValueError("ожидалось 'from <таблица>'")
+    table_name = tokens[pos + 1][1]
+    where_clause, rest = _split_where(tokens, pos + 2)
+    group_by, rest = _parse_group_by(rest)
+    limit, offset = parse_paging(rest)
+    return Statement("aggregate",
+                     (table_name, items, where_clause, group_by, limit, offset))
+
+def _parse_join(tokens, items, pos):
+    """
+    select * | <столбцы> from <таблица> join <таблица> on <столбец> = <столбец>
+    [where ...] [order by ...] [limit N] [offset M]. pos - позиция from
+    """
+    if not _is_word(tokens, pos, "from") or tokens[pos + 1][0] != "word" \
+            or pos + 3 >= len(tokens) or tokens[pos + 3][0] != "word" \
+            or not _is_word(tokens, pos + 4, "on"):
+        raise ParseError("Ошибка: неправильный формат join. Используйте: "
+                         "select * from <table> join <table> on <a.col> = <b.col>"
+                         " [where ...] [limit N] [offset M]")
+    if pos + 7 >= len(tokens) or tokens[pos + 5][0] != "word" \
+            or tokens[pos + 6] != ("op", "=") or tokens[pos + 7][0] != "word":
+        raise ParseError("Ошибка: условие on должно быть равенством столбцов: "
+                         "on <a.col> = <b.col>")
+    columns = None
+    if items is not None:
+        if any(func is not None for func, _ in items):
+            raise ParseError("Ошибка: агрегатные функции с join не поддерживаются.")
+        columns = [column for _, column in items]
+    on = (tokens[pos + 5][1], tokens[pos + 7][1])
+    where_clause, rest = _split_where(tokens, pos + 8)
+    order_by, rest = _parse_order_by(rest)
+    limit, offset = parse_paging(rest)
+    return Statement("join", (tokens[pos + 1][1], tokens[pos + 3][1], on,
+                              columns, where_clause, limit, offset, order_by))
+
+def _compile(tokens):
+    """
+    разбирает лексемы команды в Statement. значения в лексемах уже заменены
+    местами ("param", номер), и в команде вместо них стоят Param
     """
-    tokens = shlex.split(command.lower())
     if not tokens:
-        return False
+        raise ParseError("Ошибка: пустая команда.")
+    words = {text.lower() for kind, text in tokens if kind == "word"}
 
-    orig_tokens = shlex.split(command)
+    match tokens[0][1].lower() if tokens[0][0] == "word" else None:
+        case "select":
+            if len(tokens) >= 2 and tokens[1] != ("punct", "*"):
+                items, pos = _parse_select_list(tokens, 1)
+                if _is_word(tokens, pos + 2, "join"):
+                    return _parse_join(tokens, items, pos)
+                return _parse_aggregate(tokens)
+            if _is_word(tokens, 4, "join"):
+                return _parse_join(tokens, None, 2)
+            if len(tokens) < 4 or not _is_word(tokens, 2, "from") \
+                    or tokens[3][0] != "word":
+                raise ParseError("Ошибка: неправильный формат select."
+                " Используйте: select * from <table> [where ...]"
+                " [order by <col> [asc|desc]] [limit N] [offset M]")
 
-    try:
-        match tokens[0]:
-            case "select":
-                if len(tokens) < 4 or tokens[1] != "*" or tokens[2] != "from":
-                    print("Ошибка: неправильный формат select." \
-                    " Используйте: select * from <table> [where ...]")
-                    return False
-
-                table_name = orig_tokens[3]
-
-                # Проверяем, есть ли where
-                if "where" in tokens:
-                    where_idx = tokens.index("where")
-                    if where_idx + 1 >= len(orig_tokens):
-                        print("Ошибка: указано 'where', но нет условия.")
-                        return False
-                    where_str = orig_tokens[where_idx + 1]
-                    where_clause = parse_clause(where_str)
-                    if not where_clause:
-                        print(f"Ошибка: не удалось разобрать условие: {where_str}")
-                        return False
-                else:
-                    where_clause = None
-
-                select(table_name, where_clause)
-
-            case "update":
-                if len(tokens) < 6 or tokens[2] != "set" or "where" not in tokens:
-                    print("Ошибка: неправильный формат update." \
-                    " Используйте: update <table> set col=val where col=val")
-                    return False
-
-                table_name = orig_tokens[1]
-                set_idx = tokens.index("set")
-                where_idx = tokens.index("where")
-
-                if set_idx + 1 >= where_idx:
-                    print("Ошибка: отсутствует условие SET.")
-                    return False
-
-                set_str = orig_tokens[set_idx + 1]
-                where_str = orig_tokens[where_idx + 1]
-
-                set_clause = parse_clause(set_str)
-                where_clause = parse_clause(where_str)
-
-                if not set_clause:
-                    print(f"Ошибка: не удалось разобрать SET условие: {set_str}")
-                    return False
-                if not where_clause:
-                    print(f"Ошибка: не удалось разобрать WHERE условие: {where_str}")
-                    return False
-
-                update(table_name, set_clause, where_clause)
-
-            case "delete":
-                if len(tokens) < 4 or tokens[1] != "from" or "where" not in tokens:
-                    print("Ошибка: неправильный формат delete." \
-                    " Используйте: delete from <table> where col=val")
-                    return False
-
-                where_idx = tokens.index("where")
-                table_name = orig_tokens[2]
-                where_str = orig_tokens[where_idx + 1]
-
-                where_clause = parse_clause(where_str)
-                if not where_clause:
-                    print(f"Ошибка: не удалось разобрать WHERE условие: {where_str}")
-                    return False
-
-                delete(table_name, where_clause)
-
-            case "insert":
-                if len(tokens) < 3 or tokens[1] != "into" or tokens[3] != "values":
-                    print("Ошибка: insert into <table> values <val1> <val2> ...")
-                    return False
-                table_name = orig_tokens[2]
-                values = []
-                for val in orig_tokens[4:]:
-                    values.append(parse_value(val))
-                insert(table_name, values)
-
-            case _:
-                print(f"Неизвестная команда: {tokens[0]}. Введите 'help'.")
-                return False
+            table_name = tokens[3][1]
+            where_clause, rest = _split_where(tokens, 4)
+            order_by, rest = _parse_order_by(rest)
+            limit, offset = parse_paging(rest)
+            return Statement("select", (table_name, where_clause, limit, offset,
+                                        order_by))
+
+        case "update":
+            if len(tokens) < 6 or tokens[1][0] != "word" \
+                    or not _is_word(tokens, 2, "set") or "where" not in words:
+                raise ParseError("Ошибка: неправильный формат update."
+                " Используйте: update <table> set col=val where <условие>")
+
+            table_name = tokens[1][1]
+            # set <столбец> = <значение>
+            if tokens[3][0] != "word" or tokens[4] != ("op", "=") \
+                    or tokens[5][0] not in ("str", "word", "param"):
+                raise ParseError("Ошибка: не удалось разобрать SET условие.")
+            value, _ = _parse_literal(tokens, 5)
+            set_clause = {tokens[3][1]: value}
+
+            where_clause, rest = _split_where(tokens, 6)
+            if where_clause is None or rest:
+                raise ParseError("Ошибка: не удалось разобрать WHERE условие.")
+            return Statement("update", (table_name, set_clause, where_clause))
+
+        case "delete":
+            if len(tokens) < 4 or not _is_word(tokens, 1, "from") \
+                    or tokens[2][0] != "word" or "where" not in words:
+                raise ParseError("Ошибка: неправильный формат delete."
+                " Используйте: delete from <table> where <условие>")
+
+            table_name = tokens[2][1]
+            where_clause, rest = _split_where(tokens, 3)
+            if where_clause is None or rest:
+                raise ParseError("Ошибка: не удалось разобрать WHERE условие.")
+            return Statement("delete", (table_name, where_clause))
+
+        case "insert":
+            if len(tokens) < 4 or not _is_word(tokens, 1, "into") \
+                    or tokens[2][0] != "word" or not _is_word(tokens, 3, "values"):
+                raise ParseError(
+                    "Ошибка: insert into <table> values <val1> <val2> ...")
+            # значения через пробел, можно в скобках и через запятую
+            values = []
+            for pos in range(4, len(tokens)):
+                if tokens[pos][0] == "punct" and tokens[pos][1] in "(),":
+                    continue
+                value, _ = _parse_literal(tokens, pos, typed=True)
+                values.append(value)
+            return Statement("insert", (tokens[2][1], values))
 
+        case "create":
+            if len(tokens) < 5 or not _is_word(tokens, 1, "view") \
+                    or tokens[2][0] != "word" or not _is_word(tokens, 3, "as") \
+                    or not _is_word(tokens, 4, "select"):
+                raise ParseError("Ошибка: неправильный формат create view."
+                " Используйте: create view <name> as select ...")
+            query = _compile(tokens[4:])
+            return Statement("create_view",
+                             (tokens[2][1], query.operation, query.args))
+
+        case _:
+            raise ParseError(
+                f"Неизвестная команда: {tokens[0][1]}. Введите 'help'.")
+
+def _template_key(tokens):
+    """
+    форма команды: значения (строки в кавычках, числа и '?') заменены
+    местами ("param", номер). возвращает (форма, значения по номерам)
+    """
+    shape = []
+    literals = []
+    previous = None
+    for kind, text in tokens:
+        if kind in ("str", "param") or (kind == "word" and previous not in (
+                "limit", "offset") and _NUMBER_RE.fullmatch(text)):
+            shape.append(("param", len(literals)))
+            literals.append((kind, text))
+        else:
+            shape.append((kind, text))
+        previous = text.lower() if kind == "word" else None
+    return tuple(shape), literals
+
+def _template(shape):
+    "шаблон команды по форме: из кеша или разобранный заново"
+    template = _templates.get(shape)
+    if template is not None:
+        _templates.move_to_end(shape)
+        metrics.count("statements.hits")
+        return template
+
+    metrics.count("statements.misses")
+    template = _compile(list(shape))
+    _templates[shape] = template
+    if len(_templates) > STATEMENT_CACHE_SIZE:
+        _templates.popitem(last=False)
+    return template
+
+def _bind(node, resolve):
+    "копия части шаблона, где каждый Param заменён на resolve(Param)"
+    if isinstance(node, Param):
+        return resolve(node)
+    if isinstance(node, tuple):
+        return tuple(_bind(item, resolve) for item in node)
+    if isinstance(node, list):
+        return [_bind(item, resolve) for item in node]
+    if isinstance(node, dict):
+        return {key: _bind(value, resolve) for key, value in node.items()}
+    return node
+
+def _literal(literals, param):
+    kind, text = literals[param.index]
+    if kind == "param":
+        raise ParseError("Ошибка: значения для '?' передаются только в "
+                         "подготовленную команду (prepare).")
+    if param.typed and kind == "word":
+        return parse_value(text)
+    return text
+
+def parse_statement(command: str):
+    """
+    разбирает crud команду без выполнения и возвращает Statement.
+    команды одной формы, которые отличаются только значениями, разбираются
+    один раз: шаблон берётся из кеша и в него подставляются значения
+    """
+    shape, literals = _template_key(tokenize(command))
+    template = _template(shape)
+    return Statement(template.operation, _bind(
+        template.args, lambda param: _literal(literals, param)))
+
+def execute_statement(statement):
+    "выполняет разобранную команду"
+    return OPERATIONS[statement.operation](*statement.args)
+
+
+class PreparedStatement:
+    """
+    crud команда с местами '?' для значений, разобранная один раз:
+
+        query = prepare("select * from users where age > ? limit ?")
+        query.execute(30, 10)
+
+    значения подставляются по порядку как есть, без кавычек и приведения
+    """
+
+    def __init__(self, command):
+        shape, self._literals = _template_key(tokenize(command))
+        self.statement = _template(shape)
+        self.placeholders = [index for index, (kind, _) in
+                             enumerate(self._literals) if kind == "param"]
+
+    def bind(self, *values):
+        "Statement с подставленными значениями"
+        if len(values) != len(self.placeholders):
+            raise ValueError(f"ожидалось значений: {len(self.placeholders)}, "
+                             f"передано: {len(values)}")
+        bound = dict(zip(self.placeholders, values))
+
+        def resolve(param):
+            if param.index in bound:
+                return bound[param.index]
+            return _literal(self._literals, param)
+        return Statement(self.statement.operation,
+                         _bind(self.statement.args, resolve))
+
+    def execute(self, *values):
+        "подставляет значения и выполняет команду"
+        return execute_statement(self.bind(*values))
+
+
+def prepare(command: str):
+    "разбирает команду с местами '?' для значений"
+    return PreparedStatement(command)
+
+def _parse_reporting(command: str):
+    "разобранная команда или None, если разбор не удался (ошибка печатается)"
+    try:
+        with metrics.phase("parse"):
+            return parse_statement(command)
+    except ParseError as e:
+        print(e)
     except Exception as e:
         print(f"Ошибка при разборе команды: {e}")
-        return False
+    return None
 
+def parse_crud(command: str):
+    """
+    парсинг и выполнение crud команд
+    """
+    statement = _parse_reporting(command)
+    return statement is not None and execute_statement(statement)
+
+def explain_crud(command: str):
+    """
+    парсинг crud команды и печать её плана без выполнения
+    """
+    statement = _parse_reporting(command)
+    return statement is not None and explain(statement.operation, statement.args)
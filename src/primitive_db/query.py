@@ -0,0 +1,212 @@
+import bisect
+import re
+
+from primitive_db.indexes import id_of, load_indexes, row_positions
+
+# Условие where хранится деревом из кортежей:
+#   ("cmp", оператор, столбец, значение)   оператор: = != < <= > >=
+#   ("in", столбец, [значения])
+#   ("between", столбец, от, до)
+#   ("and", левое, правое), ("or", левое, правое)
+# Словарь {столбец: значение} по-прежнему принимается как равенство.
+
+# сравнения, заранее связанные с позицией столбца и значением условия.
+# значения в строках уже нужного типа, приводится только значение условия
+_COMPARISONS = {
+    "=": lambda i, value: lambda row: row[i] == value,
+    "!=": lambda i, value: lambda row: row[i] != value,
+    "<": lambda i, value: lambda row: row[i] < value,
+    "<=": lambda i, value: lambda row: row[i] <= value,
+    ">": lambda i, value: lambda row: row[i] > value,
+    ">=": lambda i, value: lambda row: row[i] >= value,
+}
+
+
+def as_where(where_clause):
+    "приводит условие к дереву; словарь - это равенства, связанные через and"
+    if not where_clause:
+        return None
+    if isinstance(where_clause, tuple):
+        return where_clause
+    if not isinstance(where_clause, dict):
+        raise ValueError("условие where должно быть словарём или деревом условий.")
+    node = None
+    for column, value in where_clause.items():
+        cmp = ("cmp", "=", column, value)
+        node = cmp if node is None else ("and", node, cmp)
+    return node
+
+def describe(node):
+    "текст условия для сообщений"
+    match node[0]:
+        case "cmp":
+            return f"{node[2]} {node[1]} {node[3]}"
+        case "in":
+            return f"{node[1]} in ({', '.join(str(v) for v in node[2])})"
+        case "between":
+            return f"{node[1]} between {node[2]} and {node[3]}"
+        case kind:
+            return f"({describe(node[1])} {kind} {describe(node[2])})"
+
+def columns_of(node):
+    "множество столбцов, упомянутых в условии"
+    if node[0] in ("and", "or"):
+        return columns_of(node[1]) | columns_of(node[2])
+    return {node[1] if node[0] != "cmp" else node[2]}
+
+# целое число в условии: необязательный минус и цифры
+_INT_PATTERN = re.compile(r"-?[0-9]+")
+
+def typed_value(col_type, value):
+    "приводит значение из условия к типу столбца"
+    if col_type == "int":
+        if isinstance(value, int):
+            return value
+        if isinstance(value, str) and _INT_PATTERN.fullmatch(value):
+            return int(value)
+    elif col_type == "bool":
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, str) and value.lower() in ("true", "false"):
+            return value.lower() == "true"
+    else:
+        return value if isinstance(value, str) else str(value)
+    raise ValueError(f"значение '{value}' должно быть типом '{col_type}'.")
+
+def _resolve(columns, column):
+    for i, (name, col_type) in enumerate(columns):
+        if name == column:
+            return i, col_type
+    raise KeyError(column)
+
+def compile_where(node, columns):
+    """
+    собирает из условия функцию row -> bool. столбцы и типы значений
+    разрешаются один раз, в строке остаётся только сравнение
+    """
+    match node[0]:
+        case "and":
+            left = compile_where(node[1], columns)
+            right = compile_where(node[2], columns)
+            return lambda row: left(row) and right(row)
+        case "or":
+            left = compile_where(node[1], columns)
+            right = compile_where(node[2], columns)
+            return lambda row: left(row) or right(row)
+
+    column = node[2] if node[0] == "cmp" else node[1]
+    i, col_type = _resolve(columns, column)
+
+    match node[0]:
+        case "cmp":
+            value = typed_value(col_type, node[3])
+            return _COMPARISONS[node[1]](i, value)
+        case "in":
+            values = frozenset(typed_value(col_type, v) for v in node[2])
+            return lambda row: row[i] in values
+        case "between":
+            low = typed_value(col_type, node[2])
+            high = typed_value(col_type, node[3])
+            return lambda row: low <= row[i] <= high
+    raise ValueError(f"неизвестное условие: {node[0]}")
+
+def may_match(node, columns, stats):
+    """
+    могут ли под условие подойти строки, значения которых лежат в границах
+    stats - [min, max] для каждого столбца. False - таких строк точно нет
+    """
+    match node[0]:
+        case "and":
+            return may_match(node[1], columns, stats) \
+                and may_match(node[2], columns, stats)
+        case "or":
+            return may_match(node[1], columns, stats) \
+                or may_match(node[2], columns, stats)
+
+    column = node[2] if node[0] == "cmp" else node[1]
+    i, col_type = _resolve(columns, column)
+    low, high = stats[i]
+    if node[0] == "in":
+        return any(low <= typed_value(col_type, v) <= high for v in node[2])
+    if node[0] == "between":
+        return typed_value(col_type, node[2]) <= high \
+            and typed_value(col_type, node[3]) >= low
+    value = typed_value(col_type, node[3])
+    match node[1]:
+        case "=":
+            return low <= value <= high
+        case "!=":
+            return not low == high == value
+        case "<":
+            return low < value
+        case "<=":
+            return low <= value
+        case ">":
+            return high > value
+        case ">=":
+            return high >= value
+    raise ValueError(f"неизвестный оператор: {node[1]}")
+
+def _id_positions(rows, low, high):
+    "позиции строк с low <= ID <= high: строки лежат по возрастанию ID"
+    start = 0 if low is None else \
+        bisect.bisect_left(rows, low, key=id_of)
+    end = len(rows) if high is None else \
+        bisect.bisect_right(rows, high, key=id_of)
+    return range(start, end)
+
+def _bounds(node, col_type):
+    "(от, до) для условия-диапазона или None"
+    if node[0] == "between":
+        return typed_value(col_type, node[2]), typed_value(col_type, node[3])
+    op, value = node[1], typed_value(col_type, node[3])
+    if op in ("<", "<="):
+        return None, value
+    if op in (">", ">="):
+        return value, None
+    if op == "=":
+        return value, value
+    return False
+
+def plan_where(table_name, metadata, node):
+    """
+    позиции строк-кандидатов, найденные по индексам или по ID, в порядке
+    возрастания. None - подходящего индекса нет, нужен полный проход.
+    кандидаты потом всё равно проверяются предикатом
+    """
+    kind = node[0]
+    if kind in ("and", "or"):
+        left = plan_where(table_name, metadata, node[1])
+        right = plan_where(table_name, metadata, node[2])
+        if kind == "and":
+            if left is None or right is None:
+                return right if left is None else left
+            return sorted(set(left) & set(right))
+        if left is None or right is None:
+            return None
+        return sorted(set(left) | set(right))
+
+    column = node[2] if kind == "cmp" else node[1]
+    i, col_type = _resolve(metadata["columns"], column)
+    rows = metadata["rows"]
+    if i == 0:
+        if kind == "in":
+            ids = sorted({typed_value(col_type, v) for v in node[2]})
+            return row_positions(rows, ids)
+        bounds = _bounds(node, col_type)
+        return None if bounds is False else _id_positions(rows, *bounds)
+
+    index = load_indexes(table_name, metadata).get(column)
+    if index is None:
+        return None
+    if kind == "in":
+        ids = set()
+        for value in node[2]:
+            ids.update(index.find(typed_value(col_type, value)))
+        return row_positions(rows, sorted(ids))
+    bounds = _bounds(node, col_type)
+    if bounds is False:
+        return None
+    if bounds[0] == bounds[1] and kind == "cmp":
+        return row_positions(rows, index.find(bounds[0]))
+    return row_positions(rows, sorted(index.range(*bounds)))
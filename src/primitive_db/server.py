@@ -0,0 +1,354 @@
+import asyncio
+import io
+import json
+import os
+from contextlib import redirect_stdout
+
+from primitive_db import core, metrics
+from primitive_db.client import (
+    DEFAULT_HOST,
+    DEFAULT_PORT,
+    LINE_LIMIT,
+    encode_message,
+)
+from primitive_db.decorators import set_auto_confirm
+from primitive_db.engine import CRUD_COMMANDS, execute, wrapped_command
+from primitive_db.parser import (
+    ParseError,
+    execute_statement,
+    parse_statement,
+    prepare,
+)
+from primitive_db.utils import ensure_data_dir
+from primitive_db.views import base_table
+
+# Сервер запросов: один процесс держит каталог таблиц в памяти и обслуживает
+# многих клиентов через unix сокет или tcp на localhost (протокол - в client.py).
+# core однопоточный, поэтому каждая команда выполняется целиком в потоке
+# цикла asyncio: команды разных клиентов идут по очереди, и долгий select
+# задерживает всех. блокировки таблиц упорядочивают команды между собой:
+# чтения таблицы не ждут друг друга, изменения идут по одному, а таблицы
+# открытой транзакции закрыты для остальных клиентов до её конца.
+
+# операции parser.Statement, которые только читают таблицу
+READ_OPERATIONS = ("select", "aggregate", "join")
+
+# служебные команды engine, которые работают с таблицей из второго слова:
+# команда -> только ли чтение
+TABLE_COMMANDS = {
+    "create_table": False,
+    "drop_table": False,
+    "create_index": False,
+    "drop_view": False,
+    "import": False,
+    "export": True,
+}
+
+
+class TableLock:
+    """
+    блокировка таблицы между клиентами сервера: читать могут несколько
+    клиентов сразу, изменять - один, когда таблицу никто не читает.
+    владелец блокировки на запись (сессия с транзакцией) может и читать
+    """
+
+    def __init__(self):
+        self.readers = 0
+        self.writer = None
+        self._changed = asyncio.Condition()
+
+    def readable(self, session):
+        return self.writer is None or self.writer is session
+
+    async def wait_readable(self, session):
+        "ждёт, пока таблицу можно будет читать, не занимая её"
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.readable(session))
+
+    async def acquire_read(self, session):
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.readable(session))
+            self.readers += 1
+
+    async def release_read(self):
+        async with self._changed:
+            self.readers -= 1
+            self._changed.notify_all()
+
+    async def acquire_write(self, session):
+        async with self._changed:
+            await self._changed.wait_for(
+                lambda: self.writer is None and self.readers == 0)
+            self.writer = session
+
+    async def release_write(self):
+        async with self._changed:
+            self.writer = None
+            self._changed.notify_all()
+
+
+class Session:
+    "соединение с клиентом: открыта ли транзакция и какие таблицы она заняла"
+
+    def __init__(self):
+        self.transaction = False
+        self.tables = set()
+
+
+# блокировки таблиц сервера
+_locks = {}
+# занята открытой транзакцией; изменения вне транзакции ждут её конца,
+# потому что транзакция в core одна на процесс
+_transaction_gate = None
+
+
+def _table_lock(table_name):
+    lock = _locks.get(table_name)
+    if lock is None:
+        lock = _locks[table_name] = TableLock()
+    return lock
+
+def _run(writer, function, *args):
+    """
+    выполняет команду, отправляя страницы результата клиенту.
+    возвращает (успех, напечатанные командой сообщения)
+    """
+    sent_columns = False
+
+    def send_page(field_names, page):
+        nonlocal sent_columns
+        if not sent_columns:
+            writer.write(encode_message({"columns": field_names}))
+            sent_columns = True
+        writer.write(encode_message({"rows": page}))
+
+    output = io.StringIO()
+    core.set_page_sink(send_page)
+    try:
+        with redirect_stdout(output):
+            try:
+                ok = function(*args)
+            except ValueError as e:
+                # незакрытые кавычки в служебной команде и т.п.
+                print(f"Ошибка при разборе команды: {e}")
+                ok = False
+    finally:
+        core.set_page_sink(None)
+    return bool(ok), output.getvalue().strip()
+
+async def _locked(session, writer, table_name, read_only, function, *args):
+    """
+    выполняет команду под блокировкой таблицы. в транзакции таблица
+    остаётся за сессией до commit или rollback
+    """
+    if table_name is None or table_name in session.tables:
+        return _run(writer, function, *args)
+
+    lock = _table_lock(table_name)
+    if read_only:
+        await lock.acquire_read(session)
+        try:
+            return _run(writer, function, *args)
+        finally:
+            await lock.release_read()
+
+    if session.transaction:
+        await lock.acquire_write(session)
+        session.tables.add(table_name)
+        return _run(writer, function, *args)
+
+    async with _transaction_gate:
+        await lock.acquire_write(session)
+        try:
+            return _run(writer, function, *args)
+        finally:
+            await lock.release_write()
+
+async def _locked_reads(session, writer, table_names, function, *args):
+    """
+    выполняет читающую команду под блокировками нескольких таблиц.
+    пока одна из таблиц занята, остальные не удерживаются: иначе чтение
+    и транзакция, которая ждёт одну из них, ждали бы друг друга
+    """
+    locks = [_table_lock(table_name) for table_name in dict.fromkeys(table_names)
+             if table_name not in session.tables]
+    while busy := next((lock for lock in locks
+                        if not lock.readable(session)), None):
+        await busy.wait_readable(session)
+    # все таблицы свободны: блокировки берутся без ожидания
+    for lock in locks:
+        await lock.acquire_read(session)
+    try:
+        return _run(writer, function, *args)
+    finally:
+        for lock in locks:
+            await lock.release_read()
+
+async def _finish_transaction(session, writer, function):
+    "commit или rollback транзакции сессии; освобождает её таблицы"
+    try:
+        return _run(writer, function)
+    finally:
+        for table_name in session.tables:
+            await _table_lock(table_name).release_write()
+        session.tables.clear()
+        session.transaction = False
+        _transaction_gate.release()
+
+async def _serve_request(session, request, writer):
+    "выполняет один запрос клиента; возвращает (успех, сообщение)"
+    if request.startswith("{"):
+        try:
+            data = json.loads(request)
+            statement = prepare(data["sql"]).bind(*data.get("params", []))
+        except ParseError as e:
+            return False, str(e)
+        except Exception as e:
+            return False, f"Ошибка при разборе команды: {e}"
+        return await _statement(session, writer, statement)
+
+    words = request.split(None, 2)
+    name = words[0].lower()
+    if name in CRUD_COMMANDS:
+        try:
+            with metrics.phase("parse"):
+                statement = parse_statement(request)
+        except ParseError as e:
+            return False, str(e)
+        except Exception as e:
+            return False, f"Ошибка при разборе команды: {e}"
+        return await _statement(session, writer, statement)
+
+    if name in ("explain", "profile"):
+        return await _wrapped(session, request, writer, name)
+
+    match name:
+        case "begin":
+            if session.transaction:
+                return False, "Ошибка: транзакция уже открыта."
+            await _transaction_gate.acquire()
+            ok, message = _run(writer, core.begin)
+            if ok:
+                session.transaction = True
+            else:
+                _transaction_gate.release()
+            return ok, message
+        case "commit" | "rollback" if session.transaction:
+            function = core.commit if name == "commit" else core.rollback
+            return await _finish_transaction(session, writer, function)
+        case "commit" | "rollback":
+            return False, "Ошибка: нет открытой транзакции."
+
+    table_name = words[1].lower() if name in TABLE_COMMANDS \
+        and len(words) > 1 else None
+    return await _locked(session, writer, table_name,
+                         TABLE_COMMANDS.get(name, True), execute, request)
+
+async def _statement(session, writer, statement, read_only=False, call=None):
+    """
+    выполняет разобранную команду под блокировками её таблиц. read_only -
+    только читать таблицы, даже если команда их меняет; call - (функция,
+    аргументы), которые выполняются вместо самой команды
+    """
+    function, *args = call or (execute_statement, statement)
+    if statement.operation == "join":
+        return await _locked_reads(session, writer, statement.args[:2],
+                                   function, *args)
+    read_only = read_only or statement.operation in READ_OPERATIONS
+    table_name = statement.args[0]
+    if statement.operation == "select":
+        # представление читается под блокировкой своей базовой таблицы
+        table_name = base_table(table_name) or table_name
+    elif statement.operation == "create_view":
+        # представление строится по базовой таблице и дальше меняется
+        # вместе с ней: таблица занимается как для изменения
+        table_name = statement.args[2][0]
+    return await _locked(session, writer, table_name, read_only,
+                         function, *args)
+
+async def _wrapped(session, request, writer, name):
+    """
+    explain и profile: блокировки берутся по команде внутри них, а
+    выполняет запрос целиком engine. explain команду только разбирает
+    и читает таблицы
+    """
+    _, inner = wrapped_command(request)
+    words = inner.split(None, 2)
+    inner_name = words[0].lower() if words else ""
+    if inner_name in ("begin", "commit", "rollback"):
+        return False, f"Ошибка: {name} не применяется к {inner_name}."
+    if inner_name in CRUD_COMMANDS:
+        try:
+            statement = parse_statement(inner)
+        except Exception:
+            # ошибку разбора напечатает сама команда
+            return _run(writer, execute, request)
+        return await _statement(session, writer, statement,
+                                read_only=name == "explain",
+                                call=(execute, request))
+    if name == "explain":
+        return _run(writer, execute, request)
+    table_name = words[1].lower() if inner_name in TABLE_COMMANDS \
+        and len(words) > 1 else None
+    return await _locked(session, writer, table_name,
+                         TABLE_COMMANDS.get(inner_name, True), execute, request)
+
+async def _handle_client(reader, writer):
+    metrics.count("server.connections")
+    session = Session()
+    try:
+        while line := await reader.readline():
+            request = line.decode("utf-8").strip()
+            if not request:
+                continue
+            if request.lower() == "exit":
+                break
+            metrics.count("server.requests")
+            ok, message = await _serve_request(session, request, writer)
+            writer.write(encode_message({"ok": ok, "message": message}))
+            await writer.drain()
+    except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+        pass
+    finally:
+        # незавершённая транзакция отключившегося клиента откатывается
+        if session.transaction:
+            await _finish_transaction(session, writer, core.rollback)
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+async def serve(path=None, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """
+    запускает сервер на unix сокете path или на tcp host:port и
+    обслуживает клиентов до остановки
+    """
+    global _transaction_gate
+    _transaction_gate = asyncio.Lock()
+    if path is not None:
+        server = await asyncio.start_unix_server(_handle_client, path,
+                                                 limit=LINE_LIMIT)
+        print(f"Сервер слушает сокет {path}")
+    else:
+        server = await asyncio.start_server(_handle_client, host, port,
+                                            limit=LINE_LIMIT)
+        print(f"Сервер слушает {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+def run_server(path=None, host=DEFAULT_HOST, port=DEFAULT_PORT,
+               auto_confirm=False):
+    """
+    запускает сервер до Ctrl+C. удаления подтверждаются без вопроса,
+    только если auto_confirm - иначе они пропускаются
+    """
+    set_auto_confirm(bool(auto_confirm))
+    ensure_data_dir()
+    try:
+        asyncio.run(serve(path, host, port))
+    except KeyboardInterrupt:
+        print("Сервер остановлен.")
+    finally:
+        if path is not None and os.path.exists(path):
+            os.remove(path)
@@ -1,18 +1,763 @@
+import bisect
+import csv
 import json
+import mmap
+import os
+import struct
+from array import array
+from contextlib import contextmanager, suppress
+from operator import itemgetter
 
+from primitive_db import metrics
 
-def load_table_data(table_name):
-    "выгрузка json файла с названием table_name в python словарь"
-    filepath = f"src/primitive_db/data/{table_name}.json"
+try:
+    import fcntl
+except ImportError:  # Windows: блокировки между процессами недоступны
+    fcntl = None
+
+DATA_DIR = "src/primitive_db/data"
+# DATA_DIR с разделителем на конце: пути к файлам таблиц собираются одним
+# сложением строк, без os.path.join на каждое обращение
+_DATA_PREFIX = os.path.join(DATA_DIR, "")
+# папка данных уже проверена и создана этим процессом
+_data_dir_ready = False
+# кеш содержимого папки данных: (mtime папки, имена файлов)
+_listing = None
+
+# способы хранения строк таблицы, выбираются в create_table
+STORAGE_BACKENDS = ("json", "columnar", "segmented")
+
+# в таблице segmented каждый сегмент хранит строки стольких ID подряд.
+# размер запоминается в таблице при создании
+SEGMENT_ROWS = 10_000
+
+# журнал сворачивается в снимок, когда становится больше снимка,
+# но не раньше, чем наберёт столько байт
+LOG_COMPACT_MIN_BYTES = 64 * 1024
+
+
+def table_path(table_name):
+    "путь к json снимку таблицы"
+    return f"{_DATA_PREFIX}{table_name}.json"
+
+def log_path(table_name):
+    "путь к журналу изменений таблицы (по одной json записи на строку)"
+    return f"{_DATA_PREFIX}{table_name}.log"
+
+def index_path(table_name):
+    "путь к файлу индексов таблицы"
+    return f"{_DATA_PREFIX}{table_name}.idx"
+
+def columns_path(table_name, meta=None):
+    """
+    путь к колоночному файлу таблицы columnar. имя файла с номером seq
+    снимка записано в манифесте meta; таблицы, сохранённые до этого,
+    хранят столбцы в <таблица>.col
+    """
+    name = meta.get("columns_file") if meta else None
+    return f"{_DATA_PREFIX}{name or table_name + '.col'}"
+
+def segments_dir(table_name):
+    "папка с файлами сегментов таблицы segmented"
+    return f"{_DATA_PREFIX}{table_name}.seg"
+
+def segment_path(table_name, name):
+    "путь к файлу сегмента таблицы segmented"
+    return f"{_DATA_PREFIX}{table_name}.seg/{name}.json"
+
+def view_path(view_name):
+    "путь к определению материализованного представления"
+    return f"{_DATA_PREFIX}{view_name}.view"
+
+def lock_path(table_name):
+    "путь к файлу блокировки таблицы"
+    return f"{_DATA_PREFIX}{table_name}.lock"
+
+def ensure_data_dir():
+    "создаёт папку данных, если её нет; проверяется один раз за процесс"
+    global _data_dir_ready
+    if not _data_dir_ready:
+        os.makedirs(DATA_DIR, exist_ok=True)
+        _data_dir_ready = True
+
+def data_files():
+    "имена файлов папки данных; папка перечитывается, только если в ней что-то менялось"
+    global _listing
+    try:
+        mtime = os.stat(DATA_DIR).st_mtime_ns
+    except FileNotFoundError:
+        return []
+    if _listing is None or _listing[0] != mtime:
+        _listing = (mtime, os.listdir(DATA_DIR))
+    return _listing[1]
+
+def columns_files(table_name):
+    "колоночные файлы таблицы: текущий и оставшиеся от прерванной записи"
+    prefix = f"{table_name}.col-"
+    return [name for name in data_files()
+            if name == f"{table_name}.col"
+            or (name.startswith(prefix) and name[len(prefix):].isdigit())]
+
+def is_columnar(table_name):
+    "хранится ли таблица в колоночном формате"
+    return bool(columns_files(table_name))
+
+def file_stamp(path):
+    """
+    (mtime, размер, inode) файла - по ним видно, что файл изменился.
+    inode меняется при атомарной замене файла
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size, stat.st_ino]
+
+def table_stamp(table_name):
+    "отметки всех файлов таблицы: по ним видно, что таблицу изменили"
+    # колоночный файл и сегменты не проверяются: при их замене всегда
+    # переписывается и снимок-манифест
+    return file_stamp(table_path(table_name)), file_stamp(log_path(table_name))
+
+# блокировки, которые держит этот процесс:
+# table -> {"file": ..., "shared": ..., "depth": число вложенных захватов}
+_held_locks = {}
+
+def _flock(file, shared):
+    if fcntl is not None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+
+@contextmanager
+def table_lock(table_name, shared=False):
+    """
+    блокировка таблицы между процессами через файл <таблица>.lock.
+    shared - блокировка читателя, их может быть несколько одновременно;
+    иначе исключительная блокировка писателя. повторный захват в том же
+    процессе не ждёт: вложенное чтение под записью проходит сразу.
+    блокировка снимается, когда выходит последний из вложенных захватов
+    """
+    held = _held_locks.get(table_name)
+    if held is None and shared and not os.path.exists(lock_path(table_name)) \
+            and not os.path.exists(table_path(table_name)):
+        # читать нечего: чтение несуществующей таблицы (например, опечатка
+        # в имени) не должно создавать на диске файл блокировки
+        yield
+        return
+    if held is None:
+        try:
+            file = open(lock_path(table_name), "a+b")
+        except FileNotFoundError:
+            os.makedirs(DATA_DIR, exist_ok=True)
+            file = open(lock_path(table_name), "a+b")
+        try:
+            _flock(file, shared)
+        except BaseException:
+            file.close()
+            raise
+        held = _held_locks[table_name] = {"file": file, "shared": shared,
+                                          "depth": 0}
+    upgrade = held["shared"] and not shared
+    if upgrade:
+        _flock(held["file"], shared=False)
+        held["shared"] = False
+    held["depth"] += 1
+    try:
+        yield
+    finally:
+        held["depth"] -= 1
+        if held["depth"] == 0:
+            _held_locks.pop(table_name, None)
+            # закрытие файла снимает блокировку
+            held["file"].close()
+        elif upgrade:
+            _flock(held["file"], shared=True)
+            held["shared"] = True
+
+def write_atomic(path, blob):
+    """
+    записывает файл целиком через временный файл и переименование:
+    при сбое на диске остаётся либо старая, либо новая версия
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as file:
+            file.write(blob)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+        metrics.count("bytes.written", len(blob))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def load_table_meta(table_name):
+    """
+    выгрузка json файла таблицы без чтения колоночных данных.
+    для таблиц json это вся таблица
+    """
     try:
-        with open(filepath, "r", encoding="utf-8") as file:
-            return json.load(file)
+        with open(table_path(table_name), "rb") as file:
+            blob = file.read()
     except FileNotFoundError:
         return {}
+    metrics.count("bytes.read", len(blob))
+    return json.loads(blob)
+
+def typed_rows(rows):
+    """
+    строки снимка кортежами с целыми ID. в снимках, записанных до перехода
+    на целые ID, ID - строки: они приводятся при загрузке, а снимок
+    перезаписывается с целыми ID при следующем сворачивании журнала
+    """
+    if rows and isinstance(rows[0][0], str):
+        return [(int(row[0]), *row[1:]) for row in rows]
+    return list(map(tuple, rows))
+
+def load_table_data(table_name):
+    "выгрузка json файла с названием table_name в python словарь"
+    data = load_table_meta(table_name)
+    if not data:
+        return {}
+    if data.get("storage") == "columnar":
+        data["rows"] = read_columnar(table_name, data)
+    elif data.get("storage") == "segmented":
+        data["rows"] = read_segments(table_name, data["segments"])
+    else:
+        data["rows"] = typed_rows(data["rows"])
+    # накатываем на снимок изменения, записанные после него
+    for record in read_log(table_name, after=data.get("seq", 0)):
+        apply_log_record(data, record)
+    return data
 
 def save_table_data(table_name, data):
-    "загрузка словаря обратно в json файл"
-    filepath = f"src/primitive_db/data/{table_name}.json"
-    with open(filepath, "w", encoding="utf-8") as file:
-        json.dump(data, file, indent=4, ensure_ascii=False)
+    """
+    загрузка словаря обратно в json файл. файлы заменяются атомарно,
+    так что сбой посреди записи не портит таблицу
+    """
+    stale = []
+    if data.get("storage") == "columnar":
+        # столбцы пишутся в новый файл с номером seq: пока манифест не
+        # заменён, он указывает на прежний файл, и журнал накатывается
+        # на него, а не на уже свёрнутые строки
+        data["columns_file"] = write_columnar(table_name, data["columns"],
+                                              data["rows"], data.get("seq", 0))
+        stale = [_DATA_PREFIX + name for name in columns_files(table_name)
+                 if name != data["columns_file"]]
+        data = dict(data, rows=[])
+    elif data.get("storage") == "segmented":
+        data["segments"], stale = write_segments(table_name, data)
+        stale = [os.path.join(segments_dir(table_name), name) for name in stale]
+        data = dict(data, rows=[])
+    # без отступов: json.dumps тогда работает через быстрый C-кодировщик
+    write_atomic(table_path(table_name),
+                 json.dumps(data, ensure_ascii=False).encode("utf-8"))
+    # заменённые файлы столбцов и сегментов удаляются, когда новый
+    # манифест уже на диске
+    for path in stale:
+        with suppress(FileNotFoundError):
+            os.remove(path)
+    # снимок уже содержит все изменения из журнала. если удалить журнал
+    # не успели, его записи отсекутся по номеру seq
+    if os.path.exists(log_path(table_name)):
+        os.remove(log_path(table_name))
+
+def export_table_json(table_name, path):
+    "выгружает таблицу любого формата хранения в читаемый json файл"
+    data = load_table_data(table_name)
+    if not data:
+        raise FileNotFoundError(table_name)
+    exported = {"columns": data["columns"], "rows": data["rows"]}
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(exported, file, indent=4, ensure_ascii=False)
+    return len(data["rows"])
+
+def read_log(table_name, after=0):
+    """
+    построчно читает журнал изменений таблицы. записи с номером seq
+    не больше after уже есть в снимке и пропускаются
+    """
+    try:
+        with open(log_path(table_name), "rb") as file:
+            for line in file:
+                metrics.count("bytes.read", len(line))
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # недописанная при сбое строка - запись не была подтверждена
+                    continue
+                if record.get("seq", after + 1) > after:
+                    yield _migrate_record(record)
+    except FileNotFoundError:
+        return
+
+def _migrate_record(record):
+    "приводит ID в записи журнала, сделанной до перехода на целые ID"
+    match record["op"]:
+        case "insert" if isinstance(record["row"][0], str):
+            record["row"][0] = int(record["row"][0])
+        case "insert_many" if record["rows"] \
+                and isinstance(record["rows"][0][0], str):
+            for row in record["rows"]:
+                row[0] = int(row[0])
+        case "update" | "delete" if record["ids"] \
+                and isinstance(record["ids"][0], str):
+            record["ids"] = [int(row_id) for row_id in record["ids"]]
+    return record
+
+def apply_log_record(data, record):
+    "применяет одну запись журнала к загруженной таблице"
+    if "seq" in record:
+        data["seq"] = record["seq"]
+    match record["op"]:
+        case "insert":
+            data["rows"].append(tuple(record["row"]))
+            _advance_id(data, record["row"])
+        case "insert_many":
+            data["rows"].extend(map(tuple, record["rows"]))
+            if record["rows"]:
+                _advance_id(data, record["rows"][-1])
+        case "update":
+            ids = set(record["ids"])
+            col = record["col"]
+            value = record["value"]
+            rows = data["rows"]
+            for pos, row in enumerate(rows):
+                if row[0] in ids:
+                    rows[pos] = (*row[:col], value, *row[col + 1:])
+        case "delete":
+            ids = set(record["ids"])
+            data["rows"] = [row for row in data["rows"] if row[0] not in ids]
+
+def _advance_id(data, row):
+    # ID не переиспользуются: счётчик не убывает и после удаления строк
+    data["next_id"] = max(data.get("next_id", 1), row[0] + 1)
+
+# журналы, сброс которых на диск отложен до конца пакета команд,
+# или None, если каждая запись сбрасывается сразу
+_unsynced = None
+
+@contextmanager
+def deferred_sync():
+    """
+    откладывает fsync журналов до выхода из блока: пакет команд
+    сбрасывается на диск один раз. при сбое теряются только последние
+    записи пакета, а недописанная строка журнала пропускается при чтении
+    """
+    global _unsynced
+    if _unsynced is not None:
+        yield
+        return
+    _unsynced = set()
+    try:
+        yield
+    finally:
+        paths, _unsynced = _unsynced, None
+        for path in paths:
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except FileNotFoundError:
+                # журнал свернули в снимок, а снимок записан с fsync
+                continue
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+def append_log(table_name, records):
+    "дописывает записи в конец журнала и сбрасывает их на диск; возвращает его размер"
+    with open(log_path(table_name), "a+b") as file:
+        # если прошлая запись оборвалась на середине, начинаем с новой строки
+        prefix = b""
+        if file.tell() > 0:
+            file.seek(-1, os.SEEK_END)
+            if file.read(1) != b"\n":
+                prefix = b"\n"
+        lines = "".join(json.dumps(record, ensure_ascii=False) + "\n"
+                        for record in records)
+        blob = prefix + lines.encode("utf-8")
+        file.write(blob)
+        file.flush()
+        if _unsynced is None:
+            os.fsync(file.fileno())
+        else:
+            _unsynced.add(log_path(table_name))
+        size = file.tell()
+    metrics.count("bytes.written", len(blob))
+    return size
+
+def log_mutation(table_name, data, *records):
+    """
+    фиксирует изменение таблицы в журнале. data - таблица в памяти,
+    к которой изменение уже применено: если журнал разросся, она
+    целиком сохраняется как новый снимок. возвращает True, если снимок
+    был переписан. вызывается под исключительной блокировкой таблицы
+    """
+    number_records(data, records)
+    return persist_records(table_name, data, records)
+
+def number_records(data, records):
+    """
+    назначает записям журнала очередные номера seq. номер позволяет
+    не применить запись дважды, если снимок уже сохранён, а журнал
+    удалить не успели
+    """
+    for record in records:
+        data["seq"] = record["seq"] = data.get("seq", 0) + 1
+
+def persist_records(table_name, data, records):
+    "дописывает пронумерованные записи в журнал; как log_mutation"
+    log_size = append_log(table_name, records)
+    snapshot_size = os.path.getsize(table_path(table_name))
+    if data.get("storage") == "columnar":
+        snapshot_size += os.path.getsize(columns_path(table_name, data))
+    elif data.get("storage") == "segmented":
+        # сворачивание переписывает только затронутые сегменты, а не таблицу
+        snapshot_size = 0
+    if log_size > max(LOG_COMPACT_MIN_BYTES, snapshot_size):
+        save_table_data(table_name, data)
+        return True
+    return False
+
+# Транзакция, затрагивающая несколько таблиц, фиксируется так: все её записи
+# сначала сохраняются в файл намерения <pid>.txn, затем дописываются
+# в журналы таблиц, и файл намерения удаляется. если процесс упал посередине,
+# recover_transactions дописывает недостающие записи по номерам seq.
+
+def transaction_path():
+    "файл намерения транзакции этого процесса"
+    return f"{_DATA_PREFIX}{os.getpid()}.txn"
+
+@contextmanager
+def transaction_intent(tables):
+    """
+    сохраняет записи транзакции {таблица: [записи]} в файл намерения
+    и держит его, пока записи переносятся в журналы таблиц
+    """
+    global _unsynced
+    path = transaction_path()
+    write_atomic(path, json.dumps(tables, ensure_ascii=False).encode("utf-8"))
+    # файл намерения удаляется, только когда журналы уже на диске,
+    # поэтому отложенный сброс на время фиксации выключается
+    deferred, _unsynced = _unsynced, None
+    try:
+        with open(path, "rb") as file:
+            # пока файл заблокирован, восстановление его не трогает
+            _flock(file, shared=False)
+            yield
+            with suppress(FileNotFoundError):
+                os.remove(path)
+    finally:
+        _unsynced = deferred
+
+def recover_transactions():
+    """
+    доводит до конца транзакции, прерванные сбоем посреди фиксации.
+    пропускается, если процесс держит блокировки таблиц: восстановление
+    само их берёт и не должно ждать по кругу
+    """
+    if _held_locks or not os.path.isdir(DATA_DIR):
+        return
+    for name in os.listdir(DATA_DIR):
+        if not name.endswith(".txn"):
+            continue
+        path = os.path.join(DATA_DIR, name)
+        try:
+            file = open(path, "rb")
+        except FileNotFoundError:
+            continue
+        with file:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # транзакция ещё фиксируется живым процессом
+                    continue
+            try:
+                tables = json.loads(file.read())
+            except ValueError:
+                # файл намерения не дописан - транзакция не начала фиксироваться
+                tables = {}
+            for table_name, records in tables.items():
+                with table_lock(table_name):
+                    data = load_table_data(table_name)
+                    if not data:
+                        continue
+                    pending = [record for record in records
+                               if record["seq"] > data.get("seq", 0)]
+                    if pending:
+                        append_log(table_name, pending)
+            if os.path.exists(path):
+                os.remove(path)
+
+def compact_table(table_name):
+    "сворачивает журнал в снимок таблицы"
+    data = load_table_data(table_name)
+    if data:
+        save_table_data(table_name, data)
+    return data
+
+def remove_table_files(table_name):
+    """
+    удаляет снимок таблицы вместе с журналом и индексами. файл блокировки
+    остаётся: его могут ждать другие процессы
+    """
+    for path in (table_path(table_name), log_path(table_name),
+                 index_path(table_name)):
+        if os.path.exists(path):
+            os.remove(path)
+    for name in columns_files(table_name):
+        os.remove(_DATA_PREFIX + name)
+    if os.path.isdir(segments_dir(table_name)):
+        for name in os.listdir(segments_dir(table_name)):
+            os.remove(os.path.join(segments_dir(table_name), name))
+        os.rmdir(segments_dir(table_name))
+
+def read_import_file(path):
+    """
+    потоково читает файл импорта .csv или .jsonl.
+    отдаёт пары (номер строки, значения)
+    """
+    with open(path, "r", encoding="utf-8", newline="") as file:
+        if path.lower().endswith(".csv"):
+            for line_no, values in enumerate(csv.reader(file), start=1):
+                if values:
+                    yield line_no, values
+        elif path.lower().endswith(".jsonl"):
+            for line_no, line in enumerate(file, start=1):
+                if line.strip():
+                    yield line_no, json.loads(line)
+        else:
+            raise ValueError("поддерживаются только файлы .csv и .jsonl")
+
+
+# Колоночный формат (.col): заголовок, описатели столбцов и данные столбцов.
+# int хранятся массивом int64, bool - байтами 0/1, str - словарём
+# различных строк (json) и массивом uint32 кодов. Файл читается через mmap,
+# так что поиск по одному столбцу не трогает остальные.
+_COLUMNAR_MAGIC = b"PDBC"
+_HEADER = struct.Struct("<4sII")  # метка, число строк, число столбцов
+_COLUMN = struct.Struct("<c7xQQ")  # вид столбца, смещение, длина
+_KINDS = {"int": b"i", "bool": b"b", "str": b"s"}
+
+def _pad(blob):
+    # выравниваем данные столбцов по 8 байт
+    return blob + b"\0" * (-len(blob) % 8)
+
+def _encode_column(col_type, values):
+    if col_type == "int":
+        return array("q", [int(value) for value in values]).tobytes()
+    if col_type == "bool":
+        return bytes(1 if value else 0 for value in values)
+    dictionary = {}
+    codes = array("I", [dictionary.setdefault(value, len(dictionary))
+                        for value in values])
+    words = json.dumps(list(dictionary), ensure_ascii=False).encode("utf-8")
+    return _pad(struct.pack("<Q", len(words)) + words) + codes.tobytes()
+
+def write_columnar(table_name, columns, rows, seq):
+    """
+    сохраняет строки таблицы версии seq в колоночном формате в новый файл
+    <таблица>.col-<seq>; возвращает имя файла для манифеста
+    """
+    blobs = [_pad(_encode_column(col_type, [row[i] for row in rows]))
+             for i, (_, col_type) in enumerate(columns)]
+    offset = _HEADER.size + _COLUMN.size * len(columns)
+    parts = [_HEADER.pack(_COLUMNAR_MAGIC, len(rows), len(columns))]
+    for (_, col_type), blob in zip(columns, blobs):
+        parts.append(_COLUMN.pack(_KINDS[col_type], offset, len(blob)))
+        offset += len(blob)
+    parts.extend(blobs)
+    name = f"{table_name}.col-{seq}"
+    write_atomic(_DATA_PREFIX + name, b"".join(parts))
+    return name
+
+class ColumnarReader:
+    """
+    колоночный файл, открытый через mmap. столбцы декодируются по одному,
+    строки собираются только в нужных позициях
+    """
+
+    def __init__(self, table_name, meta):
+        self._file = open(columns_path(table_name, meta), "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.nrows, ncols = _HEADER.unpack_from(self._map, 0)
+        if magic != _COLUMNAR_MAGIC:
+            self.close()
+            raise ValueError(f"повреждён колоночный файл таблицы {table_name}")
+        self._columns = [_COLUMN.unpack_from(self._map,
+                                             _HEADER.size + i * _COLUMN.size)
+                         for i in range(ncols)]
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    @contextmanager
+    def _view(self, offset, length, fmt):
+        metrics.count("bytes.read", length)
+        raw = memoryview(self._map)[offset:offset + length]
+        view = raw.cast(fmt)
+        try:
+            yield view
+        finally:
+            view.release()
+            raw.release()
+
+    def _codes(self, offset):
+        "(словарь, смещение и длина кодов) для строкового столбца"
+        (words_len,) = struct.unpack_from("<Q", self._map, offset)
+        words_start = offset + 8
+        metrics.count("bytes.read", words_len)
+        dictionary = json.loads(self._map[words_start:words_start + words_len])
+        codes_start = words_start + words_len + (-(8 + words_len) % 8)
+        return dictionary, codes_start, self.nrows * 4
+
+    def values(self, column_index):
+        "все значения столбца списком"
+        kind, offset, length = self._columns[column_index]
+        if kind == b"s":
+            dictionary, offset, length = self._codes(offset)
+            with self._view(offset, length, "I") as codes:
+                return [dictionary[code] for code in codes]
+        if kind == b"b":
+            with self._view(offset, self.nrows, "B") as view:
+                return [value == 1 for value in view]
+        with self._view(offset, self.nrows * 8, "q") as view:
+            return view.tolist()
+
+    def find(self, column_index, predicate):
+        """
+        позиции строк, где значение столбца удовлетворяет predicate.
+        для строк predicate вызывается один раз на каждое слово словаря
+        """
+        kind, offset, length = self._columns[column_index]
+        if kind == b"s":
+            dictionary, offset, length = self._codes(offset)
+            matching = {code for code, word in enumerate(dictionary)
+                        if predicate(word)}
+            with self._view(offset, length, "I") as codes:
+                return [pos for pos, code in enumerate(codes) if code in matching]
+        if kind == b"b":
+            with self._view(offset, self.nrows, "B") as view:
+                return [pos for pos, value in enumerate(view)
+                        if predicate(value == 1)]
+        with self._view(offset, self.nrows * 8, "q") as view:
+            return [pos for pos, value in enumerate(view) if predicate(value)]
+
+    def rows_at(self, positions):
+        "строки в заданных позициях"
+        columns = []
+        for kind, offset, length in self._columns:
+            if kind == b"s":
+                dictionary, offset, length = self._codes(offset)
+                with self._view(offset, length, "I") as codes:
+                    columns.append([dictionary[codes[pos]] for pos in positions])
+            elif kind == b"b":
+                with self._view(offset, self.nrows, "B") as view:
+                    columns.append([view[pos] == 1 for pos in positions])
+            else:
+                with self._view(offset, self.nrows * 8, "q") as view:
+                    columns.append([view[pos] for pos in positions])
+        return _to_rows(columns)
+
+def _to_rows(columns):
+    return list(zip(*columns))
+
+def read_columnar(table_name, meta):
+    "читает все строки колоночной таблицы с манифестом meta"
+    reader = ColumnarReader(table_name, meta)
+    try:
+        return _to_rows([reader.values(i) for i in range(len(meta["columns"]))])
+    finally:
+        reader.close()
+
+def scan_columnar(table_name, meta, column_index, predicate):
+    """
+    строки колоночной таблицы, у которых значение столбца column_index
+    удовлетворяет predicate. читается только этот столбец, остальные -
+    лишь в найденных позициях
+    """
+    reader = ColumnarReader(table_name, meta)
+    metrics.count("rows.examined", reader.nrows)
+    try:
+        return reader.rows_at(reader.find(column_index, predicate))
+    finally:
+        reader.close()
+
+
+# Таблица segmented: строки разбиты на сегменты по диапазонам ID, сегмент
+# с номером n хранит ID от n * segment_rows + 1 до (n + 1) * segment_rows
+# и лежит в <таблица>.seg/<n>-<seq>.json. Снимок таблицы <таблица>.json
+# служит манифестом: для каждого сегмента - файл, число строк и границы
+# [min, max] значений каждого столбца. Сворачивание журнала переписывает
+# только сегменты, которых касались его записи.
+
+def segment_of(data, row_id):
+    "номер сегмента строки с данным ID"
+    return (row_id - 1) // data.get("segment_rows", SEGMENT_ROWS)
+
+def read_segments(table_name, segments):
+    "строки сегментов по порядку ID"
+    rows = []
+    for segment in segments:
+        with open(segment_path(table_name, segment["file"]), "rb") as file:
+            blob = file.read()
+        metrics.count("bytes.read", len(blob))
+        rows.extend(map(tuple, json.loads(blob)))
+    return rows
+
+def _touched_segments(table_name, data, after):
+    "номера сегментов, строки которых менялись в журнале после seq after"
+    touched = set()
+    for record in read_log(table_name, after=after):
+        match record["op"]:
+            case "insert":
+                ids = [record["row"][0]]
+            case "insert_many":
+                ids = [row[0] for row in record["rows"]]
+            case _:
+                ids = record["ids"]
+        touched.update(segment_of(data, row_id) for row_id in ids)
+    return touched
+
+def write_segments(table_name, data):
+    """
+    записывает сегменты, изменённые после снимка на диске, из строк data.
+    остальные файлы сегментов не трогаются. возвращает (сегменты для
+    манифеста, файлы папки сегментов, которых в манифесте больше нет -
+    их удаляют после его записи)
+    """
+    size = data.setdefault("segment_rows", SEGMENT_ROWS)
+    os.makedirs(segments_dir(table_name), exist_ok=True)
+    stored = load_table_meta(table_name)
+    if stored.get("segments") is None:
+        segments = {}
+        touched = {segment_of(data, row[0]) for row in data["rows"]}
+    else:
+        segments = {segment["key"]: segment for segment in stored["segments"]}
+        touched = _touched_segments(table_name, data, stored.get("seq", 0))
+
+    rows = data["rows"]
+    for key in sorted(touched):
+        start = bisect.bisect_left(rows, key * size + 1, key=itemgetter(0))
+        end = bisect.bisect_left(rows, (key + 1) * size + 1, key=itemgetter(0))
+        segments.pop(key, None)
+        if start == end:
+            continue
+        part = rows[start:end]
+        name = f"{key}-{data.get('seq', 0)}"
+        write_atomic(segment_path(table_name, name),
+                     json.dumps(part, ensure_ascii=False).encode("utf-8"))
+        segments[key] = {
+            "key": key,
+            "file": name,
+            "rows": len(part),
+            "stats": [[min(values), max(values)] for values in zip(*part)],
+        }
 
+    # заменённые сегменты и файлы, оставшиеся от прерванного сворачивания
+    keep = {f"{segment['file']}.json" for segment in segments.values()}
+    stale = [name for name in os.listdir(segments_dir(table_name))
+             if name not in keep]
+    return [segments[key] for key in sorted(segments)], stale
@@ -0,0 +1,329 @@
+from operator import itemgetter
+
+from primitive_db import metrics
+from primitive_db.query import columns_of, typed_value
+
+# Векторный движок для больших таблиц: столбцы int и bool держатся массивами
+# NumPy по порядку строк, условие where вычисляется масками над целыми
+# столбцами, агрегаты - функциями NumPy над отобранными значениями, а из
+# таблицы достаются только строки в найденных позициях. NumPy необязателен
+# и загружается при первом векторном проходе: без него core проходит строки
+# обычным циклом, и результат обоих путей одинаков. Массивы строятся по
+# столбцу при первом обращении и дальше поддерживаются по записям журнала,
+# как индексы и представления.
+
+# типы столбцов, которые хранятся массивами
+VECTOR_TYPES = ("int", "bool")
+# граница int64: сумма, которая может её превысить, считается обычным циклом
+_INT64_LIMIT = 2 ** 63
+
+# модуль numpy после первой попытки импорта; False - NumPy не установлен
+_numpy = None
+
+
+def numpy_module():
+    "модуль numpy или None, если он не установлен"
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            numpy = False
+        _numpy = numpy
+    return _numpy or None
+
+
+class _Fallback(Exception):
+    "значения столбца не помещаются в массив - нужен обычный проход"
+
+
+class Column:
+    "значения столбца массивом с запасом места для дописываемых строк"
+
+    def __init__(self, values):
+        self.buffer = values
+        self.size = len(values)
+
+    @property
+    def values(self):
+        return self.buffer[:self.size]
+
+    def extend(self, values):
+        np = _numpy
+        added = np.asarray(values, dtype=self.buffer.dtype)
+        end = self.size + len(added)
+        if end > len(self.buffer):
+            grown = np.empty(max(end, 2 * len(self.buffer), 16),
+                             dtype=self.buffer.dtype)
+            grown[:self.size] = self.values
+            self.buffer = grown
+        self.buffer[self.size:end] = added
+        self.size = end
+
+    def delete(self, positions):
+        self.buffer = _numpy.delete(self.values, positions)
+        self.size = len(self.buffer)
+
+
+# массивы таблиц, построенные в этом процессе:
+# table -> {"data": таблица, "seq": ..., "columns": {позиция: Column или None}}
+# None - значения столбца не помещаются в int64
+_loaded = {}
+
+def _state(table_name, metadata):
+    seq = metadata.get("seq", 0)
+    state = _loaded.get(table_name)
+    if state is None or state["data"] is not metadata or state["seq"] != seq:
+        state = _loaded[table_name] = {"data": metadata, "seq": seq,
+                                       "columns": {}}
+        # по ID находятся позиции изменённых и удалённых строк
+        _column(state, 0)
+    return state
+
+def _column(state, i):
+    "массив значений i-го столбца; строится при первом обращении"
+    columns = state["columns"]
+    if i not in columns:
+        np = _numpy
+        metadata = state["data"]
+        rows = metadata["rows"]
+        dtype = np.int64 if metadata["columns"][i][1] == "int" else np.bool_
+        try:
+            with metrics.phase("vectorize"):
+                values = np.fromiter(map(itemgetter(i), rows), dtype=dtype,
+                                     count=len(rows))
+        except OverflowError:
+            columns[i] = None
+        else:
+            columns[i] = Column(values)
+            metrics.count("vector.columns")
+    if columns[i] is None:
+        raise _Fallback
+    return columns[i].values
+
+def _resolve(columns, column):
+    for i, (name, col_type) in enumerate(columns):
+        if name == column:
+            return i, col_type
+    raise KeyError(column)
+
+def vectorizable(columns, node):
+    "все ли столбцы условия хранятся массивами"
+    types = dict(columns)
+    return all(types.get(column) in VECTOR_TYPES for column in columns_of(node))
+
+def _mask(state, node):
+    "булев массив: подходит ли строка на каждой позиции под условие"
+    match node[0]:
+        case "and":
+            return _mask(state, node[1]) & _mask(state, node[2])
+        case "or":
+            return _mask(state, node[1]) | _mask(state, node[2])
+
+    np = _numpy
+    column = node[2] if node[0] == "cmp" else node[1]
+    i, col_type = _resolve(state["data"]["columns"], column)
+    values = _column(state, i)
+    match node[0]:
+        case "cmp":
+            value = typed_value(col_type, node[3])
+            match node[1]:
+                case "=":
+                    return values == value
+                case "!=":
+                    return values != value
+                case "<":
+                    return values < value
+                case "<=":
+                    return values <= value
+                case ">":
+                    return values > value
+                case ">=":
+                    return values >= value
+        case "in":
+            # значения вне int64 в столбце не встречаются
+            wanted = [value for value in
+                      (typed_value(col_type, v) for v in node[2])
+                      if -_INT64_LIMIT <= value < _INT64_LIMIT]
+            return np.isin(values, np.array(wanted, dtype=values.dtype))
+        case "between":
+            low = typed_value(col_type, node[2])
+            high = typed_value(col_type, node[3])
+            return (values >= low) & (values <= high)
+    raise ValueError(f"неизвестное условие: {node[0]}")
+
+def vector_positions(table_name, metadata, node):
+    """
+    позиции строк, подходящих под условие, по возрастанию - по маскам над
+    массивами столбцов. None - векторный путь не подходит: нет NumPy,
+    в условии есть столбцы других типов или значения вне int64
+    """
+    np = numpy_module()
+    if np is None or not vectorizable(metadata["columns"], node):
+        return None
+    try:
+        with metrics.phase("vector"):
+            positions = np.flatnonzero(_mask(_state(table_name, metadata), node))
+    except _Fallback:
+        return None
+    metrics.count("scan.vector")
+    return positions.tolist()
+
+def _python_value(col_type, value):
+    "значение из массива в виде, в котором оно хранится в строках"
+    return bool(value) if col_type == "bool" else int(value)
+
+def _reduce(np, func, values, inverse, groups):
+    "итоги func по группам: список значений numpy (None - у группы нет строк)"
+    counts = np.bincount(inverse, minlength=groups)
+    if func == "count":
+        return counts.tolist()
+    values = values.astype(np.int64)
+    if func in ("sum", "avg"):
+        if len(values) and max(abs(int(values.min())), abs(int(values.max()))) \
+                * len(values) >= _INT64_LIMIT:
+            raise _Fallback
+        sums = np.zeros(groups, dtype=np.int64)
+        np.add.at(sums, inverse, values)
+        if func == "sum":
+            return sums.tolist()
+        # частное целых Python - как в обычном проходе
+        return [total / count if count else None
+                for total, count in zip(sums.tolist(), counts.tolist())]
+    info = np.iinfo(np.int64)
+    if func == "min":
+        result = np.full(groups, info.max, dtype=np.int64)
+        np.minimum.at(result, inverse, values)
+    else:
+        result = np.full(groups, info.min, dtype=np.int64)
+        np.maximum.at(result, inverse, values)
+    return [value if count else None
+            for value, count in zip(result.tolist(), counts.tolist())]
+
+def aggregate_vectorizable(columns, node, items, group_by):
+    "хранятся ли массивами все столбцы агрегатов, группировки и условия"
+    types = dict(columns)
+    used = set(group_by) | {column for _, column in items if column != "*"}
+    return all(types.get(column) in VECTOR_TYPES for column in used) \
+        and (node is None or vectorizable(columns, node))
+
+def _group_keys(np, columns):
+    """
+    (значения ключа по столбцам, номер группы каждой строки) для группировки
+    по массивам columns. группы пронумерованы по возрастанию ключа: номера
+    значений в каждом столбце, сложенные поразрядно, упорядочены так же,
+    как кортежи ключей
+    """
+    code = None
+    distinct = []
+    combinations = 1
+    for values in columns:
+        values, positions = np.unique(values, return_inverse=True)
+        combinations *= len(values)
+        if combinations >= _INT64_LIMIT:
+            raise _Fallback
+        code = positions if code is None else code * len(values) + positions
+        distinct.append(values)
+    codes, inverse = np.unique(code, return_inverse=True)
+    keys = [None] * len(distinct)
+    for j in reversed(range(len(distinct))):
+        keys[j] = distinct[j][codes % len(distinct[j])]
+        codes = codes // len(distinct[j])
+    return keys, inverse
+
+def vector_aggregate(table_name, metadata, node, items, group_by):
+    """
+    строки агрегатного select (до limit и offset), посчитанные над массивами
+    столбцов; группы идут по возрастанию ключа, как в обычном проходе.
+    None - векторный путь не подходит
+    """
+    np = numpy_module()
+    columns = metadata["columns"]
+    types = dict(columns)
+    if np is None or not aggregate_vectorizable(columns, node, items, group_by):
+        return None
+
+    try:
+        with metrics.phase("vector"):
+            state = _state(table_name, metadata)
+            mask = None if node is None else _mask(state, node)
+
+            def selected(column):
+                values = _column(state, _resolve(columns, column)[0])
+                return values if mask is None else values[mask]
+
+            size = len(metadata["rows"]) if mask is None \
+                else int(np.count_nonzero(mask))
+            if group_by:
+                if not size:
+                    return []
+                keys, inverse = _group_keys(np, [selected(column)
+                                                 for column in group_by])
+                groups = int(inverse.max()) + 1
+            else:
+                inverse = np.zeros(size, dtype=np.intp)
+                groups = 1
+
+            outputs = []
+            for func, column in items:
+                if func is None:
+                    j = group_by.index(column)
+                    outputs.append([_python_value(types[column], value)
+                                    for value in keys[j].tolist()])
+                    continue
+                values = None if func == "count" else selected(column)
+                result = _reduce(np, func, values, inverse, groups)
+                if func in ("min", "max"):
+                    result = [None if value is None
+                              else _python_value(types[column], value)
+                              for value in result]
+                outputs.append(result)
+    except _Fallback:
+        return None
+    metrics.count("aggregate.vector")
+    return [list(row) for row in zip(*outputs)]
+
+def apply_to_vectors(table_name, metadata, record):
+    """
+    поддерживает массивы таблицы после изменения. record - уже
+    пронумерованная запись журнала; массивы, построенные по другой
+    версии таблицы, выгружаются и при чтении строятся заново
+    """
+    state = _loaded.get(table_name)
+    if state is None:
+        return
+    if state["data"] is not metadata or state["columns"][0] is None \
+            or state["seq"] != metadata.get("seq", 0) - 1:
+        del _loaded[table_name]
+        return
+    np = _numpy
+    columns = state["columns"]
+    try:
+        match record["op"]:
+            case "insert" | "insert_many":
+                rows = record["rows"] if record["op"] == "insert_many" \
+                    else [record["row"]]
+                for i, column in columns.items():
+                    if column is not None:
+                        column.extend([row[i] for row in rows])
+            case "update":
+                column = columns.get(record["col"])
+                if column is not None:
+                    ids = columns[0].values
+                    positions = np.searchsorted(ids, record["ids"])
+                    column.buffer[positions] = record["value"]
+            case "delete":
+                ids = columns[0].values
+                positions = np.searchsorted(ids, record["ids"])
+                for column in columns.values():
+                    if column is not None:
+                        column.delete(positions)
+    except OverflowError:
+        # новое значение не помещается в int64 - массивы строятся заново
+        del _loaded[table_name]
+        return
+    state["seq"] = metadata.get("seq", 0)
+
+def forget_vectors(table_name):
+    "выгружает массивы таблицы из памяти"
+    _loaded.pop(table_name, None)
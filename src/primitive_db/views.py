@@ -0,0 +1,324 @@
+import json
+import operator
+import os
+
+from primitive_db import metrics
+from primitive_db.catalog import get_table
+from primitive_db.query import compile_where, plan_where
+from primitive_db.utils import DATA_DIR, file_stamp, view_path, write_atomic
+
+# Материализованные представления: определение (базовая таблица, условие,
+# агрегаты) хранится в <имя>.view, а результат - в памяти процесса. Он
+# строится при первом чтении и дальше поддерживается по изменениям строк,
+# которые core передаёт вместе с записями журнала, поэтому чтение стоит
+# O(размер результата). Если базовую таблицу перечитали с диска (её изменил
+# другой процесс или транзакцию откатили), результат строится заново.
+
+
+class FilterView:
+    "строки базовой таблицы, подходящие под условие, по возрастанию ID"
+
+    def __init__(self, columns, where):
+        self.columns = columns
+        self.field_names = [name for name, _ in columns]
+        self.predicate = compile_where(where, columns) if where \
+            else (lambda row: True)
+        self.rows = {}
+        # новые строки приходят с растущими ID; строку, которая стала
+        # подходить после update, надо переставить при чтении
+        self.ordered = True
+
+    def change(self, old, new):
+        "учитывает замену строки old на new (None - строки нет)"
+        if new is not None and self.predicate(new):
+            row_id = new[0]
+            if self.ordered and row_id not in self.rows and self.rows \
+                    and row_id < next(reversed(self.rows)):
+                self.ordered = False
+            self.rows[row_id] = new
+        elif old is not None:
+            self.rows.pop(old[0], None)
+
+    def result(self):
+        if not self.ordered:
+            self.rows = dict(sorted(self.rows.items()))
+            self.ordered = True
+        return list(self.rows.values())
+
+
+def _reversible(func, col_type):
+    """
+    (начальное значение, шаг, итог) агрегатной функции, которую можно
+    и пополнять, и уменьшать: шаг получает значение и знак +1 или -1.
+    min и max хранят счётчики значений, чтобы пережить удаление крайнего
+    """
+    match func:
+        case "count":
+            return lambda: 0, lambda acc, value, sign: acc + sign, None
+        case "sum" | "avg" if col_type not in ("int", "bool"):
+            raise ValueError(f"функция {func} применима только к столбцам "
+                             "int и bool.")
+        case "sum":
+            return (lambda: 0,
+                    lambda acc, value, sign: acc + sign * int(value), None)
+        case "avg":
+            return (lambda: (0, 0),
+                    lambda acc, value, sign: (acc[0] + sign * int(value),
+                                              acc[1] + sign),
+                    lambda acc: acc[0] / acc[1] if acc[1] else None)
+        case "min" | "max":
+            better = operator.lt if func == "min" else operator.gt
+            pick = min if func == "min" else max
+
+            def step(acc, value, sign):
+                counts, extreme = acc
+                if sign > 0:
+                    counts[value] = counts.get(value, 0) + 1
+                    if extreme is None or better(value, extreme):
+                        extreme = value
+                elif counts[value] > 1:
+                    counts[value] -= 1
+                else:
+                    del counts[value]
+                    if value == extreme:
+                        extreme = pick(counts) if counts else None
+                return counts, extreme
+            return lambda: ({}, None), step, operator.itemgetter(1)
+    raise ValueError(f"неизвестная агрегатная функция {func}.")
+
+
+class AggregateView:
+    """
+    агрегаты по группам строк базовой таблицы. для каждой группы хранятся
+    число строк и состояния функций; строка меняет только свою группу
+    """
+
+    def __init__(self, columns, where, items, group_by):
+        self.predicate = compile_where(where, columns) if where \
+            else (lambda row: True)
+        positions = {name: i for i, (name, _) in enumerate(columns)}
+        types = dict(columns)
+        for column in group_by:
+            if column not in positions:
+                raise KeyError(column)
+        self.group_positions = [positions[column] for column in group_by]
+
+        self.outputs = []
+        self.accumulators = []
+        self.columns = []
+        for func, column in items:
+            if func is None:
+                if column not in group_by:
+                    raise ValueError(f"столбец '{column}' должен быть в group by.")
+                self.outputs.append(("group", group_by.index(column)))
+                self.columns.append((column, types[column]))
+                continue
+            if column == "*":
+                if func != "count":
+                    raise ValueError(f"{func}(*) не поддерживается, "
+                                     "только count(*).")
+                position, col_type = None, None
+            elif column not in positions:
+                raise KeyError(column)
+            else:
+                position, col_type = positions[column], types[column]
+            self.outputs.append(("acc", len(self.accumulators)))
+            self.accumulators.append((position, *_reversible(func, col_type)))
+            result_type = col_type if func in ("min", "max") else \
+                "float" if func == "avg" else "int"
+            self.columns.append((f"{func}({column})", result_type))
+        self.field_names = [name for name, _ in self.columns]
+
+        # группа -> [число строк, состояния функций...]
+        self.groups = {}
+        if not group_by:
+            self.groups[()] = self._new_group()
+
+    def _new_group(self):
+        return [0] + [start() for _, start, _, _ in self.accumulators]
+
+    def _step(self, row, sign):
+        key = tuple(row[i] for i in self.group_positions)
+        group = self.groups.get(key)
+        if group is None:
+            group = self.groups[key] = self._new_group()
+        group[0] += sign
+        for i, (position, _, step, _) in enumerate(self.accumulators, start=1):
+            group[i] = step(group[i], None if position is None else row[position],
+                            sign)
+        # группа без строк исчезает из результата, общий итог остаётся
+        if group[0] == 0 and key:
+            del self.groups[key]
+
+    def change(self, old, new):
+        "учитывает замену строки old на new (None - строки нет)"
+        if old is not None and self.predicate(old):
+            self._step(old, -1)
+        if new is not None and self.predicate(new):
+            self._step(new, 1)
+
+    def result(self):
+        rows = []
+        for key in sorted(self.groups):
+            group = self.groups[key]
+            row = []
+            for kind, spec in self.outputs:
+                if kind == "group":
+                    row.append(key[spec])
+                else:
+                    final = self.accumulators[spec][3]
+                    state = group[spec + 1]
+                    row.append(final(state) if final else state)
+            rows.append(row)
+        return rows
+
+
+# представления, результат которых построен в этом процессе:
+# имя -> {"stamp": отметка файла определения, "definition": ...,
+#         "data": базовая таблица, "seq": её версия, "view": результат}
+_loaded = {}
+
+
+def _tree(node):
+    "условие из json: списки снова становятся кортежами, значения in - списком"
+    if node is None:
+        return None
+    if node[0] in ("and", "or"):
+        return (node[0], _tree(node[1]), _tree(node[2]))
+    return tuple(node)
+
+def _read_definition(view_name):
+    with open(view_path(view_name), "rb") as file:
+        definition = json.loads(file.read())
+    definition["where"] = _tree(definition["where"])
+    return definition
+
+def _build(definition, metadata):
+    "строит результат представления по всей базовой таблице"
+    columns = metadata["columns"]
+    where = definition["where"]
+    if definition.get("items") is None:
+        view = FilterView(columns, where)
+    else:
+        view = AggregateView(columns, where, definition["items"],
+                             definition["group_by"])
+    rows = metadata["rows"]
+    positions = plan_where(definition["table"], metadata, where) if where else None
+    for row in rows if positions is None else (rows[pos] for pos in positions):
+        view.change(None, row)
+    return view
+
+def _state(view_name):
+    """
+    состояние представления с результатом, соответствующим текущей версии
+    базовой таблицы. None - такого представления нет
+    """
+    stamp = file_stamp(view_path(view_name))
+    if stamp is None:
+        _loaded.pop(view_name, None)
+        return None
+    state = _loaded.get(view_name)
+    if state is None or state["stamp"] != stamp:
+        state = _loaded[view_name] = {"stamp": stamp, "data": None, "seq": None,
+                                      "definition": _read_definition(view_name)}
+    table_name = state["definition"]["table"]
+    metadata = get_table(table_name)
+    if not metadata:
+        raise KeyError(table_name)
+    seq = metadata.get("seq", 0)
+    if state["data"] is not metadata or state["seq"] != seq:
+        with metrics.phase("build"):
+            state["view"] = _build(state["definition"], metadata)
+        state["data"], state["seq"] = metadata, seq
+        metrics.count("views.builds")
+    return state
+
+def is_view(name):
+    return os.path.exists(view_path(name))
+
+def base_table(view_name):
+    "базовая таблица представления или None, если это не представление"
+    try:
+        return _read_definition(view_name)["table"]
+    except FileNotFoundError:
+        return None
+
+def dependent_views(table_name):
+    "представления, построенные над таблицей"
+    return [name for name in list_views() if base_table(name) == table_name]
+
+def view_result(view_name):
+    """
+    (столбцы с типами, строки) представления или None, если его нет.
+    строки не копируются: их нельзя менять
+    """
+    state = _state(view_name)
+    if state is None:
+        return None
+    metrics.count("views.reads")
+    return state["view"].columns, state["view"].result()
+
+def create_view(view_name, definition):
+    """
+    сохраняет определение представления {"table", "where", "items",
+    "group_by"} (items None - представление-фильтр) и строит результат.
+    ошибки в определении обнаруживаются до записи файла
+    """
+    metadata = get_table(definition["table"])
+    if not metadata:
+        raise KeyError(definition["table"])
+    view = _build(definition, metadata)
+    write_atomic(view_path(view_name),
+                 json.dumps(definition, ensure_ascii=False).encode("utf-8"))
+    _loaded[view_name] = {"stamp": file_stamp(view_path(view_name)),
+                          "definition": definition, "data": metadata,
+                          "seq": metadata.get("seq", 0), "view": view}
+    return view
+
+def drop_view(view_name):
+    _loaded.pop(view_name, None)
+    os.remove(view_path(view_name))
+
+def list_views():
+    try:
+        names = os.listdir(DATA_DIR)
+    except FileNotFoundError:
+        return []
+    return sorted(name[:-5] for name in names if name.endswith(".view"))
+
+def _changes(record, old_rows):
+    "пары (старая строка, новая строка) для записи журнала"
+    match record["op"]:
+        case "insert":
+            return [(None, tuple(record["row"]))]
+        case "insert_many":
+            return [(None, row) for row in record["rows"]]
+        case "update":
+            col = record["col"]
+            value = record["value"]
+            return [(old, (*old[:col], value, *old[col + 1:])) for old in old_rows]
+        case "delete":
+            return [(old, None) for old in old_rows]
+    return []
+
+def apply_to_views(table_name, metadata, record, old_rows=()):
+    """
+    поддерживает представления над таблицей после изменения. record -
+    уже пронумерованная запись журнала, old_rows - строки до изменения
+    (для update и delete). представление, построенное по другой версии
+    таблицы, выгружается и при чтении строится заново
+    """
+    changes = None
+    for view_name, state in list(_loaded.items()):
+        if state["definition"]["table"] != table_name:
+            continue
+        if state["data"] is not metadata \
+                or state["seq"] != metadata.get("seq", 0) - 1:
+            del _loaded[view_name]
+            continue
+        if changes is None:
+            changes = _changes(record, old_rows)
+        view = state["view"]
+        for old, new in changes:
+            view.change(old, new)
+        state["seq"] = metadata.get("seq", 0)
@@ -0,0 +1,49 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from primitive_db import core
+from primitive_db.decorators import set_auto_confirm
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "src")
+
+
+@pytest.fixture(scope="session", autouse=True)
+def workdir(tmp_path_factory):
+    """
+    DATA_DIR задан относительным путём: на время тестов рабочая папка -
+    временная, таблицы создаются в ней. удаление таблиц не спрашивает
+    подтверждения
+    """
+    path = tmp_path_factory.mktemp("db")
+    previous = os.getcwd()
+    os.chdir(path)
+    set_auto_confirm(True)
+    yield path
+    os.chdir(previous)
+
+@pytest.fixture
+def rows():
+    "rows(function, *args) - строки, которые вывела операция core"
+    def run(function, *args):
+        result = []
+        core.set_page_sink(lambda field_names, page: result.extend(map(tuple, page)))
+        try:
+            function(*args)
+        finally:
+            core.set_page_sink(None)
+        return result
+    return run
+
+@pytest.fixture
+def project(workdir):
+    "project(command) - выполняет команду в отдельном процессе, как project -c"
+    def run(command):
+        subprocess.run(
+            [sys.executable, "-m", "primitive_db.main", "--yes", "-c", command],
+            cwd=workdir, env=dict(os.environ, PYTHONPATH=SRC_DIR),
+            check=True, capture_output=True,
+        )
+    return run
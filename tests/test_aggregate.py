@@ -0,0 +1,50 @@
+from primitive_db import core
+from primitive_db.parser import parse_crud
+
+USERS = [["anna", "msk", 30, True], ["bob", "spb", 20, False],
+         ["eve", "msk", 25, True], ["dan", "kzn", 41, False],
+         ["ivan", "spb", 22, True]]
+
+
+def _users(name):
+    core.create_table(name, [("name", "str"), ("city", "str"), ("age", "int"),
+                             ("admin", "bool")])
+    core.insert_many(name, USERS)
+
+def test_aggregates_by_group(rows):
+    _users("agg_users")
+    items = [(None, "city"), ("count", "*"), ("sum", "age"), ("avg", "age"),
+             ("min", "name"), ("max", "age"), ("sum", "admin")]
+    # группы выдаются по порядку ключей
+    assert rows(core.aggregate, "agg_users", items, None, ["city"]) == [
+        ("kzn", 1, 41, 41.0, "dan", 41, 0),
+        ("msk", 2, 55, 27.5, "anna", 30, 2),
+        ("spb", 2, 42, 21.0, "bob", 22, 1)]
+    assert rows(core.aggregate, "agg_users", [("count", "*"), ("avg", "age")],
+                ("cmp", ">", "age", 21)) == [(4, 29.5)]
+    assert rows(core.aggregate, "agg_users", [(None, "city"), ("count", "*")],
+                None, ["city"], 1, 1) == [("msk", 2)]
+    assert rows(parse_crud, "select city, count(*), max(age) from agg_users "
+                            "where admin = true group by city") == \
+        [("msk", 2, 30), ("spb", 1, 22)]
+    core.drop_table("agg_users")
+
+def test_aggregates_of_no_rows(rows):
+    _users("agg_empty")
+    items = [("count", "*"), ("sum", "age"), ("avg", "age"), ("min", "age")]
+    where = ("cmp", ">", "age", 100)
+    assert rows(core.aggregate, "agg_empty", items, where) == [(0, 0, None, None)]
+    assert rows(core.aggregate, "agg_empty", [(None, "city"), ("count", "*")],
+                where, ["city"]) == []
+    core.drop_table("agg_empty")
+
+def test_invalid_aggregates_are_rejected(rows, capsys):
+    _users("agg_invalid")
+    for items, group_by, message in (
+            ([("sum", "name")], [], "применима только к столбцам int и bool"),
+            ([(None, "city"), ("count", "*")], [], "должен быть в group by"),
+            ([("max", "*")], [], "max(*) не поддерживается"),
+            ([("count", "*")], ["nope"], "nope")):
+        assert not rows(core.aggregate, "agg_invalid", items, None, group_by)
+        assert message in capsys.readouterr().out
+    core.drop_table("agg_invalid")
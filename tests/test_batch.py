@@ -0,0 +1,61 @@
+import os
+import subprocess
+import sys
+
+from conftest import SRC_DIR
+
+from primitive_db.utils import load_table_data
+
+
+def _project(workdir, *args, stdin=""):
+    "запуск python -m primitive_db.main в пакетном режиме"
+    return subprocess.run(
+        [sys.executable, "-m", "primitive_db.main", *args], input=stdin,
+        cwd=workdir, env=dict(os.environ, PYTHONPATH=SRC_DIR),
+        capture_output=True, text=True)
+
+def test_exit_code_reports_failed_commands(workdir, tmp_path):
+    script = tmp_path / "script.sql"
+    script.write_text("# таблица для пакета\n"
+                      "create_table batch_ok value:int\n\n"
+                      "-- две записи\n"
+                      "insert into batch_ok values 1\n"
+                      "insert into batch_ok values 2\n"
+                      "exit\n"
+                      "insert into batch_ok values 3\n", encoding="utf-8")
+    assert _project(workdir, "-f", str(script)).returncode == 0
+    assert load_table_data("batch_ok")["rows"] == [(1, 1), (2, 2)]
+
+    # ошибка не останавливает пакет, но код выхода - 1
+    result = _project(workdir, stdin="insert into batch_ok values x\n"
+                                     "insert into batch_ok values 4\n")
+    assert result.returncode == 1
+    assert load_table_data("batch_ok")["rows"] == [(1, 1), (2, 2), (3, 4)]
+
+    result = _project(workdir, "--stop-on-error",
+                      stdin="insert into nope values 1\n"
+                            "insert into batch_ok values 5\n")
+    assert result.returncode == 1
+    assert "остановлено на строке 1" in result.stdout
+    assert len(load_table_data("batch_ok")["rows"]) == 3
+    assert _project(workdir, "--yes", "-c", "drop_table batch_ok").returncode == 0
+
+def test_confirmations_need_yes(workdir):
+    assert _project(workdir, "-c", "create_table batch_kept value:int") \
+        .returncode == 0
+    result = _project(workdir, "-c", "drop_table batch_kept")
+    assert result.returncode == 1
+    assert "запустите с флагом --yes" in result.stdout
+    assert load_table_data("batch_kept")["columns"]
+
+    assert _project(workdir, "--yes", stdin="drop_table batch_kept\n") \
+        .returncode == 0
+    assert load_table_data("batch_kept") == {}
+
+def test_unfinished_transaction_is_rolled_back(workdir):
+    result = _project(workdir, stdin="create_table batch_txn value:int\n"
+                                     "begin\n"
+                                     "insert into batch_txn values 1\n")
+    assert "не была завершена командой commit" in result.stdout
+    assert load_table_data("batch_txn")["rows"] == []
+    _project(workdir, "--yes", "-c", "drop_table batch_txn")
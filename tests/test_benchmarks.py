@@ -0,0 +1,40 @@
+import json
+import os
+import subprocess
+import sys
+
+from conftest import SRC_DIR
+
+BENCHMARKS = os.path.join(os.path.dirname(SRC_DIR), "benchmarks")
+OPERATIONS = ["insert", "select_full", "select_filtered", "select_id_range",
+              "update", "delete"]
+
+
+def _script(name, *args):
+    return subprocess.run([sys.executable, os.path.join(BENCHMARKS, name), *args],
+                          capture_output=True, text=True)
+
+def test_crud_results_compare(tmp_path):
+    old = tmp_path / "old.json"
+    result = _script("bench_crud.py", "--sizes", "200", "--output", str(old))
+    assert result.returncode == 0, result.stderr
+    report = json.loads(old.read_text(encoding="utf-8"))
+    assert report["benchmark"] == "crud"
+    operations = report["results"]["200"]
+    assert operations["bulk_load"]["rows"] == 200
+    for operation in OPERATIONS:
+        assert operations[operation]["ops"] > 0
+        assert operations[operation]["p99_ms"] >= operations[operation]["p50_ms"]
+
+    assert _script("compare.py", str(old), str(old)).returncode == 0
+
+    # замедление одной операции больше порога - регрессия
+    operations["update"]["p50_ms"] *= 3
+    new = tmp_path / "new.json"
+    new.write_text(json.dumps(report), encoding="utf-8")
+    result = _script("compare.py", str(old), str(new))
+    assert result.returncode == 1
+    assert [line.split()[0] for line in result.stdout.splitlines()
+            if "регрессия" in line] == ["update"]
+    assert _script("compare.py", str(old), str(new), "--threshold", "4") \
+        .returncode == 0
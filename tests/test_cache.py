@@ -0,0 +1,51 @@
+from primitive_db import core
+from primitive_db.decorators import create_cacher
+
+
+def test_least_recently_used_results_are_evicted():
+    cache = create_cacher(max_entries=2, max_rows=10)
+    cache.put("a", "first", "1")
+    cache.put("a", "second", "2")
+    assert cache.get("a", "first") == "1"
+    cache.put("b", "third", "3")
+    # вытеснен second: к first обращались позже
+    assert cache.get("a", "second") is None
+    assert cache.get("a", "first") == "1" and cache.get("b", "third") == "3"
+
+    # предел по строкам: большой результат вытесняет старые
+    cache.put("b", "big", "4", size=9)
+    assert not cache.contains("a", "first") and cache.contains("b", "third")
+    assert cache.stats()["rows"] == 10 and cache.stats()["evictions"] == 2
+    # результат больше всего кеша не сохраняется
+    cache.put("b", "huge", "5", size=11)
+    assert not cache.contains("b", "huge") and cache.contains("b", "big")
+
+def test_invalidation_is_per_table():
+    cache = create_cacher()
+    cache.put("a", "one", "1", size=2)
+    cache.put("a", "two", "2", size=3)
+    cache.put("b", "one", "3", size=4)
+    cache.invalidate("a")
+    assert cache.stats()["entries"] == 1 and cache.stats()["rows"] == 4
+    assert cache.get("b", "one") == "3"
+    cache.invalidate()
+    assert cache.stats()["entries"] == 0 and cache.stats()["rows"] == 0
+
+def test_changes_invalidate_only_their_table(rows):
+    core.create_table("cached_a", [("value", "int")])
+    core.create_table("cached_b", [("value", "int")])
+    core.insert("cached_a", [1])
+    core.insert("cached_b", [2])
+    core.select_cacher.invalidate()
+    rows(core.select, "cached_a")
+    rows(core.select, "cached_b")
+    assert core.select_cacher.stats()["entries"] == 2
+
+    core.insert("cached_a", [3])
+    assert core.select_cacher.stats()["entries"] == 1
+    hits = core.select_cacher.stats()["hits"]
+    assert rows(core.select, "cached_b") == [(1, 2)]
+    assert core.select_cacher.stats()["hits"] == hits + 1
+    assert rows(core.select, "cached_a") == [(1, 1), (2, 3)]
+    core.drop_table("cached_a")
+    core.drop_table("cached_b")
@@ -0,0 +1,36 @@
+import pytest
+
+from primitive_db import core
+from primitive_db.utils import STORAGE_BACKENDS
+
+
+@pytest.mark.parametrize("storage", STORAGE_BACKENDS)
+def test_select_sees_insert_from_other_process(storage, rows, project):
+    table = f"shared_{storage}"
+    core.create_table(table, [("value", "int")], storage)
+    core.insert(table, [1])
+    assert rows(core.select, table) == [(1, 1)]
+    assert rows(core.aggregate, table, [("count", "*")]) == [(1,)]
+
+    # вторые запросы отвечают из кеша, пока таблицу не изменили
+    assert rows(core.select, table) == [(1, 1)]
+    project(f"insert into {table} values (2)")
+
+    assert rows(core.select, table) == [(1, 1), (2, 2)]
+    assert rows(core.aggregate, table, [("count", "*")]) == [(2,)]
+    assert rows(core.select, table, {"value": 2}) == [(2, 2)]
+    core.drop_table(table)
+
+def test_reload_drops_cached_results(rows, project):
+    core.create_table("reloaded", [("value", "int")])
+    core.insert("reloaded", [1])
+    core.select_cacher.invalidate()
+    assert rows(core.select, "reloaded") == [(1, 1)]
+    assert core.select_cacher.stats()["entries"] == 1
+    project("update reloaded set value = 5 where ID = 1")
+
+    # любое чтение через каталог перечитывает таблицу и сбрасывает её результаты
+    assert list(core.iter_rows("reloaded")) == [(1, 5)]
+    assert core.select_cacher.stats()["entries"] == 0
+    assert rows(core.select, "reloaded") == [(1, 5)]
+    core.drop_table("reloaded")
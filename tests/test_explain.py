@@ -0,0 +1,70 @@
+import pstats
+
+from primitive_db import core
+from primitive_db.engine import execute
+from primitive_db.utils import load_table_data
+
+
+def _plan(capsys, command):
+    "строки плана explain без заголовка"
+    assert execute(f"explain {command}")
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].startswith("План ")
+    return [line.strip() for line in lines[1:]]
+
+def test_explain_shows_plan_without_running(capsys):
+    core.create_table("planned", [("name", "str"), ("age", "int")])
+    core.insert_many("planned", [[f"u{i}", i % 10] for i in range(30)])
+    capsys.readouterr()
+
+    assert _plan(capsys, "select * from planned where age = 3 limit 2") == [
+        "условие: age = 3", "кеш: результата в кеше нет",
+        "доступ: полный проход по planned: 30 строк",
+        "выдача: не больше 2 строк, пропустив первые 0"]
+    core.create_index("planned", "age")
+    capsys.readouterr()
+    plan = _plan(capsys, "select * from planned where age = 3 order by name")
+    assert "доступ: индекс или диапазон ID в planned: кандидатов 3 из 30" in plan
+    assert plan[-1].startswith("порядок: сортировка name по возрастанию")
+    assert "порядок: по индексу, без сортировки" in \
+        _plan(capsys, "select * from planned order by age desc")
+
+    assert _plan(capsys, "delete from planned where ID between 5 and 9") == [
+        "условие: ID between 5 and 9",
+        "доступ: индекс или диапазон ID в planned: кандидатов 5 из 30",
+        "изменение: удаление строк", "журнал: запись в planned.log",
+        "индексы: age"]
+    assert len(load_table_data("planned")["rows"]) == 30
+
+    # результат в кеше - таблица не читается
+    assert execute("select * from planned where age = 3 limit 2")
+    capsys.readouterr()
+    assert _plan(capsys, "select * from planned where age = 3 limit 2")[-1] == \
+        "кеш: результат уже в кеше, таблица не читается"
+    assert not execute("explain begin")
+    core.drop_table("planned")
+
+def test_profile_reports_path_and_phases(capsys, tmp_path):
+    core.create_table("profiled", [("age", "int")])
+    core.insert_many("profiled", [[i % 10] for i in range(30)])
+    core.create_index("profiled", "age")
+    core.select_cacher.invalidate()
+    capsys.readouterr()
+
+    assert execute("profile select * from profiled where age = 3")
+    out = capsys.readouterr().out
+    assert "успешно" in out
+    assert "План: индекс или диапазон ID." in out
+    assert "Просмотрено строк 3, выдано строк 3" in out
+    assert "select.filter" in out
+
+    dump = tmp_path / "select.prof"
+    assert execute(f"profile dump {dump} select * from profiled")
+    out = capsys.readouterr().out
+    assert "План: полный проход." in out
+    assert "python -m pstats" in out
+    assert pstats.Stats(str(dump)).total_calls > 0
+
+    assert not execute("profile select * from profiled where nope = 1")
+    assert "с ошибкой" in capsys.readouterr().out
+    core.drop_table("profiled")
@@ -0,0 +1,51 @@
+from primitive_db import core, utils
+
+COLUMNS = [("name", "str"), ("age", "int"), ("active", "bool")]
+
+
+def test_insert_many_is_all_or_nothing(rows):
+    core.create_table("bulk", COLUMNS)
+    assert not core.insert_many("bulk", [["ann", 20, True], ["bob", "30", False]])
+    assert rows(core.select, "bulk") == []
+
+    assert core.insert_many("bulk", [["ann", 20, True], ["bob", 30, False]])
+    assert core.insert_many("bulk", [["eve", 40, True]])
+    assert rows(core.select, "bulk") == [(1, "ann", 20, True), (2, "bob", 30, False),
+                                         (3, "eve", 40, True)]
+    # пачка сохраняется одной записью журнала
+    assert [(record["op"], len(record["rows"]))
+            for record in utils.read_log("bulk")] == [("insert_many", 2),
+                                                      ("insert_many", 1)]
+    core.drop_table("bulk")
+
+def test_import_csv_and_jsonl(rows, tmp_path):
+    core.create_table("imported", COLUMNS)
+    csv_file = tmp_path / "people.csv"
+    csv_file.write_text("name,age,active\nann,20,true\n\n\"b, c\",-5,FALSE\n",
+                        encoding="utf-8")
+    jsonl_file = tmp_path / "people.jsonl"
+    jsonl_file.write_text('{"active": true, "age": 7, "name": "dan"}\n'
+                          '["eve", 8, false]\n', encoding="utf-8")
+
+    assert core.import_rows("imported", str(csv_file))
+    assert core.import_rows("imported", str(jsonl_file))
+    assert rows(core.select, "imported") == [
+        (1, "ann", 20, True), (2, "b, c", -5, False), (3, "dan", 7, True),
+        (4, "eve", 8, False)]
+    core.drop_table("imported")
+
+def test_import_keeps_batches_before_error(rows, tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(core, "IMPORT_BATCH_SIZE", 2)
+    core.create_table("partial", [("value", "int")])
+    path = tmp_path / "values.csv"
+    path.write_text("1\n2\n3\nx\n5\n", encoding="utf-8")
+
+    assert core.import_rows("partial", str(path))
+    assert "строка 4: значение 'x' должно быть типом 'int'" in capsys.readouterr().out
+    # третья строка ждала своей пачки и не сохранилась
+    assert rows(core.select, "partial") == [(1, 1), (2, 2)]
+
+    path = tmp_path / "values.txt"
+    path.write_text("1\n", encoding="utf-8")
+    assert not core.import_rows("partial", str(path))
+    core.drop_table("partial")
@@ -0,0 +1,138 @@
+import json
+
+from primitive_db import core, metrics
+from primitive_db.indexes import (
+    INDEX_FORMAT,
+    _catch_up,
+    forget_indexes,
+    load_indexes,
+)
+from primitive_db.query import plan_where
+from primitive_db.utils import index_path
+
+CODES = ["007", "7", "10", "9", "abc", "07", "100"]
+
+
+def _codes_table(name):
+    core.create_table(name, [("code", "str"), ("n", "int")])
+    core.insert_many(name, [[code, i] for i, code in enumerate(CODES)])
+    core.create_index(name, "code")
+    core.create_index(name, "n")
+
+def test_str_index_keeps_digit_strings_as_str(rows):
+    _codes_table("codes")
+    metadata = core.get_table("codes")
+    index = load_indexes("codes", metadata)["code"]
+    assert index.find("007") == [1] and index.find("7") == [2]
+    assert index.find(7) == []
+
+    # диапазон по str идёт по индексу и сравнивает строки как строки
+    where = ("between", "code", "07", "10")
+    assert plan_where("codes", metadata, where) is not None
+    expected = [(i + 1, code, i) for i, code in enumerate(CODES)
+                if "07" <= code <= "10"]
+    assert rows(core.select, "codes", where) == expected
+    assert rows(core.select, "codes", ("cmp", ">", "code", "7")) == \
+        [(i + 1, code, i) for i, code in enumerate(CODES) if code > "7"]
+    core.drop_table("codes")
+
+def test_str_order_by_uses_index(rows):
+    _codes_table("ordered")
+    metadata = core.get_table("ordered")
+    assert core._order_strategy("ordered", metadata, None, "code") == "index"
+    for descending in (False, True):
+        expected = sorted(((i + 1, code, i) for i, code in enumerate(CODES)),
+                          key=lambda row: row[1], reverse=descending)
+        assert rows(core.select, "ordered", None, None, 0,
+                    ("code", descending)) == expected
+    core.drop_table("ordered")
+
+def test_merge_join_on_str_keys(rows):
+    _codes_table("left_codes")
+    core.create_table("right_codes", [("code", "str")])
+    core.insert_many("right_codes", [["7"], ["007"], ["7"], ["x"]])
+    core.create_index("right_codes", "code")
+    sides = [(name, core.get_table(name)) for name in ("left_codes", "right_codes")]
+    assert core._merge_joinable(sides, [1, 1])
+
+    joined = rows(core.join, "left_codes", "right_codes",
+                  ("left_codes.code", "right_codes.code"))
+    assert sorted(joined) == [(1, "007", 0, 2, "007"), (2, "7", 1, 1, "7"),
+                              (2, "7", 1, 3, "7")]
+    core.drop_table("left_codes")
+    core.drop_table("right_codes")
+
+def test_index_follows_update_and_delete(rows):
+    _codes_table("changed")
+    core.update("changed", {"code": "7"}, ("cmp", "=", "code", "abc"))
+    core.delete("changed", ("cmp", "=", "n", 1))
+    core.update("changed", {"n": "50"}, ("cmp", "=", "code", "10"))
+    index = load_indexes("changed", core.get_table("changed"))
+    assert index["code"].find("7") == [5]
+    assert index["code"].find("abc") == []
+    assert index["n"].find(50) == [3] and index["n"].find(2) == []
+    assert rows(core.select, "changed", ("cmp", "=", "code", "7")) == [(5, "7", 4)]
+    assert rows(core.select, "changed", ("between", "n", 40, 60)) == \
+        [(3, "10", 50)]
+    core.drop_table("changed")
+
+def test_index_catches_up_with_other_process(rows, project):
+    _codes_table("caught")
+    project("insert into caught values \"8\" 20")
+    project("update caught set code = \"z\" where ID = 1")
+    project("delete from caught where n = 1")
+
+    metadata = core.get_table("caught")
+    forget_indexes("caught")
+    with open(index_path("caught"), "rb") as file:
+        stored = json.loads(file.read())
+    assert stored["format"] == INDEX_FORMAT
+    # индекс дочитывается по журналу, а не перестраивается по строкам
+    assert len(_catch_up("caught", stored, metadata["seq"])) == 3
+    index = load_indexes("caught", metadata)["code"]
+    assert index.find("8") == [8] and index.find("z") == [1]
+    assert index.find("007") == [] and index.find("7") == []
+    assert rows(core.select, "caught", ("cmp", "=", "code", "8")) == [(8, "8", 20)]
+    core.drop_table("caught")
+
+def test_old_index_format_is_rebuilt(rows):
+    _codes_table("legacy")
+    metadata = core.get_table("legacy")
+    # файл старого формата: строки из цифр лежат числами
+    legacy = {"seq": metadata["seq"],
+              "columns": {"code": [[7, 1], [7, 2]], "n": []}}
+    with open(index_path("legacy"), "w", encoding="utf-8") as file:
+        json.dump(legacy, file)
+    forget_indexes("legacy")
+    index = load_indexes("legacy", metadata)
+    assert index["code"].find("007") == [1] and index["code"].find(7) == []
+    assert index["n"].find(3) == [4]
+    core.drop_table("legacy")
+
+def _counters():
+    return metrics.snapshot()["counters"]
+
+def test_lookups_examine_only_indexed_rows(rows):
+    core.create_table("looked_up", [("n", "int")])
+    core.insert_many("looked_up", [[i % 50] for i in range(1000)])
+    core.create_index("looked_up", "n")
+    for where, found in ((("cmp", "=", "n", 7), 20),
+                         (("in", "n", [1, 2, 99]), 40),
+                         (("between", "n", 10, 12), 60)):
+        core.select_cacher.invalidate()
+        before = _counters()
+        assert len(rows(core.select, "looked_up", where)) == found
+        after = _counters()
+        assert after["scan.index"] == before.get("scan.index", 0) + 1
+        assert after["rows.examined"] == before.get("rows.examined", 0) + found
+
+    # изменения находят строки тем же индексом
+    before = _counters()
+    core.update("looked_up", {"n": "100"}, ("cmp", "=", "n", 7))
+    core.delete("looked_up", ("in", "n", [8, 100]))
+    after = _counters()
+    assert after["scan.index"] == before["scan.index"] + 2
+    assert after.get("scan.full", 0) == before.get("scan.full", 0)
+    assert rows(core.select, "looked_up", ("in", "n", [7, 8, 100])) == []
+    assert len(rows(core.select, "looked_up")) == 960
+    core.drop_table("looked_up")
@@ -0,0 +1,81 @@
+import random
+
+from primitive_db import core, metrics
+from primitive_db.parser import parse_crud
+
+
+def _counter(name):
+    return metrics.snapshot()["counters"].get(name, 0)
+
+def _tables(rng):
+    core.create_table("j_users", [("city", "str"), ("age", "int")])
+    core.create_table("j_orders", [("user_id", "int"), ("total", "int")])
+    core.insert_many("j_users", [[rng.choice("abc"), rng.randrange(50)]
+                                 for _ in range(40)])
+    # у части заказов нет пользователя, у части пользователей - заказов
+    core.insert_many("j_orders", [[rng.randrange(1, 60), total]
+                                  for total in rng.sample(range(1000), 120)])
+
+def _expected(where=lambda user, order: True):
+    users = list(core.iter_rows("j_users"))
+    orders = list(core.iter_rows("j_orders"))
+    return sorted(user + order for user in users for order in orders
+                  if user[0] == order[1] and where(user, order))
+
+def test_hash_and_merge_join_agree(rows):
+    _tables(random.Random(3))
+    on = ("j_users.ID", "j_orders.user_id")
+    where = ("and", ("cmp", ">", "age", 10),
+             ("or", ("cmp", "<", "total", 500), ("cmp", "=", "city", "a")))
+    expected = _expected(lambda user, order: user[2] > 10
+                         and (order[2] < 500 or user[1] == "a"))
+    everything = _expected()
+
+    # без индекса по user_id - хеширование, с индексом - слияние
+    for strategy in ("hash", "merge"):
+        before = _counter(f"join.{strategy}")
+        assert sorted(rows(core.join, "j_users", "j_orders", on)) == everything
+        assert sorted(rows(core.join, "j_users", "j_orders", on, None, where)) \
+            == expected
+        # ключи в on можно перечислить в любом порядке
+        assert sorted(rows(core.join, "j_orders", "j_users",
+                           ("user_id", "j_users.ID"), None, where)) == \
+            sorted(row[3:] + row[:3] for row in expected)
+        assert _counter(f"join.{strategy}") == before + 3
+        core.create_index("j_orders", "user_id")
+
+    # слияние выдаёт строки по возрастанию ключа
+    merged = rows(core.join, "j_users", "j_orders", on)
+    assert [row[0] for row in merged] == sorted(row[0] for row in merged)
+    core.drop_table("j_users")
+    core.drop_table("j_orders")
+
+def test_join_columns_order_and_paging(rows):
+    _tables(random.Random(4))
+    expected = sorted(((row[1], row[5]) for row in _expected()),
+                      key=lambda pair: pair[1], reverse=True)
+    assert rows(parse_crud, "select city, total from j_users join j_orders "
+                            "on j_users.ID = user_id order by total desc "
+                            "limit 5 offset 2") == expected[2:7]
+    # хеширование выдаёт строки в порядке большей таблицы - заказов
+    assert rows(core.join, "j_users", "j_orders", ("j_users.ID", "user_id"),
+                ["j_orders.ID", "age"], ("cmp", "<", "total", 500), 3) == \
+        sorted((row[3], row[2]) for row in _expected() if row[5] < 500)[:3]
+    core.drop_table("j_users")
+    core.drop_table("j_orders")
+
+def test_invalid_joins_are_rejected(rows, capsys):
+    core.create_table("j_left", [("code", "str")])
+    core.create_table("j_right", [("code", "int")])
+    for args, message in (
+            (("j_left", "j_left", ("ID", "ID")), "с самой собой"),
+            (("j_left", "j_right", ("j_left.code", "j_right.code")),
+             "разных типов (str и int)"),
+            (("j_left", "j_right", ("code", "j_right.ID")), "есть в обеих таблицах"),
+            (("j_left", "j_right", ("j_left.ID", "j_left.code")),
+             "столбцы обеих таблиц"),
+            (("j_left", "j_nope", ("ID", "ID")), "j_nope не существует")):
+        assert not rows(core.join, *args)
+        assert message in capsys.readouterr().out
+    core.drop_table("j_left")
+    core.drop_table("j_right")
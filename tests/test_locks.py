@@ -0,0 +1,78 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+from conftest import SRC_DIR
+
+from primitive_db import core, utils
+from primitive_db.catalog import forget
+from primitive_db.utils import DATA_DIR, load_table_data, table_lock
+
+# сколько ждать, чтобы убедиться, что процесс стоит на блокировке
+BLOCKED_FOR = 0.3
+
+
+class Crash(Exception):
+    "сбой процесса, подставленный в середину фиксации"
+
+
+def test_reading_missing_table_writes_nothing(rows):
+    core.create_table("present", [("value", "int")])
+    before = sorted(os.listdir(DATA_DIR))
+    assert rows(core.select, "nope") == []
+    assert rows(core.select, "nope", ("cmp", "=", "value", 1)) == []
+    assert rows(core.aggregate, "nope", [("count", "*")]) == []
+    core.explain("select", ("nope", None, None, 0, None))
+    assert sorted(os.listdir(DATA_DIR)) == before
+    core.drop_table("present")
+
+def test_writer_waits_for_lock_of_other_process(workdir):
+    core.create_table("guarded", [("value", "int")])
+    with table_lock("guarded", shared=True):
+        # вложенный захват того же процесса не ждёт, даже на запись
+        with table_lock("guarded"):
+            core.insert("guarded", [1])
+        process = subprocess.Popen(
+            [sys.executable, "-m", "primitive_db.main", "--yes", "-c",
+             "insert into guarded values 2"],
+            cwd=workdir, env=dict(os.environ, PYTHONPATH=SRC_DIR),
+            stdout=subprocess.DEVNULL)
+        time.sleep(BLOCKED_FOR)
+        assert process.poll() is None
+    assert process.wait(10) == 0
+    assert load_table_data("guarded")["rows"] == [(1, 1), (2, 2)]
+    core.drop_table("guarded")
+
+def test_interrupted_commit_is_recovered(monkeypatch):
+    for name in ("txn_a", "txn_b"):
+        core.create_table(name, [("value", "int")])
+    persist_records = core.persist_records
+
+    def crash_on_second(table_name, data, records):
+        if table_name == "txn_b":
+            raise Crash(table_name)
+        return persist_records(table_name, data, records)
+
+    core.begin()
+    core.insert("txn_a", [1])
+    core.insert("txn_b", [2])
+    core.insert("txn_a", [3])
+    # журнал txn_a уже дописан, txn_b - нет, файл намерения остался
+    monkeypatch.setattr(core, "persist_records", crash_on_second)
+    assert not core.commit()
+    monkeypatch.undo()
+    (intent,) = [name for name in os.listdir(DATA_DIR) if name.endswith(".txn")]
+    with open(os.path.join(DATA_DIR, intent), "rb") as file:
+        assert sorted(json.loads(file.read())) == ["txn_a", "txn_b"]
+    assert load_table_data("txn_b")["rows"] == []
+
+    # первое чтение дописывает недостающее и не повторяет записанное
+    assert list(core.iter_rows("txn_b")) == [(1, 2)]
+    assert not any(name.endswith(".txn") for name in os.listdir(DATA_DIR))
+    forget("txn_a")
+    assert list(core.iter_rows("txn_a")) == [(1, 1), (2, 3)]
+    assert len(list(utils.read_log("txn_a"))) == 2
+    for name in ("txn_a", "txn_b"):
+        core.drop_table(name)
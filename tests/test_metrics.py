@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+from primitive_db import core, metrics
+from primitive_db.engine import execute
+
+
+@pytest.fixture
+def clean_metrics():
+    "метрики с нуля; вывод в консоль выключается после теста"
+    metrics.reset()
+    yield
+    metrics.set_console(False)
+    metrics.reset()
+
+def test_histogram_quantiles(clean_metrics):
+    for ms in [0.05] * 98 + [3, 700]:
+        metrics.observe("op", ms / 1000)
+    metrics.count("hits")
+    metrics.count("hits", 2)
+    stats = metrics.snapshot()
+    assert stats["counters"] == {"hits": 3}
+    timing = stats["timings"]["op"]
+    assert timing["count"] == 100 and timing["max_ms"] == 700
+    assert timing["p50_ms"] == 0.1 and timing["p99_ms"] == 5
+    assert timing["buckets"]["0.1"] == 98 and timing["buckets"]["1000"] == 1
+
+def test_operations_record_phases(clean_metrics, rows, capsys):
+    core.create_table("measured", [("value", "int")])
+    core.insert("measured", [1])
+    core.select_cacher.invalidate()
+    rows(core.select, "measured", ("cmp", "=", "value", 1))
+    stats = metrics.snapshot()
+    assert stats["counters"]["select.calls"] == 1
+    assert stats["counters"]["insert.calls"] == 1
+    assert {"select", "select.filter", "select.render", "insert.save"} \
+        <= set(stats["timings"])
+    # без вывода в консоль время не печатается
+    assert "выполнилась" not in capsys.readouterr().out
+
+    metrics.set_console(True)
+    core.insert("measured", [2])
+    assert "Функция insert выполнилась за" in capsys.readouterr().out
+    core.drop_table("measured")
+
+def test_stats_commands(clean_metrics, tmp_path, capsys):
+    core.create_table("reported", [("value", "int")])
+    path = tmp_path / "stats.json"
+    assert execute(f"stats json {path}")
+    stats = json.loads(path.read_text(encoding="utf-8"))
+    assert stats["counters"]["create_table.calls"] == 1
+    assert set(stats["cache"]) >= {"entries", "rows", "hits", "misses"}
+
+    assert execute("stats reset")
+    assert metrics.snapshot() == {"counters": {}, "timings": {}}
+    capsys.readouterr()
+    assert execute("stats")
+    assert "Метрик пока нет." in capsys.readouterr().out
+    core.drop_table("reported")
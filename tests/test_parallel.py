@@ -0,0 +1,31 @@
+from primitive_db import core, metrics, parallel
+
+
+def _pool_starts():
+    return metrics.snapshot()["counters"].get("parallel.pool_starts", 0)
+
+def test_parallel_scan_reuses_pool_until_table_changes(rows, monkeypatch):
+    monkeypatch.setattr(core, "PARALLEL_WORKERS", 2)
+    monkeypatch.setattr(core, "PARALLEL_SCAN_THRESHOLD", 100)
+    core.set_scan_engine("python")
+    core.create_table("scanned", [("value", "int")])
+    core.insert_many("scanned", [[i % 10] for i in range(1000)])
+    try:
+        where = ("cmp", "=", "value", 3)
+        expected = [(i + 1, 3) for i in range(1000) if i % 10 == 3]
+        starts = _pool_starts()
+        assert rows(core.select, "scanned", where) == expected
+        core.select_cacher.invalidate()
+        assert rows(core.select, "scanned", where) == expected
+        assert _pool_starts() == starts + 1
+
+        # процессы видят строки на момент запуска: после изменения пул новый
+        core.update("scanned", {"value": "3"}, ("cmp", "=", "ID", 1))
+        assert rows(core.select, "scanned", where) == [(1, 3)] + expected
+        assert _pool_starts() == starts + 2
+        core.delete("scanned", ("cmp", "=", "value", 3))
+        assert rows(core.select, "scanned", where) == []
+    finally:
+        parallel.close_pool()
+        core.set_scan_engine("auto")
+        core.drop_table("scanned")
@@ -0,0 +1,60 @@
+import pytest
+
+from primitive_db import core, metrics, parser
+from primitive_db.parser import parse_crud, parse_statement, prepare, tokenize
+
+
+def _counters():
+    counters = metrics.snapshot()["counters"]
+    return counters.get("statements.hits", 0), counters.get("statements.misses", 0)
+
+def test_commands_of_one_shape_share_template():
+    hits, misses = _counters()
+    first = parse_statement("insert into parsed values 'a b' 5 true")
+    second = parse_statement('insert into parsed values "c" -7 true')
+    assert first.args == ("parsed", ["a b", 5, True])
+    assert second.args == ("parsed", ["c", -7, True])
+    assert _counters() == (hits + 1, misses + 1)
+
+    first = parse_statement("select * from parsed where age > 5 and name = 'x'")
+    second = parse_statement("select * from parsed where age > 70 and name = 'y'")
+    assert second.args[1] == ("and", ("cmp", ">", "age", "70"),
+                              ("cmp", "=", "name", "y"))
+    # limit и offset входят в форму команды
+    parse_statement("select * from parsed limit 3")
+    assert parse_statement("select * from parsed limit 4").args[2] == 4
+    assert _counters() == (hits + 2, misses + 4)
+
+def test_template_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(parser, "STATEMENT_CACHE_SIZE", 2)
+    monkeypatch.setattr(parser, "_templates", type(parser._templates)())
+    for column in ("a", "b", "a", "c"):
+        parse_statement(f"select * from parsed where {column} = 1")
+    # b вытеснен: к a обращались позже
+    assert [shape[-3] for shape in parser._templates] == [("word", "a"),
+                                                          ("word", "c")]
+
+def test_prepared_statement_binds_values_as_is(rows, capsys):
+    core.create_table("prepared", [("name", "str"), ("age", "int")])
+    add = prepare("insert into prepared values ? ?")
+    assert add.placeholders == [0, 1]
+    add.execute("x' or '1", 20)
+    add.execute("5", 30)
+    find = prepare("select * from prepared where name = ? limit ?")
+    assert rows(find.execute, "x' or '1", 10) == [(1, "x' or '1", 20)]
+    # значение подставляется строкой, а не разбирается как число
+    assert rows(find.execute, "5", 10) == [(2, "5", 30)]
+    with pytest.raises(ValueError, match="ожидалось значений: 2"):
+        find.bind("x")
+
+    # вне prepare место '?' - ошибка
+    assert not parse_crud("select * from prepared where name = ?")
+    assert "только в подготовленную команду" in capsys.readouterr().out
+    core.drop_table("prepared")
+
+def test_tokenizer_rejects_stray_characters():
+    assert tokenize("select * from t where a <> 'x y'") == [
+        ("word", "select"), ("punct", "*"), ("word", "from"), ("word", "t"),
+        ("word", "where"), ("word", "a"), ("op", "!="), ("str", "x y")]
+    with pytest.raises(ValueError, match="непонятный символ .*'!from t'"):
+        tokenize("select * !from t")
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from primitive_db import core, utils
+from primitive_db.catalog import forget
+from primitive_db.query import typed_value
+from primitive_db.utils import table_path
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("5", 5), ("-5", -5), ("007", 7), (12, 12),
+])
+def test_typed_value_int(value, expected):
+    assert typed_value("int", value) == expected
+
+@pytest.mark.parametrize("value", ["--5", "-", "", "5-", "-+5", "1.5", "²", "abc"])
+def test_typed_value_rejects_malformed_int(value):
+    with pytest.raises(ValueError, match="должно быть типом 'int'"):
+        typed_value("int", value)
+
+def test_rows_are_typed_tuples(rows, capsys):
+    core.create_table("typed", [("name", "str"), ("age", "int"), ("ok", "bool")])
+    core.insert("typed", ["007", 7, True])
+    core.insert_many("typed", [["x", 8, False]])
+    assert core.get_table("typed")["rows"] == [(1, "007", 7, True),
+                                               (2, "x", 8, False)]
+    assert [type(value) for value in core.get_table("typed")["rows"][0]] == \
+        [int, str, int, bool]
+    # значения условий и set приводятся к типу столбца один раз
+    assert rows(core.select, "typed", {"ID": "2"}) == [(2, "x", 8, False)]
+    assert rows(core.select, "typed", ("cmp", "=", "ok", "TRUE")) == \
+        [(1, "007", 7, True)]
+    core.update("typed", {"age": "70"}, ("cmp", "=", "name", "007"))
+    assert core.get_table("typed")["rows"][0] == (1, "007", 70, True)
+    assert [record.get("row") or record.get("rows") or record["ids"]
+            for record in utils.read_log("typed")] == \
+        [[1, "007", 7, True], [[2, "x", 8, False]], [1]]
+
+    assert not core.update("typed", {"age": "old"}, ("cmp", "=", "ID", 1))
+    assert "должно быть типом 'int'" in capsys.readouterr().out
+    assert core.get_table("typed")["rows"][0] == (1, "007", 70, True)
+    core.drop_table("typed")
+
+def test_string_ids_are_migrated_on_load():
+    core.create_table("legacy_ids", [("value", "int")])
+    # снимок и журнал, записанные до перехода на целые ID
+    with open(table_path("legacy_ids"), "w", encoding="utf-8") as file:
+        json.dump({"columns": [["ID", "int"], ["value", "int"]],
+                   "rows": [["1", 10], ["2", 20]], "next_id": 3}, file)
+    with open(utils.log_path("legacy_ids"), "w", encoding="utf-8") as file:
+        for record in ({"op": "insert", "row": ["3", 30], "seq": 1},
+                       {"op": "update", "ids": ["1"], "col": 1, "value": 11,
+                        "seq": 2},
+                       {"op": "delete", "ids": ["2"], "seq": 3}):
+            file.write(json.dumps(record) + "\n")
+    forget("legacy_ids")
+
+    assert list(core.iter_rows("legacy_ids")) == [(1, 11), (3, 30)]
+    core.insert("legacy_ids", [40])
+    utils.compact_table("legacy_ids")
+    assert utils.load_table_meta("legacy_ids")["rows"] == [[1, 11], [3, 30],
+                                                           [4, 40]]
+    core.drop_table("legacy_ids")
@@ -0,0 +1,89 @@
+from primitive_db import core, metrics
+from primitive_db.parser import parse_crud
+
+
+def _pages(function, *args):
+    "размеры страниц, которые вывела операция core"
+    sizes = []
+    core.set_page_sink(lambda field_names, page: sizes.append(len(page)))
+    try:
+        function(*args)
+    finally:
+        core.set_page_sink(None)
+    return sizes
+
+def test_limit_and_offset_page_through_rows(rows, monkeypatch):
+    monkeypatch.setattr(core, "SELECT_PAGE_SIZE", 4)
+    core.create_table("paged", [("value", "int")])
+    core.insert_many("paged", [[i % 3] for i in range(20)])
+    everything = [(i + 1, i % 3) for i in range(20)]
+
+    assert _pages(core.select, "paged") == [4, 4, 4, 4, 4]
+    assert _pages(core.select, "paged", None, 10, 3) == [4, 4, 2]
+    assert rows(core.select, "paged", None, 10, 3) == everything[3:13]
+    assert rows(core.select, "paged", None, 5, 18) == everything[18:]
+    assert rows(core.select, "paged", None, 0, 0) == []
+    where = ("cmp", "=", "value", 1)
+    matching = [row for row in everything if row[1] == 1]
+    assert rows(core.select, "paged", where, 2, 1) == matching[1:3]
+    assert list(core.iter_rows("paged", where, 2, 1)) == matching[1:3]
+    assert rows(parse_crud, "select * from paged where value = 1 limit 2 offset 1") \
+        == matching[1:3]
+    assert rows(parse_crud, "select * from paged offset 17") == everything[17:]
+    core.drop_table("paged")
+
+def test_rows_are_read_lazily():
+    core.create_table("lazy", [("value", "int")])
+    core.insert_many("lazy", [[i] for i in range(10)])
+    rows = core.iter_rows("lazy", ("cmp", ">", "value", 2))
+    assert next(rows) == (4, 3)
+    # строки, добавленные в таблицу в памяти, ещё не просмотрены
+    core.get_table("lazy")["rows"].append((11, 100))
+    assert list(rows)[-1] == (11, 100)
+    core.drop_table("lazy")
+
+def test_bad_paging_is_rejected(rows, capsys):
+    core.create_table("badly_paged", [("value", "int")])
+    for command in ("select * from badly_paged limit -1",
+                    "select * from badly_paged limit",
+                    "select * from badly_paged limit 1 sideways"):
+        assert not rows(parse_crud, command)
+        assert "Ошибка" in capsys.readouterr().out
+    core.drop_table("badly_paged")
+
+def test_large_results_are_not_cached(rows, monkeypatch):
+    monkeypatch.setattr(core, "SELECT_CACHE_MAX_ROWS", 5)
+    core.create_table("uncached", [("value", "int")])
+    core.insert_many("uncached", [[i] for i in range(10)])
+    core.select_cacher.invalidate()
+    rows(core.select, "uncached", None, 5)
+    assert core.select_cacher.stats()["entries"] == 1
+    rows(core.select, "uncached")
+    assert core.select_cacher.stats()["entries"] == 1
+    core.drop_table("uncached")
+
+def _spills():
+    return metrics.snapshot()["counters"].get("sort.spills", 0)
+
+def test_order_by_with_top_k_and_spills(rows, monkeypatch):
+    monkeypatch.setattr(core, "SORT_MEMORY_ROWS", 7)
+    core.create_table("sorted_rows", [("value", "int"), ("name", "str")])
+    core.insert_many("sorted_rows", [[(i * 7) % 5, f"n{i % 3}"] for i in range(50)])
+    everything = list(core.iter_rows("sorted_rows"))
+    where = ("cmp", "!=", "value", 2)
+
+    for column, position in (("value", 1), ("name", 2), ("ID", 0)):
+        for descending in (False, True):
+            # равные значения остаются в порядке ID
+            expected = sorted(everything, key=lambda row: row[position],
+                              reverse=descending)
+            order_by = (column, descending)
+            spills = _spills()
+            assert rows(core.select, "sorted_rows", None, None, 0, order_by) \
+                == expected
+            assert rows(core.select, "sorted_rows", where, 4, 3, order_by) == \
+                [row for row in expected if row[1] != 2][3:7]
+            # без limit строки больше SORT_MEMORY_ROWS сортируются кусками
+            assert _spills() - spills == (0 if column == "ID" else 8)
+            core.select_cacher.invalidate()
+    core.drop_table("sorted_rows")
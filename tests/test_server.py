@@ -0,0 +1,131 @@
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+from conftest import SRC_DIR
+
+from primitive_db.client import AsyncClient, Client
+
+# сколько ждать, чтобы убедиться, что команда стоит на блокировке
+BLOCKED_FOR = 0.3
+
+
+@pytest.fixture(scope="module")
+def server(workdir):
+    "сервер в отдельном процессе на unix сокете во временной папке"
+    path = os.path.join(workdir, "server.sock")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "primitive_db.main", "--serve", "--yes",
+         "--socket", path],
+        cwd=workdir, env=dict(os.environ, PYTHONPATH=SRC_DIR),
+        stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 10
+    while not os.path.exists(path):
+        assert process.poll() is None and time.monotonic() < deadline
+        time.sleep(0.05)
+    yield path
+    process.terminate()
+    process.wait()
+
+def _in_background(client, command, *params):
+    "выполняет команду в потоке; возвращает (поток, словарь с результатом)"
+    result = {}
+    thread = threading.Thread(
+        target=lambda: result.setdefault("result", client.execute(command, *params)))
+    thread.start()
+    return thread, result
+
+def _table(client, name):
+    assert client.execute(f"create_table {name} name:str age:int").ok
+    for values in ("'ann' 15", "'bob' 30"):
+        assert client.execute(f"insert into {name} values {values}").ok
+
+def test_reads_wait_for_open_transaction(server):
+    with Client(server) as a, Client(server) as b:
+        _table(a, "srv_people")
+        assert b.execute("begin").ok
+        assert b.execute("update srv_people set age = 40 where name = 'ann'").ok
+        thread, result = _in_background(a, "select * from srv_people where age > 20")
+        time.sleep(BLOCKED_FOR)
+        assert thread.is_alive()
+        assert b.execute("rollback").ok
+        thread.join(5)
+        assert result["result"].rows == [[2, "bob", 30]]
+
+        # вне транзакции чтения и изменения идут друг за другом
+        assert a.execute("update srv_people set age = 16 where ID = 1").ok
+        assert b.execute("select * from srv_people where ID = 1").rows == \
+            [[1, "ann", 16]]
+
+@pytest.mark.parametrize("prepared", [False, True])
+def test_create_view_locks_base_table(server, prepared):
+    table, view = f"srv_base_{prepared:d}", f"srv_adults_{prepared:d}"
+    with Client(server) as a, Client(server) as b:
+        _table(a, table)
+        assert b.execute("begin").ok
+        assert b.execute(f"update {table} set age = 40 where name = 'ann'").ok
+        if prepared:
+            thread, result = _in_background(
+                a, f"create view {view} as select * from {table} where age > ?", 18)
+        else:
+            thread, result = _in_background(
+                a, f"create view {view} as select * from {table} where age > 18")
+        # представление не строится по изменениям чужой открытой транзакции
+        time.sleep(BLOCKED_FOR)
+        assert thread.is_alive()
+        assert b.execute("commit").ok
+        thread.join(5)
+        assert result["result"].ok
+        assert a.execute(f"select * from {view}").rows == \
+            [[1, "ann", 40], [2, "bob", 30]]
+
+def test_results_and_errors_follow_protocol(server):
+    with Client(server) as a:
+        _table(a, "srv_protocol")
+        result = a.execute("select * from srv_protocol where age > ?", 10)
+        assert result.ok and result.columns == ["ID", "name", "age"]
+        assert result.rows == [[1, "ann", 15], [2, "bob", 30]]
+        assert a.execute("insert into srv_protocol values ? ?", "o'neil", 7).ok
+        assert a.execute("select * from srv_protocol where name = ?",
+                         "o'neil").rows == [[3, "o'neil", 7]]
+
+        result = a.execute("select * from srv_missing")
+        assert result.rows == [] and "srv_missing" in result.message
+        # без значений команда уходит текстом, и '?' в ней - ошибка
+        result = a.execute("select * from srv_protocol where name = ?")
+        assert not result.ok and "подготовленную команду" in result.message
+        assert not a.execute("selec * from srv_protocol").ok
+        assert not a.execute("commit").ok
+
+def test_disconnect_rolls_back_transaction(server):
+    with Client(server) as a:
+        _table(a, "srv_dropped")
+        with Client(server) as b:
+            assert b.execute("begin").ok
+            assert b.execute("delete from srv_dropped where ID = 1").ok
+        # таблица свободна, изменения отключившегося клиента отменены
+        assert a.execute("update srv_dropped set age = 31 where ID = 2").ok
+        assert a.execute("select * from srv_dropped").rows == \
+            [[1, "ann", 15], [2, "bob", 31]]
+
+def test_async_clients_share_server(server):
+    async def run():
+        clients = [await AsyncClient.connect(server) for _ in range(4)]
+        try:
+            assert (await clients[0].execute(
+                "create_table srv_async n:int")).ok
+            await asyncio.gather(*(client.execute(
+                "insert into srv_async values ?", i)
+                for i, client in enumerate(clients)))
+            results = await asyncio.gather(*(client.execute(
+                "select count(*) from srv_async") for client in clients))
+            return [result.rows for result in results]
+        finally:
+            for client in clients:
+                await client.close()
+
+    assert asyncio.run(run()) == [[[4]]] * 4
@@ -0,0 +1,18 @@
+import os
+import subprocess
+import sys
+
+from conftest import SRC_DIR
+
+SCRIPT = os.path.join(os.path.dirname(SRC_DIR), "benchmarks", "import_time.py")
+
+
+def test_startup_does_not_load_lazy_modules(tmp_path):
+    # время запуска проверяет make bench-startup; здесь бюджет заведомо
+    # большой, и скрипт падает только из-за загруженных тяжёлых модулей
+    result = subprocess.run(
+        [sys.executable, SCRIPT, "--budget", "10000", "--runs", "1",
+         "--output", str(tmp_path / "startup.json")],
+        capture_output=True, text=True,
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
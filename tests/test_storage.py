@@ -0,0 +1,230 @@
+import json
+import os
+
+import pytest
+
+from primitive_db import core, metrics, utils
+from primitive_db.catalog import forget
+from primitive_db.query import compile_where
+from primitive_db.utils import (
+    DATA_DIR,
+    columns_files,
+    compact_table,
+    load_table_data,
+    table_path,
+)
+
+
+class Crash(Exception):
+    "сбой процесса, подставленный в середину записи"
+
+
+def test_columnar_compaction_survives_crash_before_manifest(monkeypatch):
+    core.create_table("crashy", [("value", "int")], "columnar")
+    core.insert("crashy", [1])
+    core.insert("crashy", [2])
+    before = columns_files("crashy")
+
+    write_atomic = utils.write_atomic
+
+    def crash_on_manifest(path, blob):
+        if path == table_path("crashy"):
+            raise Crash(path)
+        write_atomic(path, blob)
+
+    # столбцы уже записаны, а манифест и журнал - ещё прежние
+    monkeypatch.setattr(utils, "write_atomic", crash_on_manifest)
+    with pytest.raises(Crash):
+        compact_table("crashy")
+    monkeypatch.undo()
+    forget("crashy")
+
+    assert len(columns_files("crashy")) == len(before) + 1
+    assert load_table_data("crashy")["rows"] == [(1, 1), (2, 2)]
+    # следующее сворачивание убирает файл, оставшийся от сбоя
+    compact_table("crashy")
+    assert len(columns_files("crashy")) == 1
+    assert load_table_data("crashy")["rows"] == [(1, 1), (2, 2)]
+    core.drop_table("crashy")
+    assert columns_files("crashy") == []
+
+def test_columnar_table_in_old_layout_is_migrated(rows):
+    core.create_table("legacy_col", [("value", "int")], "columnar")
+    core.insert_many("legacy_col", [[5], [6]])
+    compact_table("legacy_col")
+    forget("legacy_col")
+    # таблица в прежнем виде: столбцы в <таблица>.col, без имени в манифесте
+    (name,) = columns_files("legacy_col")
+    os.replace(os.path.join(DATA_DIR, name), os.path.join(DATA_DIR, "legacy_col.col"))
+    with open(table_path("legacy_col"), "rb") as file:
+        meta = json.loads(file.read())
+    del meta["columns_file"]
+    with open(table_path("legacy_col"), "w", encoding="utf-8") as file:
+        json.dump(meta, file)
+
+    assert rows(core.select, "legacy_col", ("cmp", "=", "value", 6)) == [(2, 6)]
+    assert load_table_data("legacy_col")["rows"] == [(1, 5), (2, 6)]
+    compact_table("legacy_col")
+    assert columns_files("legacy_col") == [f"legacy_col.col-{meta['seq']}"]
+    core.drop_table("legacy_col")
+
+def _log_records(table_name):
+    return list(utils.read_log(table_name))
+
+def test_changes_are_appended_to_log_and_replayed(rows):
+    core.create_table("logged", [("value", "int")])
+    snapshot = os.path.getsize(table_path("logged"))
+    core.insert("logged", [1])
+    core.insert_many("logged", [[2], [3]])
+    core.update("logged", {"value": "20"}, ("cmp", "=", "ID", 2))
+    core.delete("logged", ("cmp", "=", "value", 1))
+    # снимок не переписывается, изменения лежат в журнале по порядку
+    assert os.path.getsize(table_path("logged")) == snapshot
+    assert [record["op"] for record in _log_records("logged")] == \
+        ["insert", "insert_many", "update", "delete"]
+    assert [record["seq"] for record in _log_records("logged")] == [1, 2, 3, 4]
+
+    forget("logged")
+    data = load_table_data("logged")
+    assert data["rows"] == [(2, 20), (3, 3)]
+    assert data["next_id"] == 4 and data["seq"] == 4
+    core.drop_table("logged")
+
+def test_torn_and_compacted_log_records_are_skipped():
+    core.create_table("torn", [("value", "int")])
+    core.insert("torn", [1])
+    compact_table("torn")
+    core.insert("torn", [2])
+    with open(utils.log_path("torn"), "rb") as file:
+        written = file.read()
+    # запись seq 1 уже в снимке, последняя строка оборвалась при сбое
+    with open(utils.log_path("torn"), "wb") as file:
+        file.write(b'{"op": "insert", "row": [1, 1], "seq": 1}\n' + written
+                   + b'{"op": "insert", "row": [3')
+    forget("torn")
+    assert load_table_data("torn")["rows"] == [(1, 1), (2, 2)]
+
+    # следующая запись начинается с новой строки
+    core.insert("torn", [3])
+    forget("torn")
+    assert load_table_data("torn")["rows"] == [(1, 1), (2, 2), (3, 3)]
+    core.drop_table("torn")
+
+def test_log_is_compacted_past_threshold(monkeypatch):
+    monkeypatch.setattr(utils, "LOG_COMPACT_MIN_BYTES", 200)
+    core.create_table("compacted", [("value", "int")])
+    core.insert("compacted", [1])
+    assert os.path.exists(utils.log_path("compacted"))
+
+    # журнал больше порога и снимка: он сворачивается в снимок и удаляется
+    for _ in range(20):
+        core.insert("compacted", [2])
+        if not os.path.exists(utils.log_path("compacted")):
+            break
+    assert not os.path.exists(utils.log_path("compacted"))
+    meta = utils.load_table_meta("compacted")
+    assert len(meta["rows"]) == meta["seq"] > 1
+    forget("compacted")
+    assert len(load_table_data("compacted")["rows"]) == meta["seq"]
+    core.drop_table("compacted")
+
+PEOPLE = [["anna", 30, True], ["Борис", -7, False], ["", 2**62, True],
+          ["anna", 0, False]]
+
+def _people_table(name, storage):
+    core.create_table(name, [("name", "str"), ("age", "int"), ("adult", "bool")],
+                      storage)
+    core.insert_many(name, PEOPLE)
+    compact_table(name)
+    forget(name)
+
+def _counter(name):
+    return metrics.snapshot()["counters"].get(name, 0)
+
+def test_columnar_round_trip():
+    _people_table("col_people", "columnar")
+    (name,) = columns_files("col_people")
+    with open(os.path.join(DATA_DIR, name), "rb") as file:
+        assert file.read(4) == b"PDBC"
+    meta = utils.load_table_meta("col_people")
+    assert meta["rows"] == [] and meta["columns_file"] == name
+    expected = [(i + 1, *values) for i, values in enumerate(PEOPLE)]
+    assert load_table_data("col_people")["rows"] == expected
+    core.drop_table("col_people")
+
+def test_columnar_scan_reads_condition_column(rows):
+    _people_table("col_scan", "columnar")
+    for where, expected in ((("cmp", "=", "name", "anna"), [1, 4]),
+                            (("cmp", "<", "age", 1), [2, 4]),
+                            (("cmp", "=", "adult", False), [2, 4]),
+                            (("in", "ID", [3, 9]), [3])):
+        core.select_cacher.invalidate()
+        scans = _counter("scan.columnar")
+        found = rows(core.select, "col_scan", where)
+        assert [row[0] for row in found] == expected
+        assert _counter("scan.columnar") == scans + 1
+        assert found == [(i, *PEOPLE[i - 1]) for i in expected]
+
+    # условие на двух столбцах проверяется по загруженной таблице
+    core.select_cacher.invalidate()
+    scans = _counter("scan.columnar")
+    assert rows(core.select, "col_scan",
+                ("and", ("cmp", "=", "name", "anna"), ("cmp", ">", "age", 1))) \
+        == [(1, "anna", 30, True)]
+    assert _counter("scan.columnar") == scans
+    core.drop_table("col_scan")
+
+def _segment_files(table_name):
+    return {segment["key"]: segment["file"]
+            for segment in utils.load_table_meta(table_name)["segments"]}
+
+def test_compaction_rewrites_only_touched_segments(monkeypatch):
+    monkeypatch.setattr(utils, "SEGMENT_ROWS", 10)
+    core.create_table("segs", [("value", "int")], "segmented")
+    core.insert_many("segs", [[i] for i in range(35)])
+    compact_table("segs")
+    before = _segment_files("segs")
+    assert sorted(before) == [0, 1, 2, 3]
+
+    core.update("segs", {"value": "100"}, ("cmp", "=", "ID", 12))
+    core.delete("segs", ("cmp", ">=", "ID", 31))
+    compact_table("segs")
+    after = _segment_files("segs")
+    assert sorted(after) == [0, 1, 2]
+    assert after[0] == before[0] and after[2] == before[2]
+    assert after[1] != before[1]
+    # файлы заменённых и опустевших сегментов удалены
+    assert sorted(os.listdir(utils.segments_dir("segs"))) == \
+        sorted(f"{name}.json" for name in after.values())
+    forget("segs")
+    assert load_table_data("segs")["rows"] == \
+        [(i + 1, 100 if i == 11 else i) for i in range(30)]
+    core.drop_table("segs")
+
+def test_segment_bounds_prune_reads(rows, monkeypatch):
+    monkeypatch.setattr(utils, "SEGMENT_ROWS", 10)
+    core.create_table("pruned", [("value", "int"), ("tag", "str")], "segmented")
+    core.insert_many("pruned", [[i, f"t{i // 10}"] for i in range(40)])
+    compact_table("pruned")
+    meta = utils.load_table_meta("pruned")
+    assert meta["segments"][1]["stats"] == [[11, 20], [10, 19], ["t1", "t1"]]
+
+    for where, skipped in ((("between", "value", 12, 14), 3),
+                           (("cmp", "=", "tag", "t3"), 3),
+                           (("or", ("cmp", "<", "ID", 3),
+                             ("in", "value", [25, 99])), 2)):
+        forget("pruned")
+        core.select_cacher.invalidate()
+        before = _counter("segments.skipped")
+        predicate = compile_where(where, meta["columns"])
+        expected = [row for row in load_table_data("pruned")["rows"]
+                    if predicate(row)]
+        assert rows(core.select, "pruned", where) == expected
+        assert _counter("segments.skipped") == before + skipped
+
+    # границы не отсеивают ни одного сегмента - таблица загружается целиком
+    forget("pruned")
+    scans = _counter("scan.segments")
+    assert len(rows(core.select, "pruned", ("cmp", "!=", "value", 5))) == 39
+    assert _counter("scan.segments") == scans
+    core.drop_table("pruned")
@@ -0,0 +1,70 @@
+import os
+
+from primitive_db import core, utils
+from primitive_db.indexes import load_indexes
+from primitive_db.utils import DATA_DIR, load_table_data
+
+
+def _log_ops(table_name):
+    return [record["op"] for record in utils.read_log(table_name)]
+
+def test_commit_writes_all_tables_at_once(rows):
+    core.create_table("accounts", [("balance", "int")])
+    core.create_table("transfers", [("amount", "int")])
+    core.insert_many("accounts", [[100], [50]])
+
+    assert core.begin()
+    core.update("accounts", {"balance": "70"}, ("cmp", "=", "ID", 1))
+    core.update("accounts", {"balance": "80"}, ("cmp", "=", "ID", 2))
+    core.insert("transfers", [30])
+    # изменения видны в процессе, но на диске их ещё нет
+    assert rows(core.select, "accounts") == [(1, 70), (2, 80)]
+    assert _log_ops("accounts") == ["insert_many"]
+    assert not os.path.exists(utils.log_path("transfers"))
+
+    assert core.commit()
+    assert not core.in_transaction()
+    assert _log_ops("accounts") == ["insert_many", "update", "update"]
+    assert load_table_data("accounts")["rows"] == [(1, 70), (2, 80)]
+    assert load_table_data("transfers")["rows"] == [(1, 30)]
+    assert not any(name.endswith(".txn") for name in os.listdir(DATA_DIR))
+    core.drop_table("accounts")
+    core.drop_table("transfers")
+
+def test_rollback_restores_rows_indexes_and_cache(rows):
+    core.create_table("rolled", [("value", "int")])
+    core.insert_many("rolled", [[1], [2]])
+    core.create_index("rolled", "value")
+    assert rows(core.select, "rolled", ("cmp", "=", "value", 2)) == [(2, 2)]
+
+    core.begin()
+    core.delete("rolled", ("cmp", "=", "value", 2))
+    core.insert("rolled", [5])
+    core.update("rolled", {"value": "9"}, ("cmp", "=", "value", 1))
+    assert rows(core.select, "rolled", ("cmp", "=", "value", 2)) == []
+    assert core.rollback()
+
+    assert rows(core.select, "rolled", ("cmp", "=", "value", 2)) == [(2, 2)]
+    assert rows(core.select, "rolled") == [(1, 1), (2, 2)]
+    index = load_indexes("rolled", core.get_table("rolled"))["value"]
+    assert index.find(2) == [2] and index.find(5) == [] and index.find(9) == []
+    # ID из отменённой транзакции выдаётся снова
+    core.insert("rolled", [3])
+    assert rows(core.select, "rolled", ("cmp", "=", "value", 3)) == [(3, 3)]
+    core.drop_table("rolled")
+
+def test_transaction_misuse_is_reported(capsys):
+    assert not core.commit()
+    assert not core.rollback()
+    assert "нет открытой транзакции" in capsys.readouterr().out
+    core.begin()
+    try:
+        assert not core.begin()
+        assert "транзакция уже открыта" in capsys.readouterr().out
+        # схема не меняется внутри транзакции
+        assert not core.create_table("inside", [("value", "int")])
+        assert "create_table нельзя выполнять внутри транзакции" \
+            in capsys.readouterr().out
+        assert "inside" not in core.list_tables()
+    finally:
+        core.rollback()
@@ -0,0 +1,131 @@
+import random
+
+import pytest
+
+from primitive_db import core, vector
+
+pytest.importorskip("numpy")
+
+ITEMS = [("count", "*"), ("sum", "a"), ("avg", "a"), ("min", "a"), ("max", "b"),
+         ("sum", "b"), ("avg", "b"), ("min", "b")]
+
+
+@pytest.fixture
+def engines(rows):
+    "engines(function, *args) - строки результата обычного и векторного движка"
+    def run(function, *args):
+        results = []
+        try:
+            for engine in ("python", "numpy"):
+                core.set_scan_engine(engine)
+                core.select_cacher.invalidate()
+                results.append(rows(function, *args))
+        finally:
+            core.set_scan_engine("auto")
+        return results
+    return run
+
+def _leaf(rng):
+    column = rng.choice(["a", "b", "c", "ID"])
+    if column == "b":
+        def value():
+            return rng.random() < 0.5
+    else:
+        def value():
+            return rng.randrange(-60, 3100 if column == "ID" else 60)
+    kind = rng.random()
+    if kind < 0.6:
+        return ("cmp", rng.choice(["=", "!=", "<", "<=", ">", ">="]), column,
+                value())
+    if kind < 0.8:
+        return ("in", column, [value() for _ in range(3)])
+    low, high = sorted([value(), value()])
+    return ("between", column, low, high)
+
+def _where(rng, depth=0):
+    if depth > 2 or rng.random() < 0.4:
+        return _leaf(rng)
+    return (rng.choice(["and", "or"]), _where(rng, depth + 1),
+            _where(rng, depth + 1))
+
+def _change(rng):
+    "случайное изменение таблицы: массивы столбцов должны его учесть"
+    kind = rng.random()
+    if kind < 0.25:
+        core.insert("vec", [rng.randrange(-50, 50), rng.random() < 0.5,
+                            rng.randrange(5), "y"])
+    elif kind < 0.4:
+        core.insert_many("vec", [[rng.randrange(-50, 50), True, 1, "z"]
+                                 for _ in range(rng.randrange(1, 40))])
+    elif kind < 0.6:
+        core.update("vec", {rng.choice(["a", "b", "c"]): rng.choice(["1", "0"])},
+                    _leaf(rng))
+    elif kind < 0.75:
+        core.delete("vec", _leaf(rng))
+    elif kind < 0.85:
+        core.begin()
+        core.insert("vec", [1, False, 2, "q"])
+        core.delete("vec", ("cmp", "<", "a", -40))
+        (core.commit if rng.random() < 0.5 else core.rollback)()
+
+def test_engines_agree_across_changes(engines):
+    rng = random.Random(5)
+    core.create_table("vec", [("a", "int"), ("b", "bool"), ("c", "int"),
+                              ("s", "str")])
+    core.insert_many("vec", [[rng.randrange(-50, 50), rng.random() < 0.5,
+                              rng.randrange(5), f"x{i % 7}"] for i in range(3000)])
+    try:
+        for _ in range(150):
+            where = _where(rng)
+            if rng.random() < 0.1:
+                # столбец str векторно не проверяется - условие целиком обычное
+                where = ("and", where, ("cmp", "=", "s", "x3"))
+            group_by = rng.choice([[], ["b"], ["c"], ["b", "c"]])
+            items = [(None, column) for column in group_by] + ITEMS
+            for function, args in (
+                    (core.select, ("vec", where)),
+                    (core.select, ("vec", where, 5, 3, ("a", True))),
+                    (core.aggregate, ("vec", items, where, group_by)),
+                    (core.aggregate, ("vec", items, None, group_by))):
+                python_rows, numpy_rows = engines(function, *args)
+                assert numpy_rows == python_rows, (function.__name__, args)
+                assert [type(value) for row in numpy_rows for value in row] == \
+                    [type(value) for row in python_rows for value in row]
+            # изменение - через векторный движок, чтобы массивы уже были построены
+            core.set_scan_engine("numpy")
+            try:
+                _change(rng)
+            finally:
+                core.set_scan_engine("auto")
+    finally:
+        core.drop_table("vec")
+
+def test_engines_agree_beyond_int64(engines):
+    core.create_table("big", [("a", "int"), ("b", "bool")])
+    core.insert_many("big", [[i, i % 2 == 0] for i in range(100)])
+    try:
+        for where in (("cmp", ">", "a", 10**30), ("cmp", "<", "a", 10**30),
+                      ("in", "a", [10**30, 5])):
+            python_rows, numpy_rows = engines(core.select, "big", where)
+            assert numpy_rows == python_rows
+
+        # сумма больше int64 считается обычным проходом
+        core.insert_many("big", [[2**62, True], [2**62, True]])
+        python_rows, numpy_rows = engines(core.aggregate, "big",
+                                          [("sum", "a"), ("avg", "a")])
+        assert numpy_rows == python_rows
+        assert numpy_rows[0][0] == 2**63 + 4950
+
+        # значение вне int64: массив столбца не строится
+        core.insert("big", [2**70, False])
+        for function, args in ((core.select, ("big", ("cmp", ">", "a", 2**61))),
+                               (core.aggregate, ("big", [("max", "a")]))):
+            python_rows, numpy_rows = engines(function, *args)
+            assert numpy_rows == python_rows
+    finally:
+        core.drop_table("big")
+
+def test_numpy_engine_needs_numpy(monkeypatch):
+    monkeypatch.setattr(vector, "_numpy", False)
+    with pytest.raises(ValueError, match="NumPy"):
+        core.set_scan_engine("numpy")
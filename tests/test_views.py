@@ -0,0 +1,26 @@
+from primitive_db import core
+from primitive_db.views import is_view
+
+
+def test_drop_table_drops_its_views(rows):
+    core.create_table("people", [("age", "int")])
+    core.create_table("others", [("age", "int")])
+    core.insert_many("people", [[10], [30]])
+    core.create_view("adults", "select", ("people", ("cmp", ">=", "age", 18),
+                                          None, 0, None))
+    core.create_view("by_age", "aggregate", ("people", [("count", "*")], None,
+                                             [], None, 0))
+    core.create_view("other_adults", "select", ("others", None, None, 0, None))
+    assert rows(core.select, "adults") == [(2, 30)]
+
+    assert core.drop_table("people")
+    assert not is_view("adults") and not is_view("by_age")
+    assert "adults" not in core.list_views()
+    assert is_view("other_adults")
+
+    # имя освободилось: можно создать таблицу с тем же именем
+    assert core.create_table("adults", [("age", "int")])
+    assert rows(core.select, "adults") == []
+    core.drop_table("adults")
+    core.drop_table("others")
+    assert not is_view("other_adults")